@@ -0,0 +1,253 @@
+"""
+Replay recorded traffic against a local backend and report how it coped.
+
+Record with TRAFFIC_RECORD_PATH set (see utils/traffic_recorder.py), then,
+with the backend pointed at the offline stub LLM (GROQ_BASE_URL):
+
+    python -m benchmarks.replay traffic.jsonl --base-url http://127.0.0.1:8000 --speed 4
+
+--start-stub PORT runs the stub LLM in this process for the backend to use.
+Recordings made with TRAFFIC_RECORD_TEXT=hashed hold hashes instead of
+questions and prompts; they are refused unless --allow-hashed is given.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import logging
+
+import httpx
+
+from benchmarks.run_benchmarks import git_commit, summarize
+from benchmarks.stub_llm import StubLLMServer
+from benchmarks.synthetic import make_markdown, make_text
+from utils.traffic_recorder import is_hashed_text, load_recording
+
+logger = logging.getLogger(__name__)
+
+class DocumentMapper:
+    """
+    Maps document ids in the recording to documents on the target backend.
+
+    Recorded uploads are mapped to the documents they create on replay; any
+    other recorded id is assigned one of the target's existing documents,
+    consistently, so document-scoped queries stay scoped.
+    """
+
+    def __init__(self, existing_ids: List[str]):
+        self._mapping: Dict[str, str] = {}
+        self._pool = list(existing_ids)
+        self._cycle = itertools.cycle(self._pool) if self._pool else None
+
+    def add(self, recorded_id: Optional[str], local_id: str):
+        if recorded_id:
+            self._mapping[recorded_id] = local_id
+        self._pool.append(local_id)
+        self._cycle = itertools.cycle(self._pool)
+
+    def map(self, recorded_ids: Optional[List[str]]) -> Optional[List[str]]:
+        if not recorded_ids:
+            return recorded_ids
+        mapped = []
+        for recorded_id in recorded_ids:
+            if recorded_id not in self._mapping and self._cycle is not None:
+                self._mapping[recorded_id] = next(self._cycle)
+            if recorded_id in self._mapping:
+                mapped.append(self._mapping[recorded_id])
+        return mapped or None
+
+class Replayer:
+    """Drives recorded requests at their original relative arrival times, scaled by `speed`."""
+
+    def __init__(self, base_url: str, speed: float, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed
+        self.timeout = timeout
+        self.results: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"latencies": [], "errors": 0, "statuses": defaultdict(int), "cached": 0, "cacheable": 0}
+        )
+        self.lag: List[float] = []
+
+    async def run(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            self.mapper = DocumentMapper(await self._existing_documents(client))
+
+            started = time.perf_counter()
+            first_arrival = records[0]["t"] if records else 0.0
+            tasks = []
+            for record in records:
+                due = (record["t"] - first_arrival) / self.speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.lag.append(max(0.0, -delay))
+                tasks.append(asyncio.create_task(self._send(client, record)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+
+        return self._report(records, elapsed)
+
+    async def _existing_documents(self, client: httpx.AsyncClient) -> List[str]:
+        try:
+            response = await client.get("/api/documents")
+            response.raise_for_status()
+            return [document["document_id"] for document in response.json()]
+        except Exception as e:
+            logger.warning(f"Could not list existing documents: {str(e)}")
+            return []
+
+    async def _send(self, client: httpx.AsyncClient, record: Dict[str, Any]):
+        kind = record["kind"]
+        result = self.results[kind]
+        started = time.perf_counter()
+
+        try:
+            if kind == "query":
+                response = await client.post(record["path"], json={
+                    "query": record["query"],
+                    "max_results": record.get("max_results", 5),
+                    "document_ids": self.mapper.map(record.get("document_ids"))
+                })
+            elif kind == "generate":
+                response = await client.post(record["path"], json={"prompt": record["prompt"]})
+            else:
+                filename, content = self._synthetic_upload(record)
+                response = await client.post(record["path"], files={"file": (filename, content)})
+        except httpx.HTTPError as e:
+            result["errors"] += 1
+            result["statuses"][type(e).__name__] += 1
+            return
+
+        result["latencies"].append(time.perf_counter() - started)
+        result["statuses"][str(response.status_code)] += 1
+        if response.status_code >= 400:
+            result["errors"] += 1
+            return
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if kind == "query" and isinstance(payload, dict):
+            result["cacheable"] += 1
+            result["cached"] += bool(payload.get("cached"))
+        if kind == "upload" and isinstance(payload, dict) and payload.get("document_id"):
+            self.mapper.add(record.get("document_id"), payload["document_id"])
+
+    def _synthetic_upload(self, record: Dict[str, Any]):
+        """A synthetic document of roughly the recorded size and type; real contents are never recorded."""
+        file_type = record.get("file_type") if record.get("file_type") in (".txt", ".md") else ".txt"
+        num_words = max(50, record.get("size_bytes", 0) // 6)
+        generate = make_markdown if file_type == ".md" else make_text
+        content = generate(num_words, seed=int(record["t"] * 1000) % 100000).encode("utf-8")
+        return f"replay_{int(record['t'] * 1000)}{file_type}", content
+
+    def _report(self, records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for kind, result in self.results.items():
+            sent = len(result["latencies"]) + sum(
+                count for status, count in result["statuses"].items() if not status.isdigit()
+            )
+            recorded = [record for record in records if record["kind"] == kind]
+            recorded_cached = [record for record in recorded if "cached" in record]
+            endpoints[kind] = {
+                "requests": sent,
+                "throughput_rps": round(sent / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(result["errors"] / sent, 4) if sent else 0.0,
+                "statuses": dict(result["statuses"]),
+                "latency": summarize(result["latencies"]),
+                "recorded_latency": summarize([record["duration_ms"] / 1000 for record in recorded]),
+                "cache_hit_rate": round(result["cached"] / result["cacheable"], 4) if result["cacheable"] else None,
+                "recorded_cache_hit_rate": round(
+                    sum(record["cached"] for record in recorded_cached) / len(recorded_cached), 4
+                ) if recorded_cached else None
+            }
+
+        recorded_span = (records[-1]["t"] - records[0]["t"]) if records else 0.0
+        return {
+            "meta": {
+                "timestamp": time.time(),
+                "git_commit": git_commit(),
+                "base_url": self.base_url,
+                "speed": self.speed,
+                "requests": len(records),
+                "recorded_span_s": round(recorded_span, 2),
+                "replay_elapsed_s": round(elapsed, 2),
+                # How far behind schedule requests were sent; high values mean the replayer itself lagged
+                "max_send_lag_ms": round(max(self.lag, default=0.0) * 1000, 2)
+            },
+            "endpoints": endpoints
+        }
+
+def hashed_records(records: List[Dict[str, Any]]) -> int:
+    """Count queries and generations whose text was recorded as a hash."""
+    return sum(
+        record.get("text") == "hashed" or is_hashed_text(record.get("query", record.get("prompt")))
+        for record in records
+        if record["kind"] in ("query", "generate")
+    )
+
+async def replay(args) -> Dict[str, Any]:
+    records = load_recording(args.recording)
+    if args.kinds:
+        records = [record for record in records if record["kind"] in args.kinds]
+    if args.max_requests:
+        records = records[:args.max_requests]
+
+    hashed = hashed_records(records)
+    if hashed and not args.allow_hashed:
+        raise ValueError(
+            f"{hashed} recorded queries or prompts are hashes and would be sent as such; record with "
+            f"TRAFFIC_RECORD_TEXT=redacted, replay only uploads with --kinds upload, or pass --allow-hashed"
+        )
+    if hashed:
+        logger.warning(
+            f"REPLAYING {hashed} HASHED QUERIES AND PROMPTS: the backend receives hash strings, so "
+            f"retrieval, cache hit rate and generation results do not reflect the recorded traffic"
+        )
+    logger.info(f"Replaying {len(records)} requests at {args.speed}x against {args.base_url}")
+
+    replayer = Replayer(args.base_url, args.speed, args.timeout)
+    if args.start_stub is None:
+        return await replayer.run(records)
+
+    with StubLLMServer(
+        port=args.start_stub,
+        latency=args.llm_latency,
+        tokens_per_second=args.llm_tokens_per_second
+    ) as stub:
+        logger.info(f"Stub LLM running; the backend must use GROQ_BASE_URL={stub.base_url}")
+        return await replayer.run(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against a backend")
+    parser.add_argument("recording", help="JSONL file written by TrafficRecorder")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier (2 = twice as fast)")
+    parser.add_argument("--kinds", nargs="+", choices=["query", "generate", "upload"])
+    parser.add_argument("--max-requests", type=int)
+    parser.add_argument("--allow-hashed", action="store_true", help="Replay hashed queries and prompts as-is")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--start-stub", type=int, metavar="PORT", help="Run the stub LLM on this port")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--output", default="replay_results.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    try:
+        results = asyncio.run(replay(args))
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote replay results to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+End-to-end backend benchmarks against an offline stub LLM.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.run_benchmarks --output bench_results.json
+    python -m benchmarks.run_benchmarks --sections query --concurrency 1 8 32
+
+Results are written as JSON so runs can be compared across commits.
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List
+import logging
+
+from benchmarks.stub_llm import StubLLMServer
+from benchmarks.synthetic import make_queries, make_text, write_documents
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_SIZES = {"small": 1_000, "medium": 20_000, "large": 200_000}
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+async def bench_ingestion(services: Dict[str, Any], work_dir: str) -> List[Dict[str, Any]]:
+    """Measure DocumentProcessor + EmbeddingService + ChromaClient throughput per document."""
+    processor = services["document_processor"]
+    embedder = services["embedding_service"]
+    chroma = services["chroma_client"]
+
+    results = []
+    for document in write_documents(os.path.join(work_dir, "documents"), DOCUMENT_SIZES):
+        size_bytes = os.path.getsize(document["path"])
+        document_id = f"bench-{document['filename']}"
+
+        started = time.perf_counter()
+        chunks = await processor.process_document(document["path"], document["filename"])
+        extracted = time.perf_counter()
+        embeddings = await embedder.generate_embeddings([chunk["text"] for chunk in chunks])
+        embedded = time.perf_counter()
+        await chroma.add_documents(
+            document_id=document_id,
+            chunks=chunks,
+            embeddings=embeddings,
+            metadata={"filename": document["filename"], "file_type": os.path.splitext(document["filename"])[1]}
+        )
+        stored = time.perf_counter()
+
+        total = stored - started
+        results.append({
+            "document": document["filename"],
+            "size_label": document["label"],
+            "size_bytes": size_bytes,
+            "chunks": len(chunks),
+            "extract_s": round(extracted - started, 4),
+            "embed_s": round(embedded - extracted, 4),
+            "store_s": round(stored - embedded, 4),
+            "total_s": round(total, 4),
+            "chunks_per_s": round(len(chunks) / total, 2) if total else 0.0,
+            "mb_per_s": round(size_bytes / (1024 * 1024) / total, 3) if total else 0.0
+        })
+        logger.info(f"Ingested {document['filename']}: {len(chunks)} chunks in {total:.2f}s")
+
+    return results
+
+async def bench_query(
+    services: Dict[str, Any],
+    concurrency_levels: List[int],
+    requests_per_level: int
+) -> List[Dict[str, Any]]:
+    """Measure QueryPipeline latency percentiles at fixed concurrency levels."""
+    from services.query_pipeline import QueryPipeline
+
+    results = []
+    for concurrency in concurrency_levels:
+        pipeline = QueryPipeline(
+            services["embedding_service"],
+            services["chroma_client"],
+            services["groq_service"],
+            semantic_cache=services.get("semantic_cache")
+        )
+        queries = make_queries(requests_per_level, seed=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        errors = 0
+        cached = 0
+
+        async def run_one(query: str):
+            nonlocal errors, cached
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await pipeline.run(query, max_results=5)
+                    cached += bool(response.get("cached"))
+                except Exception as e:
+                    errors += 1
+                    logger.warning(f"Query failed: {str(e)}")
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_one(query) for query in queries))
+        elapsed = time.perf_counter() - started
+
+        results.append({
+            "concurrency": concurrency,
+            "requests": len(queries),
+            "errors": errors,
+            "cache_hits": cached,
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency": summarize(latencies)
+        })
+        logger.info(f"Concurrency {concurrency}: p50={results[-1]['latency']['p50_ms']}ms p99={results[-1]['latency']['p99_ms']}ms")
+
+    return results
+
+async def bench_website(services: Dict[str, Any], work_dir: str, runs: int) -> Dict[str, Any]:
+    """Measure website generation parsing and FileWriter batch writes."""
+    from utils.file_writer import FileWriter
+
+    groq = services["groq_service"]
+    generation, first_write, unchanged_write, partial_write = [], [], [], []
+
+    for run in range(runs):
+        started = time.perf_counter()
+        website = await groq.generate_website(f"Benchmark landing page {run}")
+        generation.append(time.perf_counter() - started)
+
+        files = website["files"]
+        writer = FileWriter(os.path.join(work_dir, f"site_{run}"))
+
+        started = time.perf_counter()
+        writer.write_files(files)
+        first_write.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        writer.write_files(files)
+        unchanged_write.append(time.perf_counter() - started)
+
+        changed = [dict(file_data) for file_data in files]
+        changed[0]["content"] += "\n// edited"
+        started = time.perf_counter()
+        writer.write_files(changed, snapshot=True)
+        partial_write.append(time.perf_counter() - started)
+
+    return {
+        "runs": runs,
+        "files_per_site": len(files) if runs else 0,
+        "generate_and_parse": summarize(generation),
+        "write_all": summarize(first_write),
+        "write_unchanged": summarize(unchanged_write),
+        "write_one_changed_with_snapshot": summarize(partial_write)
+    }
+
+async def bench_prompts(services: Dict[str, Any], runs: int) -> List[Dict[str, Any]]:
+    """Compare every version of each prompt template on prompt tokens and completion latency."""
+    from services.prompt_templates import estimate_tokens, prompt_registry
+
+    groq = services["groq_service"]
+    context = "\n\n".join(make_text(150, seed=i) for i in range(5))
+    values = {
+        "rag_answer": {"query": make_queries(1)[0], "context": context},
+        "website": {"user_prompt": "Benchmark landing page for a bakery"}
+    }
+
+    results = []
+    for info in prompt_registry.list_templates():
+        template = prompt_registry.get(info["name"], info["version"])
+        messages = template.render(**values[template.name])
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await groq._complete(
+                messages, temperature=0.1, max_tokens=1000,
+                timeout=groq.request_timeout, template=template
+            )
+            latencies.append(time.perf_counter() - started)
+
+        results.append({
+            "template": template.key,
+            "fixed_tokens": template.fixed_tokens,
+            "prompt_tokens": sum(estimate_tokens(message["content"]) for message in messages),
+            "latency": summarize(latencies)
+        })
+        logger.info(f"Prompt {template.key}: {results[-1]['prompt_tokens']} prompt tokens")
+
+    return results
+
+async def run(args) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="ragoorb_bench_")
+
+    with StubLLMServer(
+        latency=args.llm_latency,
+        tokens_per_second=args.llm_tokens_per_second,
+        completion_tokens=args.llm_completion_tokens
+    ) as stub:
+        os.environ["GROQ_BASE_URL"] = stub.base_url
+        os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+        os.environ["CHROMA_DB_PATH"] = os.path.join(work_dir, "chroma_db")
+        os.environ["SEMANTIC_CACHE_AUDIT_LOG"] = os.path.join(work_dir, "semantic_cache_audit.jsonl")
+
+        from database.chroma_client import ChromaClient
+        from services.document_processor import DocumentProcessor
+        from services.embedding_service import EmbeddingService
+        from services.groq_service import GroqService
+        from services.semantic_cache import SemanticCache
+
+        chroma = ChromaClient()
+        await chroma.initialize()
+        embedding_service = EmbeddingService()
+        services = {
+            "document_processor": DocumentProcessor(embedding_service=embedding_service),
+            "embedding_service": embedding_service,
+            "chroma_client": chroma,
+            "groq_service": GroqService(),
+            "semantic_cache": SemanticCache() if args.semantic_cache else None
+        }
+
+        results: Dict[str, Any] = {
+            "meta": {
+                "timestamp": time.time(),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": {
+                    "llm_latency_s": args.llm_latency,
+                    "llm_tokens_per_second": args.llm_tokens_per_second,
+                    "llm_completion_tokens": args.llm_completion_tokens,
+                    "concurrency": args.concurrency,
+                    "requests_per_level": args.requests,
+                    "semantic_cache": args.semantic_cache
+                }
+            }
+        }
+
+        if "ingestion" in args.sections or "query" in args.sections:
+            results["ingestion"] = await bench_ingestion(services, work_dir)
+        if "query" in args.sections:
+            results["query"] = await bench_query(services, args.concurrency, args.requests)
+        if "website" in args.sections:
+            results["website"] = await bench_website(services, work_dir, args.website_runs)
+        if "prompts" in args.sections:
+            results["prompts"] = await bench_prompts(services, args.prompt_runs)
+
+        results["meta"]["llm_requests"] = stub.requests
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend benchmark suite")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--sections", nargs="+", default=["ingestion", "query", "website", "prompts"],
+                        choices=["ingestion", "query", "website", "prompts"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="Queries per concurrency level")
+    parser.add_argument("--website-runs", type=int, default=5)
+    parser.add_argument("--prompt-runs", type=int, default=5, help="Completions per prompt template version")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--llm-completion-tokens", type=int, default=200)
+    parser.add_argument("--semantic-cache", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    results = asyncio.run(run(args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote benchmark results to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WORDS = (
+    "component layout responsive tailwind react hook state props render grid "
+    "flex animation motion accessible semantic header footer button modal form "
+    "input route page theme dark light toggle cache fetch async effect memo"
+).split()
+
+class StubLLMServer:
+    """
+    Offline stand-in for the Groq chat completions API.
+
+    Serves POST /openai/v1/chat/completions (plain and streamed) and
+    GET /openai/v1/models with a configurable time to first token and
+    generation speed, so the backend can be benchmarked without network
+    access or API spend. Point GroqService at it with GROQ_BASE_URL.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.2,
+        tokens_per_second: float = 500.0,
+        completion_tokens: int = 200,
+        website_files: int = 5
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.website_files = website_files
+        self.requests = 0
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Stub LLM server listening on {self.base_url}")
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _completion_text(self, body: Dict[str, Any]) -> str:
+        """Produce a plausible completion: file JSON for website prompts, prose otherwise."""
+        max_tokens = min(body.get("max_tokens") or self.completion_tokens, self.completion_tokens)
+        system = next((m["content"] for m in body.get("messages", []) if m["role"] == "system"), "")
+
+        if '"files"' in system:
+            per_file = max(1, max_tokens // max(1, self.website_files))
+            files = [
+                {
+                    "path": "src/App.tsx" if i == 0 else f"src/components/Component{i}.tsx",
+                    "content": "// " + " ".join(random.choice(_WORDS) for _ in range(per_file))
+                }
+                for i in range(self.website_files)
+            ]
+            return json.dumps({"files": files})
+
+        return " ".join(random.choice(_WORDS) for _ in range(max_tokens))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+                else:
+                    self._send_json({"error": {"message": "Not found"}}, status=404)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json({"error": {"message": "Not found"}}, status=404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+
+                text = server._completion_text(body)
+                tokens = text.split(" ")
+                prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+
+                time.sleep(server.latency)
+
+                if body.get("stream"):
+                    self._stream(body, tokens, prompt_tokens)
+                else:
+                    time.sleep(len(tokens) / server.tokens_per_second)
+                    self._send_json(self._completion(body, text, prompt_tokens, len(tokens)))
+
+            def _completion(self, body, text, prompt_tokens, completion_tokens):
+                return {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                }
+
+            def _stream(self, body, tokens: List[str], prompt_tokens: int):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                for i, token in enumerate(tokens):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": token if i == 0 else " " + token},
+                            "finish_reason": None
+                        }]
+                    }
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                    time.sleep(1.0 / server.tokens_per_second)
+
+                # Groq reports usage on the final chunk, under x_groq
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    "x_groq": {"id": completion_id, "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens)
+                    }}
+                }
+                self._write_chunk(f"data: {json.dumps(final)}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self._write_chunk("")
+
+            def _write_chunk(self, data: str):
+                encoded = data.encode("utf-8")
+                self.wfile.write(f"{len(encoded):x}\r\n".encode("ascii") + encoded + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, payload: Dict[str, Any], status: int = 200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stub = StubLLMServer(
+        args.host, args.port, args.latency, args.tokens_per_second, args.completion_tokens
+    )
+    stub.start()
+    print(f"Stub LLM server running; set GROQ_BASE_URL={stub.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
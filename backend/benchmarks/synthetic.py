@@ -0,0 +1,90 @@
+import random
+from pathlib import Path
+from typing import Dict, List
+
+_VOCABULARY = (
+    "the website component layout responsive design navigation header footer hero "
+    "section button card grid flex container theme color typography spacing animation "
+    "transition hover focus accessible semantic markup state props hook effect context "
+    "router page route form input validation submit fetch request response cache "
+    "performance bundle lazy load image optimize deploy build server client render"
+).split()
+
+_CODE_TEMPLATE = """export const {name}: React.FC = () => {{
+  const [open, setOpen] = React.useState(false);
+  return (
+    <div className="flex items-center justify-between p-4">
+      <button onClick={{() => setOpen(!open)}}>{label}</button>
+    </div>
+  );
+}};
+"""
+
+def make_text(num_words: int, seed: int = 0) -> str:
+    """Prose-like text of roughly num_words words, split into paragraphs."""
+    rng = random.Random(seed)
+    paragraphs = []
+    remaining = num_words
+    while remaining > 0:
+        length = min(remaining, rng.randint(40, 120))
+        words = [rng.choice(_VOCABULARY) for _ in range(length)]
+        words[0] = words[0].capitalize()
+        paragraphs.append(" ".join(words) + ".")
+        remaining -= length
+    return "\n\n".join(paragraphs)
+
+def make_markdown(num_words: int, seed: int = 0) -> str:
+    """Markdown with headings, prose and fenced code blocks."""
+    rng = random.Random(seed)
+    sections = []
+    written = 0
+    index = 0
+    while written < num_words:
+        heading = " ".join(rng.choice(_VOCABULARY) for _ in range(3)).title()
+        body = make_text(rng.randint(80, 200), seed=seed * 1000 + index)
+        code = _CODE_TEMPLATE.format(name=f"Widget{index}", label=heading)
+        sections.append(f"## {heading}\n\n{body}\n\n```tsx\n{code}```")
+        written += len(body.split()) + len(code.split())
+        index += 1
+    return "# Synthetic Document\n\n" + "\n\n".join(sections)
+
+def write_documents(directory: str, sizes: Dict[str, int], seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Write one .txt and one .md document per named size.
+
+    Args:
+        directory: Directory to write the documents into
+        sizes: Mapping of size label to approximate word count
+
+    Returns:
+        List of dictionaries with 'label', 'path' and 'filename' keys
+    """
+    directory_path = Path(directory)
+    directory_path.mkdir(parents=True, exist_ok=True)
+
+    documents = []
+    for position, (label, num_words) in enumerate(sizes.items()):
+        for extension, generate in ((".txt", make_text), (".md", make_markdown)):
+            filename = f"synthetic_{label}{extension}"
+            path = directory_path / filename
+            path.write_text(generate(num_words, seed=seed + position), encoding="utf-8")
+            documents.append({"label": label, "path": str(path), "filename": filename})
+
+    return documents
+
+def make_queries(count: int, seed: int = 0) -> List[str]:
+    """Questions in the style users ask, with some repeats as in real traffic."""
+    rng = random.Random(seed)
+    templates = [
+        "How do I build a {a} {b} with {c}?",
+        "Add a {a} {b} to the {c}",
+        "What is the best way to make the {a} {b} {c}?",
+        "Create a {a} {b} that supports {c}"
+    ]
+    distinct = [
+        rng.choice(templates).format(
+            a=rng.choice(_VOCABULARY), b=rng.choice(_VOCABULARY), c=rng.choice(_VOCABULARY)
+        )
+        for _ in range(max(1, count // 2))
+    ]
+    return [rng.choice(distinct) for _ in range(count)]
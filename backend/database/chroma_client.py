@@ -1,26 +1,83 @@
 import chromadb
 from chromadb.config import Settings
 import os
-from typing import List, Dict, Any, Optional
+import re
+import math
+import asyncio
+from typing import Callable, List, Dict, Any, Optional
 import logging
 import uuid
 
+from database.index_snapshot import export_snapshot, import_snapshot
+from database.prefilter_index import DocumentScopeIndex
+from utils.metrics import stage_timer
+
 logger = logging.getLogger(__name__)
 
+# Searches with a doubled limit when collapsing reference stubs leaves too few hits
+_REFERENCE_FETCH_ROUNDS = 3
+
 class ChromaClient:
-    """Client for interacting with Chroma vector database."""
+    """
+    Client for interacting with Chroma vector database.
+    
+    By default the database is opened in-process from CHROMA_DB_PATH. When
+    CHROMA_SERVER_HOST is set, the client instead talks to a store server
+    (see database/store_server.py) over HTTP with a keep-alive connection
+    pool, so several API worker processes can share one copy of the index.
     
-    def __init__(self):
+    Queries scoped to a few documents (at most PREFILTER_EXACT_THRESHOLD
+    chunks) are scored exactly over those chunks' vectors instead of going
+    through the filtered ANN search; see database/prefilter_index.py.
+    
+    Chunks with a "canonical_chunk_id" in their metadata are near-duplicate
+    reference stubs (see services/dedup.py). They are stored without text
+    and carry the vector of the chunk they duplicate; query results replace
+    them with that chunk's text. Deleting a document turns the stubs other
+    documents hold against its chunks into full chunks first.
+    """
+    
+    def __init__(self, server_host: Optional[str] = None, server_port: Optional[int] = None):
         self.db_path = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+        self.server_host = server_host or os.getenv("CHROMA_SERVER_HOST", "")
+        self.server_port = server_port or int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+        self.snapshot_path = os.getenv("INDEX_SNAPSHOT_PATH", "")
+        self.keyword_candidate_factor = int(os.getenv("KEYWORD_CANDIDATE_FACTOR", "4"))
         self.client = None
         self.collection = None
         self.collection_name = "documents"
+        self.scope_index = DocumentScopeIndex()
+        self._listeners: List[Callable[[str, str], None]] = []
+    
+    def add_listener(self, callback: Callable[[str, str], None]):
+        """
+        Register a callback invoked with (event, document_id) when this
+        client stores chunks of a document ("added") or deletes one ("deleted").
+        """
+        self._listeners.append(callback)
+    
+    def _notify(self, event: str, document_id: str):
+        for callback in self._listeners:
+            try:
+                callback(event, document_id)
+            except Exception as e:
+                logger.error(f"Error in Chroma document listener: {str(e)}")
     
     async def initialize(self):
         """Initialize the Chroma client and collection."""
         try:
-            # Create persistent client
-            self.client = chromadb.PersistentClient(path=self.db_path)
+            if self.server_host:
+                # Shared store server; API workers hold no index data themselves
+                self.client = chromadb.HttpClient(
+                    host=self.server_host,
+                    port=self.server_port,
+                    settings=Settings(anonymized_telemetry=False)
+                )
+                location = f"{self.server_host}:{self.server_port}"
+            else:
+                # Create persistent client
+                self.client = chromadb.PersistentClient(path=self.db_path)
+                location = self.db_path
             
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
@@ -28,7 +85,11 @@ class ChromaClient:
                 metadata={"hnsw:space": "cosine"}
             )
             
-            logger.info(f"Initialized Chroma client with collection: {self.collection_name}")
+            logger.info(f"Initialized Chroma client with collection: {self.collection_name} ({location})")
+            
+            # Seed an empty store from a snapshot instead of re-embedding the corpus
+            if self.snapshot_path and os.path.exists(self.snapshot_path) and self.collection.count() == 0:
+                await self.import_snapshot(self.snapshot_path)
             
         except Exception as e:
             logger.error(f"Error initializing Chroma client: {str(e)}")
@@ -52,7 +113,7 @@ class ChromaClient:
             metadatas = []
             
             for i, chunk in enumerate(chunks):
-                chunk_id = f"{document_id}_{i}"
+                chunk_id = f"{document_id}_{chunk.get('chunk_index', i)}"
                 ids.append(chunk_id)
                 documents.append(chunk["text"])
                 
@@ -65,13 +126,16 @@ class ChromaClient:
                 }
                 metadatas.append(chunk_metadata)
             
-            # Add to collection
-            self.collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas,
-                embeddings=embeddings
-            )
+            # Upsert so that re-adding a batch on retry is idempotent
+            with stage_timer("chroma_add"):
+                self.collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas,
+                    embeddings=embeddings
+                )
+            self.scope_index.add_chunks(document_id, ids)
+            self._notify("added", document_id)
             
             logger.info(f"Added {len(chunks)} chunks for document {document_id}")
             
@@ -90,22 +154,314 @@ class ChromaClient:
             if not self.collection:
                 await self.initialize()
             
+            def run_query():
+                return self._query_hits(query_embedding, n_results, document_ids)
+            
+            with stage_timer("chroma_query"):
+                results = await asyncio.get_event_loop().run_in_executor(None, run_query)
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error querying Chroma: {str(e)}")
+            raise
+    
+    async def query_with_neighbors(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        document_ids: Optional[List[str]] = None,
+        window: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Query the collection and prefetch the neighbouring chunks of each hit.
+        
+        Neighbours are the chunks within `window` positions of a hit by
+        chunk_index in the same document. They are fetched with a get() by
+        id right after the query, in the same executor job, and returned
+        under "neighbors", keyed by chunk id.
+        """
+        try:
+            if not self.collection:
+                await self.initialize()
+            
+            def run_query():
+                results = self._query_hits(query_embedding, n_results, document_ids)
+                
+                hit_ids = set(results["ids"][0]) if results.get("ids") else set()
+                neighbor_ids = []
+                for metadata in (results.get("metadatas") or [[]])[0]:
+                    document_id = metadata.get("document_id")
+                    chunk_index = metadata.get("chunk_index")
+                    if document_id is None or chunk_index is None:
+                        continue
+                    for offset in range(-window, window + 1):
+                        neighbor_id = f"{document_id}_{chunk_index + offset}"
+                        if offset and chunk_index + offset >= 0 and neighbor_id not in hit_ids:
+                            neighbor_ids.append(neighbor_id)
+                
+                neighbors = {}
+                if neighbor_ids:
+                    fetched = self.collection.get(ids=list(dict.fromkeys(neighbor_ids)))
+                    for i, chunk_id in enumerate(fetched["ids"]):
+                        neighbors[chunk_id] = {
+                            "text": fetched["documents"][i],
+                            "metadata": fetched["metadatas"][i]
+                        }
+                
+                results["neighbors"] = self._resolve_neighbors(neighbors)
+                return results
+            
+            with stage_timer("chroma_query"):
+                return await asyncio.get_event_loop().run_in_executor(None, run_query)
+            
+        except Exception as e:
+            logger.error(f"Error querying Chroma with neighbours: {str(e)}")
+            raise
+    
+    def _query_hits(
+        self,
+        query_embedding: List[float],
+        n_results: int,
+        document_ids: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """
+        Top n_results hits with reference stubs resolved. Blocking.
+        
+        Collapsing stubs into their canonical chunk, or dropping orphaned
+        ones, can leave fewer than n_results hits; the search is then
+        repeated with a doubled limit until enough remain or the collection
+        (or scope) has no more chunks.
+        """
+        where_clause = None
+        if document_ids:
+            where_clause = {"document_id": {"$in": document_ids}}
+        
+        fetch = n_results
+        for _ in range(_REFERENCE_FETCH_ROUNDS):
+            results = None
+            if document_ids:
+                results = self.scope_index.query(self.collection, query_embedding, fetch, document_ids)
+            if results is None:
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=fetch,
+                    where=where_clause
+                )
+            returned = self._hit_count(results)
+            results = self._resolve_references(results)
+            if self._hit_count(results) >= n_results or returned < fetch:
+                break
+            fetch *= 2
+        
+        return self._select_hits(results, range(min(n_results, self._hit_count(results))))
+    
+    def _resolve_references(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Give reference stubs in query results the text of their canonical chunk.
+        
+        A stub and its canonical chunk share a vector, so only the first of
+        them is kept. Stubs whose canonical chunk was deleted are dropped.
+        """
+        metadatas = (results.get("metadatas") or [[]])[0]
+        canonical_ids = [metadata.get("canonical_chunk_id") for metadata in metadatas]
+        if not any(canonical_ids):
+            return results
+        texts = self._canonical_texts(canonical_ids)
+        
+        keep, seen = [], set()
+        for i, chunk_id in enumerate(results["ids"][0]):
+            canonical_chunk_id = metadatas[i].get("canonical_chunk_id")
+            source = canonical_chunk_id or chunk_id
+            if source in seen or (canonical_chunk_id and canonical_chunk_id not in texts):
+                continue
+            seen.add(source)
+            if canonical_chunk_id:
+                results["documents"][0][i] = texts[canonical_chunk_id]
+            keep.append(i)
+        
+        return self._select_hits(results, keep)
+    
+    def _resolve_neighbors(self, neighbors: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Give stub neighbours their canonical chunk's text; drop orphaned ones."""
+        texts = self._canonical_texts(neighbor["metadata"].get("canonical_chunk_id") for neighbor in neighbors.values())
+        for chunk_id, neighbor in list(neighbors.items()):
+            canonical_chunk_id = neighbor["metadata"].get("canonical_chunk_id")
+            if not canonical_chunk_id:
+                continue
+            if canonical_chunk_id in texts:
+                neighbor["text"] = texts[canonical_chunk_id]
+            else:
+                del neighbors[chunk_id]
+        return neighbors
+    
+    def _canonical_texts(self, canonical_ids) -> Dict[str, str]:
+        """Texts of the given canonical chunks that still exist, keyed by chunk id."""
+        canonical_ids = list(dict.fromkeys(chunk_id for chunk_id in canonical_ids if chunk_id))
+        if not canonical_ids:
+            return {}
+        fetched = self.collection.get(ids=canonical_ids, include=["documents"])
+        return dict(zip(fetched["ids"], fetched["documents"]))
+    
+    @staticmethod
+    def _hit_count(results: Dict[str, Any]) -> int:
+        return len(results["ids"][0]) if results.get("ids") else 0
+    
+    @staticmethod
+    def _select_hits(results: Dict[str, Any], indexes) -> Dict[str, Any]:
+        """Keep only the hits at the given positions of a single-query result."""
+        indexes = list(indexes)
+        for key in ("ids", "documents", "metadatas", "distances", "embeddings"):
+            values = results.get(key)
+            if values is not None and len(values) and values[0] is not None:
+                results[key] = [[values[0][i] for i in indexes]]
+        return results
+    
+    async def get_embeddings(self, chunk_ids: List[str]) -> Dict[str, List[float]]:
+        """Stored vectors of the given chunks, keyed by chunk id; unknown ids are left out."""
+        try:
+            if not chunk_ids:
+                return {}
+            if not self.collection:
+                await self.initialize()
+            
+            def run_get():
+                fetched = self.collection.get(ids=list(dict.fromkeys(chunk_ids)), include=["embeddings"])
+                return {
+                    chunk_id: [float(value) for value in embedding]
+                    for chunk_id, embedding in zip(fetched["ids"], fetched["embeddings"])
+                }
+            
+            with stage_timer("chroma_get"):
+                return await asyncio.get_event_loop().run_in_executor(None, run_get)
+            
+        except Exception as e:
+            logger.error(f"Error fetching embeddings: {str(e)}")
+            raise
+    
+    async def keyword_search(
+        self,
+        terms: List[str],
+        n_results: int = 5,
+        document_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Find chunks containing the given terms, best matches first.
+        
+        Chroma's $contains filter is case-sensitive and returns matches in
+        storage order, so each term is also looked up lower-cased and
+        capitalized, a pool of candidates is fetched, and the candidates are
+        ranked with BM25 over their case-folded words. The result carries
+        the scores under "scores".
+        
+        Reference stubs have no stored text for $contains to match. In a
+        scoped search, stubs whose canonical chunk lies outside the scope
+        are matched against that chunk's text instead; unscoped, the
+        canonical chunk is itself a candidate.
+        """
+        try:
+            if not self.collection:
+                await self.initialize()
+            
+            if not terms:
+                return {"ids": [], "documents": [], "metadatas": [], "scores": []}
+            
+            variants = list(dict.fromkeys(
+                variant for term in terms for variant in (term, term.lower(), term.capitalize())
+            ))
+            where_document = {"$contains": variants[0]}
+            if len(variants) > 1:
+                where_document = {"$or": [{"$contains": variant} for variant in variants]}
+            
             where_clause = None
             if document_ids:
                 where_clause = {"document_id": {"$in": document_ids}}
             
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where_clause
-            )
+            def run_search():
+                candidates = self.collection.get(
+                    where=where_clause,
+                    where_document=where_document,
+                    limit=n_results * self.keyword_candidate_factor,
+                    include=["documents", "metadatas"]
+                )
+                if document_ids:
+                    self._add_reference_candidates(candidates, document_ids, variants)
+                return self._rank_keyword_hits(candidates, terms, n_results)
             
-            return results
+            with stage_timer("chroma_get"):
+                return await asyncio.get_event_loop().run_in_executor(None, run_search)
             
         except Exception as e:
-            logger.error(f"Error querying Chroma: {str(e)}")
+            logger.error(f"Error running keyword search: {str(e)}")
             raise
     
+    def _add_reference_candidates(
+        self,
+        candidates: Dict[str, Any],
+        document_ids: List[str],
+        variants: List[str]
+    ):
+        """Add the scope's reference stubs whose canonical text contains a term variant. Blocking."""
+        scoped = self.collection.get(where={"document_id": {"$in": document_ids}}, include=["metadatas"])
+        stubs = [
+            (chunk_id, metadata) for chunk_id, metadata in zip(scoped["ids"], scoped["metadatas"] or [])
+            if metadata.get("canonical_chunk_id")
+        ]
+        texts = self._canonical_texts(metadata["canonical_chunk_id"] for _, metadata in stubs)
+        
+        # A stub and its canonical chunk share their text; one candidate per text is enough
+        seen = set(candidates["ids"])
+        for chunk_id, metadata in stubs:
+            canonical_chunk_id = metadata["canonical_chunk_id"]
+            text = texts.get(canonical_chunk_id)
+            if canonical_chunk_id in seen or text is None or not any(variant in text for variant in variants):
+                continue
+            seen.add(canonical_chunk_id)
+            candidates["ids"].append(chunk_id)
+            candidates["documents"].append(text)
+            candidates["metadatas"].append(metadata)
+    
+    @staticmethod
+    def _rank_keyword_hits(
+        candidates: Dict[str, Any],
+        terms: List[str],
+        n_results: int,
+        k1: float = 1.2,
+        b: float = 0.75
+    ) -> Dict[str, Any]:
+        """Order keyword candidates by BM25 score (statistics taken over the candidates)."""
+        terms = list(dict.fromkeys(term.lower() for term in terms))
+        words = [re.findall(r"[\w\-]+", (document or "").lower()) for document in candidates["documents"]]
+        if not words:
+            return {"ids": [], "documents": [], "metadatas": [], "scores": []}
+        
+        average_length = sum(len(doc_words) for doc_words in words) / len(words) or 1.0
+        document_frequency = {term: sum(1 for doc_words in words if term in doc_words) for term in terms}
+        
+        scores = []
+        for doc_words in words:
+            score = 0.0
+            for term in terms:
+                frequency = doc_words.count(term)
+                if not frequency:
+                    continue
+                df = document_frequency[term]
+                idf = math.log(1 + (len(words) - df + 0.5) / (df + 0.5))
+                score += idf * frequency * (k1 + 1) / (
+                    frequency + k1 * (1 - b + b * len(doc_words) / average_length)
+                )
+            scores.append(score)
+        
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:n_results]
+        # Substring matches inside longer words score 0 and are dropped
+        order = [i for i in order if scores[i] > 0]
+        return {
+            "ids": [candidates["ids"][i] for i in order],
+            "documents": [candidates["documents"][i] for i in order],
+            "metadatas": [candidates["metadatas"][i] for i in order],
+            "scores": [scores[i] for i in order]
+        }
+    
     async def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get all documents with their metadata."""
         try:
@@ -113,7 +469,8 @@ class ChromaClient:
                 await self.initialize()
             
             # Get all items from collection
-            results = self.collection.get()
+            with stage_timer("chroma_get"):
+                results = self.collection.get()
             
             # Group by document_id
             documents = {}
@@ -131,7 +488,8 @@ class ChromaClient:
                                 "upload_date": metadata.get("upload_date", ""),
                                 "file_size": metadata.get("file_size", 0),
                                 "file_type": metadata.get("file_type", ""),
-                                "file_path": metadata.get("file_path", "")
+                                "file_path": metadata.get("file_path", ""),
+                                "content_hash": metadata.get("content_hash", "")
                             },
                             "chunks_count": 0
                         }
@@ -144,6 +502,27 @@ class ChromaClient:
             logger.error(f"Error getting all documents: {str(e)}")
             raise
     
+    async def find_document_by_hash(self, content_hash: str) -> Optional[str]:
+        """Find the id of a stored document with the given content hash."""
+        try:
+            if not self.collection:
+                await self.initialize()
+            
+            with stage_timer("chroma_get"):
+                results = self.collection.get(
+                    where={"content_hash": content_hash},
+                    limit=1,
+                    include=["metadatas"]
+                )
+            
+            if results["ids"]:
+                return results["metadatas"][0].get("document_id")
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error looking up document by hash: {str(e)}")
+            raise
+    
     async def delete_document(self, document_id: str):
         """Delete all chunks for a document."""
         try:
@@ -155,16 +534,95 @@ class ChromaClient:
                 where={"document_id": document_id}
             )
             
+            self.scope_index.remove_document(document_id)
             if results["ids"]:
+                self._promote_references(document_id, dict(zip(results["ids"], results["documents"])))
                 self.collection.delete(ids=results["ids"])
                 logger.info(f"Deleted document {document_id} and {len(results['ids'])} chunks")
             else:
                 logger.warning(f"No chunks found for document {document_id}")
+            self._notify("deleted", document_id)
             
         except Exception as e:
             logger.error(f"Error deleting document {document_id}: {str(e)}")
             raise
     
+    def _promote_references(self, document_id: str, texts: Dict[str, str]):
+        """
+        Store other documents' stubs of the given chunks as full chunks.
+        
+        A stub already carries the vector of the chunk it duplicates and is
+        answered with that chunk's text, so writing the text into the stub
+        keeps the dependent documents' content and ranking unchanged without
+        re-embedding anything.
+        """
+        stubs = self.collection.get(
+            where={"canonical_chunk_id": {"$in": list(texts)}},
+            include=["metadatas", "embeddings"]
+        )
+        keep = [
+            i for i, metadata in enumerate(stubs["metadatas"] or [])
+            if metadata.get("document_id") != document_id
+        ]
+        if not keep:
+            return
+        
+        self.collection.upsert(
+            ids=[stubs["ids"][i] for i in keep],
+            documents=[texts[stubs["metadatas"][i]["canonical_chunk_id"]] for i in keep],
+            metadatas=[{**stubs["metadatas"][i], "canonical_chunk_id": ""} for i in keep],
+            embeddings=[[float(value) for value in stubs["embeddings"][i]] for i in keep]
+        )
+        dependents = sorted({stubs["metadatas"][i].get("document_id") for i in keep})
+        logger.info(f"Stored {len(keep)} reference stubs of documents {dependents} in full before deleting {document_id}")
+    
+    async def export_snapshot(
+        self,
+        path: str,
+        batch_size: int = 1000,
+        embedding_model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Export the collection to a snapshot directory (see database/index_snapshot.py)."""
+        if not self.collection:
+            await self.initialize()
+        
+        return await asyncio.get_event_loop().run_in_executor(
+            None, export_snapshot, self.collection, path, batch_size, embedding_model
+        )
+    
+    async def import_snapshot(
+        self,
+        path: str,
+        batch_size: int = 1000,
+        embedding_model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Bulk-load a snapshot directory into the collection."""
+        if not self.collection:
+            await self.initialize()
+        
+        self.scope_index.clear()
+        with stage_timer("chroma_add"):
+            return await asyncio.get_event_loop().run_in_executor(
+                None, import_snapshot, self.collection, path, batch_size, embedding_model
+            )
+    
+    async def warm_up(self):
+        """Run one query so the index segments are loaded before the first real request."""
+        try:
+            if not self.collection:
+                await self.initialize()
+            
+            def run_query():
+                sample = self.collection.peek(limit=1)
+                if sample["ids"]:
+                    self.collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1)
+            
+            await asyncio.get_event_loop().run_in_executor(None, run_query)
+            logger.info("Warmed up Chroma collection")
+            
+        except Exception as e:
+            logger.warning(f"Error warming up Chroma: {str(e)}")
+    
     async def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics."""
         try:
@@ -175,7 +633,8 @@ class ChromaClient:
             
             return {
                 "total_chunks": count,
-                "collection_name": self.collection_name
+                "collection_name": self.collection_name,
+                "scope_index": self.scope_index.get_stats()
             }
             
         except Exception as e:
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+
+def export_snapshot(
+    collection,
+    path: str,
+    batch_size: int = 1000,
+    embedding_model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Write a collection's vectors, ids, documents and metadata to a snapshot.
+
+    The snapshot is a directory holding the vectors as one contiguous
+    row-major float32 matrix (vectors.f32), one JSON record per row with
+    the id, document and metadata (records.jsonl), and a manifest. It is
+    written to a temporary directory first and renamed into place.
+
+    Returns:
+        The snapshot manifest
+    """
+    target = Path(path)
+    staging = target.with_name(target.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    count = 0
+    dimension = None
+    with open(staging / VECTORS_FILE, "wb") as vectors_file, \
+            open(staging / RECORDS_FILE, "w", encoding="utf-8") as records_file:
+        offset = 0
+        while True:
+            batch = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            if not batch["ids"]:
+                break
+
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            if dimension is None:
+                dimension = vectors.shape[1]
+            elif vectors.shape[1] != dimension:
+                raise ValueError(f"Mixed embedding dimensions in collection ({dimension} and {vectors.shape[1]})")
+            vectors.tofile(vectors_file)
+
+            for i, chunk_id in enumerate(batch["ids"]):
+                records_file.write(json.dumps({
+                    "id": chunk_id,
+                    "document": batch["documents"][i],
+                    "metadata": batch["metadatas"][i]
+                }) + "\n")
+
+            count += len(batch["ids"])
+            offset += len(batch["ids"])
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "collection": collection.name,
+        "collection_metadata": collection.metadata,
+        "count": count,
+        "dimension": dimension or 0,
+        "dtype": "float32",
+        "embedding_model": embedding_model,
+        "created_at": time.time()
+    }
+    (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    logger.info(f"Exported {count} vectors ({manifest['dimension']}d) to snapshot {target}")
+    return manifest
+
+def load_snapshot(path: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Open a snapshot without reading its vectors into memory.
+
+    Returns:
+        The manifest and a read-only memory-mapped (count, dimension) matrix
+    """
+    directory = Path(path)
+    manifest = json.loads((directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {manifest.get('format_version')}")
+
+    count, dimension = manifest["count"], manifest["dimension"]
+    if count == 0:
+        return manifest, np.zeros((0, dimension), dtype=np.float32)
+
+    vectors = np.memmap(directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(count, dimension))
+    return manifest, vectors
+
+def iter_records(path: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the snapshot's records in batches, in row order."""
+    batch = []
+    with open(Path(path) / RECORDS_FILE, "r", encoding="utf-8") as records_file:
+        for line in records_file:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def import_snapshot(
+    collection,
+    path: str,
+    batch_size: int = 1000,
+    embedding_model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Bulk-load a snapshot into a collection without re-embedding anything.
+
+    Vectors are streamed from the memory map in batches and upserted, so
+    importing is idempotent and memory use is bounded by batch_size.
+
+    Args:
+        collection: Target Chroma collection
+        path: Snapshot directory
+        batch_size: Rows per upsert
+        embedding_model: If given, refuse snapshots made with another model
+
+    Returns:
+        The snapshot manifest
+    """
+    manifest, vectors = load_snapshot(path)
+
+    snapshot_model = manifest.get("embedding_model")
+    if embedding_model and snapshot_model and snapshot_model != embedding_model:
+        raise ValueError(
+            f"Snapshot was embedded with {snapshot_model}, but this node uses {embedding_model}"
+        )
+
+    row = 0
+    for records in iter_records(path, batch_size):
+        embeddings = np.asarray(vectors[row:row + len(records)]).tolist()
+        collection.upsert(
+            ids=[record["id"] for record in records],
+            documents=[record["document"] for record in records],
+            metadatas=[record["metadata"] for record in records],
+            embeddings=embeddings
+        )
+        row += len(records)
+
+    if row != manifest["count"]:
+        raise ValueError(f"Snapshot has {manifest['count']} vectors but {row} records")
+
+    logger.info(f"Imported {row} vectors from snapshot {path} into {collection.name}")
+    return manifest
+
+async def _run_cli(args):
+    from database.chroma_client import ChromaClient
+
+    chroma = ChromaClient()
+    await chroma.initialize()
+
+    if args.command == "export":
+        manifest = await chroma.export_snapshot(args.path, args.batch_size, args.embedding_model)
+    else:
+        manifest = await chroma.import_snapshot(args.path, args.batch_size, args.embedding_model)
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import a vector store snapshot")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_cli(args))
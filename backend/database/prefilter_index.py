@@ -0,0 +1,286 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SCOPED_QUERIES = registry.counter(
+    "ragoorb_scoped_queries_total", "Document-scoped vector queries, by search path (exact/ann)", ["path"]
+)
+
+class DocumentScopeIndex:
+    """
+    Document-to-chunk mapping that lets scoped queries skip the ANN index.
+
+    A Chroma where-clause is applied inside the HNSW search, so when only a
+    few documents are allowed most of the graph walk lands on filtered-out
+    chunks and recall drops. This index keeps, per document, the ids of its
+    chunks in row order and (for recently queried documents) their
+    normalized embeddings as one matrix. When a query's documents hold at
+    most `exact_threshold` chunks in total they are scored exactly with a
+    single matrix product; broader queries go to the ANN index.
+
+    Documents are looked up lazily from the collection the first time they
+    are scoped, so nothing is scanned at startup. Chunks stored through this
+    process update the mapping directly; to see writes from other workers
+    sharing the store, a mapping is looked up again once it is older than
+    `mapping_ttl` seconds, and its vectors are reloaded if its chunks
+    changed. A document is only mapped once all of its chunks are stored
+    (every chunk carries the document's chunk count in "document_chunks");
+    queries scoped to a document still being ingested use the ANN index.
+    Cached vectors are bounded by `max_cached_chunks`, least recently used
+    documents first.
+    """
+
+    def __init__(
+        self,
+        exact_threshold: Optional[int] = None,
+        max_cached_chunks: Optional[int] = None,
+        mapping_ttl: Optional[float] = None
+    ):
+        self.exact_threshold = exact_threshold if exact_threshold is not None else int(
+            os.getenv("PREFILTER_EXACT_THRESHOLD", "2000")
+        )
+        self.max_cached_chunks = max_cached_chunks if max_cached_chunks is not None else int(
+            os.getenv("PREFILTER_CACHE_CHUNKS", "50000")
+        )
+        self.mapping_ttl = mapping_ttl if mapping_ttl is not None else float(
+            os.getenv("PREFILTER_MAPPING_TTL_SECONDS", "60")
+        )
+
+        # document_id -> chunk ids; row i of the document's matrix is chunk_ids[i]
+        self._chunk_ids: Dict[str, List[str]] = {}
+        self._resolved_at: Dict[str, float] = {}
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cached_chunks = 0
+        self._lock = threading.Lock()
+
+    def query(
+        self,
+        collection,
+        query_embedding: List[float],
+        n_results: int,
+        document_ids: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Exact top-n search over the chunks of `document_ids`.
+
+        Blocking; run it in the executor. Returns results shaped like
+        Chroma's query() (one query, cosine distances), or None when the
+        scope is too broad and the ANN index should be used instead.
+        """
+        if self.exact_threshold <= 0:
+            return None
+
+        document_ids = list(dict.fromkeys(document_ids))
+        complete = self._resolve(collection, document_ids)
+        with self._lock:
+            scoped = sum(len(self._chunk_ids.get(document_id, ())) for document_id in document_ids)
+        if not complete or scoped > self.exact_threshold:
+            SCOPED_QUERIES.inc(path="ann")
+            return None
+        SCOPED_QUERIES.inc(path="exact")
+
+        ids, matrix = self._scope_matrix(collection, document_ids)
+        if not ids:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "embeddings": None}
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        similarities = matrix @ query
+
+        k = min(n_results, len(ids))
+        top = np.argpartition(-similarities, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        top_ids = [ids[i] for i in top]
+
+        fetched = collection.get(ids=top_ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: (fetched["documents"][i], fetched["metadatas"][i])
+            for i, chunk_id in enumerate(fetched["ids"])
+        }
+
+        result_ids, documents, metadatas, distances = [], [], [], []
+        for i, chunk_id in zip(top, top_ids):
+            if chunk_id not in by_id:
+                # Deleted since it was mapped
+                continue
+            document, metadata = by_id[chunk_id]
+            result_ids.append(chunk_id)
+            documents.append(document)
+            metadatas.append(metadata)
+            # Same cosine distance the collection's "hnsw:space" reports
+            distances.append(float(1.0 - similarities[i]))
+
+        return {
+            "ids": [result_ids],
+            "documents": [documents],
+            "metadatas": [metadatas],
+            "distances": [distances],
+            "embeddings": None
+        }
+
+    def add_chunks(self, document_id: str, chunk_ids: List[str]):
+        """Record chunks upserted for a document that is already mapped."""
+        with self._lock:
+            known = self._chunk_ids.get(document_id)
+            if known is None:
+                # Not mapped yet; it is looked up in full when first scoped
+                return
+            self._chunk_ids[document_id] = list(dict.fromkeys(known + chunk_ids))
+            self._drop_vectors(document_id)
+
+    def remove_document(self, document_id: str):
+        with self._lock:
+            self._chunk_ids.pop(document_id, None)
+            self._resolved_at.pop(document_id, None)
+            self._drop_vectors(document_id)
+
+    def clear(self):
+        with self._lock:
+            self._chunk_ids.clear()
+            self._resolved_at.clear()
+            self._vectors.clear()
+            self._cached_chunks = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mapped_documents": len(self._chunk_ids),
+                "cached_documents": len(self._vectors),
+                "cached_chunks": self._cached_chunks,
+                "exact_threshold": self.exact_threshold,
+                "exact_queries": int(SCOPED_QUERIES.value(path="exact")),
+                "ann_queries": int(SCOPED_QUERIES.value(path="ann"))
+            }
+
+    def _resolve(self, collection, document_ids: List[str]) -> bool:
+        """
+        Map new or expired documents to their chunk ids (ids only, no vectors).
+
+        Returns False if any of the documents is still being ingested; such
+        documents are not mapped and are looked up again next time.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                document_id for document_id in document_ids
+                if document_id not in self._chunk_ids or now - self._resolved_at[document_id] > self.mapping_ttl
+            ]
+        if not stale:
+            return True
+
+        fetched = collection.get(where={"document_id": {"$in": stale}}, include=["metadatas"])
+        mapped: Dict[str, List[Any]] = {document_id: [] for document_id in stale}
+        expected: Dict[str, int] = {}
+        for chunk_id, metadata in zip(fetched["ids"], fetched["metadatas"]):
+            document_id = metadata.get("document_id")
+            mapped.setdefault(document_id, []).append((metadata.get("chunk_index", 0), chunk_id))
+            # Documents stored before chunk counts were recorded count as complete
+            expected[document_id] = max(expected.get(document_id, 0), metadata.get("document_chunks", 0))
+
+        complete = True
+        with self._lock:
+            for document_id in stale:
+                rows = sorted(mapped[document_id], key=lambda row: row[0])
+                if not rows:
+                    # Unknown, or deleted by another worker
+                    self._chunk_ids.pop(document_id, None)
+                    self._resolved_at.pop(document_id, None)
+                    self._drop_vectors(document_id)
+                    continue
+                if len(rows) < expected[document_id]:
+                    complete = False
+                    continue
+                chunk_ids = [chunk_id for _, chunk_id in rows]
+                if self._chunk_ids.get(document_id) != chunk_ids:
+                    self._chunk_ids[document_id] = chunk_ids
+                    self._drop_vectors(document_id)
+                self._resolved_at[document_id] = now
+        return complete
+
+    def _scope_matrix(self, collection, document_ids: List[str]):
+        """
+        Chunk ids and normalized vectors of the scoped documents, loading uncached ones.
+
+        A document whose chunks change while its vectors load is not cached;
+        its current chunks are fetched by document id for this query instead.
+        """
+        with self._lock:
+            missing = {
+                document_id: self._chunk_ids[document_id] for document_id in document_ids
+                if self._chunk_ids.get(document_id) and document_id not in self._vectors
+            }
+            wanted = [chunk_id for chunk_ids in missing.values() for chunk_id in chunk_ids]
+
+        changed = set()
+        if wanted:
+            fetched = collection.get(ids=wanted, include=["embeddings"])
+            vectors = dict(zip(fetched["ids"], fetched["embeddings"]))
+            with self._lock:
+                for document_id, requested in missing.items():
+                    if self._chunk_ids.get(document_id) is not requested:
+                        # Chunks were added or the document deleted meanwhile; cache it next time
+                        changed.add(document_id)
+                        continue
+                    chunk_ids = [chunk_id for chunk_id in requested if chunk_id in vectors]
+                    matrix = self._normalize([vectors[chunk_id] for chunk_id in chunk_ids])
+                    # Chunks deleted behind our back drop out of the mapping
+                    self._chunk_ids[document_id] = chunk_ids
+                    self._drop_vectors(document_id)
+                    self._vectors[document_id] = matrix
+                    self._cached_chunks += len(chunk_ids)
+
+        ids: List[str] = []
+        matrices = []
+        with self._lock:
+            for document_id in document_ids:
+                matrix = self._vectors.get(document_id)
+                if matrix is None and self._chunk_ids.get(document_id):
+                    # Evicted or dropped by another thread since it was loaded
+                    changed.add(document_id)
+                if document_id in changed or matrix is None or not len(matrix):
+                    continue
+                self._vectors.move_to_end(document_id)
+                ids.extend(self._chunk_ids[document_id])
+                matrices.append(matrix)
+            self._evict(keep=set(document_ids))
+
+        if changed:
+            fetched = collection.get(where={"document_id": {"$in": sorted(changed)}}, include=["embeddings"])
+            if fetched["ids"]:
+                ids.extend(fetched["ids"])
+                matrices.append(self._normalize(fetched["embeddings"]))
+
+        if not matrices:
+            return [], None
+        return ids, np.vstack(matrices) if len(matrices) > 1 else matrices[0]
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if len(matrix):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1.0, norms)
+        return matrix
+
+    def _drop_vectors(self, document_id: str):
+        matrix = self._vectors.pop(document_id, None)
+        if matrix is not None:
+            self._cached_chunks -= len(matrix)
+
+    def _evict(self, keep: set):
+        for document_id in list(self._vectors):
+            if self._cached_chunks <= self.max_cached_chunks:
+                break
+            if document_id not in keep:
+                self._drop_vectors(document_id)
@@ -0,0 +1,96 @@
+import os
+import time
+import socket
+import argparse
+import threading
+from typing import Optional
+import logging
+
+import uvicorn
+from chromadb.config import Settings
+from chromadb.server.fastapi import FastAPI as ChromaServer
+
+logger = logging.getLogger(__name__)
+
+def create_store_app(path: Optional[str] = None):
+    """
+    Build the vector store server's ASGI app.
+
+    Args:
+        path: Directory to persist the store in; None keeps it in memory
+    """
+    settings = Settings(
+        is_persistent=path is not None,
+        persist_directory=path or "./chroma_db",
+        anonymized_telemetry=False,
+        allow_reset=path is None
+    )
+    return ChromaServer(settings).app()
+
+def run_store_server(path: str, host: str = "127.0.0.1", port: int = 8001):
+    """
+    Run the store server in the foreground.
+
+    It must be the only process opening `path`; API workers connect to it by
+    setting CHROMA_SERVER_HOST and CHROMA_SERVER_PORT. It runs a single
+    worker process, so the SQLite and HNSW files have exactly one writer.
+    """
+    logger.info(f"Starting vector store server on {host}:{port} for {path}")
+    uvicorn.run(create_store_app(path), host=host, port=port, workers=1)
+
+class StandInStoreServer:
+    """
+    In-memory store server on a free local port, run in a background thread.
+
+    Intended for tests and benchmarks:
+
+        with StandInStoreServer() as server:
+            client = ChromaClient(server_host=server.host, server_port=server.port)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None):
+        self.host = host
+        self.port = port or self._free_port(host)
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, timeout: float = 10.0):
+        config = uvicorn.Config(create_store_app(), host=self.host, port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Stand-in store server did not start in time")
+            time.sleep(0.05)
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._server = None
+
+    def __enter__(self) -> "StandInStoreServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the shared vector store server")
+    parser.add_argument("--path", default=os.getenv("CHROMA_DB_PATH", "./chroma_db"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("CHROMA_SERVER_PORT", "8001")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_store_server(args.path, args.host, args.port)
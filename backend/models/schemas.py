@@ -17,6 +17,8 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[str]
     context_chunks: List[ContextChunk]
+    cached: bool = False
+    timeline: Optional[List[Dict[str, Any]]] = None
 
 class DocumentInfo(BaseModel):
     document_id: str
@@ -31,8 +33,32 @@ class UploadResponse(BaseModel):
     filename: str
     chunks_processed: int
     message: str
+    duplicate: bool = False
+    job_id: Optional[str] = None
 
 class DocumentChunk(BaseModel):
     text: str
     metadata: Dict[str, Any]
-    chunk_index: int
\ No newline at end of file
+    chunk_index: int
+
+class ProjectResponse(BaseModel):
+    project_id: str
+    prompt: str
+    file_tree: List[Dict[str, Any]]
+    total_files: int
+    total_size: int
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    document_id: str
+    filename: str
+    priority: int
+    status: str
+    stage: str
+    attempts: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_processed: int
+    chunks_duplicate: int = 0
+    progress: float
+    error: Optional[str] = None
@@ -0,0 +1,290 @@
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+CODE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".go", ".rs", ".c", ".h", ".cpp", ".cs",
+    ".rb", ".php", ".swift", ".kt", ".scala", ".sh", ".css", ".scss", ".html", ".vue", ".json",
+    ".yaml", ".yml", ".toml", ".sql"
+}
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_CODE_LINE = re.compile(
+    r"([;{}()\[\],:>]\s*$)|(^\s*(<|#include|@|//|/\*|\*|def |class |function |import |from |export |const |let |var |return |if |for |while ))"
+)
+# Lines that close a block belong to the block above them
+_CLOSER = re.compile(r"^(\}|\)|\]|</|end\b|fi\b|esac\b)")
+# Comments and decorators belong to the block below them
+_PREFIX = re.compile(r"^(#|//|/\*|\*|@|<!--)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+Unit = Tuple[str, int, Optional[str]]
+
+class StructuredChunker:
+    """
+    Chunker that splits code, markdown and prose at structural boundaries.
+
+    Text is split recursively, coarsest boundary first: markdown headings,
+    then top-level code blocks (by indentation) or paragraphs, then lines or
+    sentences, and words only as a last resort. The pieces are packed in
+    order into chunks of at most `max_tokens` tokens, so a function or
+    section is only cut when it cannot fit in a chunk on its own. Chunks
+    keep the original text, line breaks included.
+
+    Token counts come from the embedding model's tokenizer, so build the
+    chunker with `for_embedding_service` outside of tests.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], max_tokens: int):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+
+    @classmethod
+    def for_embedding_service(cls, embedding_service) -> "StructuredChunker":
+        """Size chunks with the embedding model's own tokenizer and input limit."""
+        # The model adds two special tokens ([CLS] and [SEP]) to every input
+        return cls(embedding_service.count_tokens, embedding_service.max_seq_length - 2)
+
+    def split(self, text: str, filename: str) -> List[Dict[str, Any]]:
+        """
+        Split a document's text into chunks.
+
+        Returns:
+            List of chunks with 'text', 'metadata' and 'chunk_index' keys,
+            in the same shape as DocumentProcessor's chunks
+        """
+        kind = self.detect_kind(text, filename)
+
+        units: List[Unit] = []
+        if kind == "markdown":
+            for section, section_text in self._markdown_sections(text):
+                tokens = self.count_tokens(section_text)
+                if tokens <= self.max_tokens:
+                    units.append((section_text, tokens, section))
+                    continue
+                for block in self._markdown_blocks(section_text):
+                    splitters = self._code_splitters() if _FENCE.match(block) else self._prose_splitters()
+                    units.extend((piece, tokens, section) for piece, tokens in self._fit(block, splitters))
+        else:
+            splitters = self._code_splitters() if kind == "code" else self._prose_splitters()
+            units.extend((piece, tokens, None) for piece, tokens in self._fit(text, splitters))
+
+        chunks = []
+        word_offset = 0
+        for chunk_text, tokens, section in self._pack(units):
+            word_count = len(chunk_text.split())
+            start_word = word_offset
+            word_offset += word_count
+            if not chunk_text.strip():
+                continue
+
+            metadata = {
+                "filename": filename,
+                "chunk_index": len(chunks),
+                "start_word": start_word,
+                "end_word": start_word + word_count,
+                "word_count": word_count,
+                "token_count": tokens,
+                "chunk_type": kind
+            }
+            if section:
+                metadata["section"] = section
+            chunks.append({
+                "text": chunk_text.strip(),
+                "metadata": metadata,
+                "chunk_index": len(chunks)
+            })
+
+        return chunks
+
+    @staticmethod
+    def detect_kind(text: str, filename: str) -> str:
+        """Classify a document as 'markdown', 'code' or 'text'."""
+        extension = Path(filename).suffix.lower()
+        if extension in (".md", ".markdown"):
+            return "markdown"
+        if extension in CODE_EXTENSIONS:
+            return "code"
+        if extension == ".txt":
+            # Plain-text uploads are often source files saved as .txt
+            lines = [line for line in text.splitlines()[:500] if line.strip()]
+            if lines and sum(bool(_CODE_LINE.search(line)) for line in lines) / len(lines) >= 0.5:
+                return "code"
+        return "text"
+
+    def _fit(self, text: str, splitters: List[Callable[[str], List[str]]]) -> List[Tuple[str, int]]:
+        """Split text with the coarsest splitter that works until every piece fits."""
+        tokens = self.count_tokens(text)
+        if tokens <= self.max_tokens:
+            return [(text, tokens)]
+
+        for splitter in splitters:
+            parts = [part for part in splitter(text) if part]
+            if len(parts) > 1:
+                pieces = []
+                for part in parts:
+                    pieces.extend(self._fit(part, splitters))
+                return pieces
+
+        return self._split_words(text)
+
+    def _pack(self, units: List[Unit]) -> List[Unit]:
+        """Greedily merge consecutive pieces into chunks of at most max_tokens."""
+        chunks: List[Unit] = []
+        current, current_tokens, current_section = "", 0, None
+
+        for text, tokens, section in units:
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append((current, current_tokens, current_section))
+                current, current_tokens, current_section = "", 0, None
+            if not current:
+                current_section = section
+            current += text
+            current_tokens += tokens
+
+        if current:
+            chunks.append((current, current_tokens, current_section))
+        return chunks
+
+    def _code_splitters(self) -> List[Callable[[str], List[str]]]:
+        return [self._split_code_blocks, self._split_lines]
+
+    def _prose_splitters(self) -> List[Callable[[str], List[str]]]:
+        return [self._split_paragraphs, self._split_sentences, self._split_lines]
+
+    @staticmethod
+    def _markdown_sections(text: str) -> List[Tuple[Optional[str], str]]:
+        """Split markdown at headings (outside code fences), tracking the heading path."""
+        sections: List[Tuple[Optional[str], str]] = []
+        path: List[Tuple[int, str]] = []
+        current: List[str] = []
+        section: Optional[str] = None
+        in_fence = False
+
+        for line in text.splitlines(keepends=True):
+            if _FENCE.match(line):
+                in_fence = not in_fence
+            heading = None if in_fence else _HEADING.match(line)
+            if heading:
+                if current:
+                    sections.append((section, "".join(current)))
+                    current = []
+                level = len(heading.group(1))
+                path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, heading.group(2))]
+                section = " > ".join(title for _, title in path)
+            current.append(line)
+
+        if current:
+            sections.append((section, "".join(current)))
+        return sections
+
+    @staticmethod
+    def _markdown_blocks(text: str) -> List[str]:
+        """Split a markdown section into paragraphs and whole fenced code blocks."""
+        blocks: List[str] = []
+        current: List[str] = []
+        in_fence = False
+
+        for line in text.splitlines(keepends=True):
+            fence = _FENCE.match(line)
+            if fence and not in_fence and current:
+                blocks.append("".join(current))
+                current = []
+            current.append(line)
+            if fence:
+                in_fence = not in_fence
+                if not in_fence:
+                    blocks.append("".join(current))
+                    current = []
+            elif not in_fence and not line.strip():
+                blocks.append("".join(current))
+                current = []
+
+        if current:
+            blocks.append("".join(current))
+        return blocks
+
+    @staticmethod
+    def _split_code_blocks(text: str) -> List[str]:
+        """
+        Split code into blocks that start at its shallowest indentation.
+
+        Closing lines stay with the block above them and comments or
+        decorators with the block below. When everything is one block, e.g.
+        a class or an <html> element, its first line is split off so the
+        body can be split at the next indentation level.
+        """
+        lines = text.splitlines(keepends=True)
+        indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+        if not indents:
+            return [text]
+        base = min(indents)
+
+        blocks: List[List[str]] = []
+        current: List[str] = []
+        for line in lines:
+            stripped = line.strip()
+            indent = len(line) - len(line.lstrip())
+            starts_block = (
+                stripped
+                and indent == base
+                and not _CLOSER.match(stripped)
+                and any(l.strip() and not _PREFIX.match(l.strip()) for l in current)
+            )
+            if starts_block:
+                blocks.append(current)
+                current = []
+            current.append(line)
+        blocks.append(current)
+
+        if len(blocks) == 1 and len(lines) > 1:
+            first = next(i for i, line in enumerate(lines) if line.strip())
+            return ["".join(lines[:first + 1]), "".join(lines[first + 1:])]
+        return ["".join(block) for block in blocks]
+
+    @staticmethod
+    def _split_paragraphs(text: str) -> List[str]:
+        return re.split(r"(?<=\n)(?=[ \t]*\n)", text)
+
+    @staticmethod
+    def _split_sentences(text: str) -> List[str]:
+        pieces, start = [], 0
+        for match in _SENTENCE_END.finditer(text):
+            pieces.append(text[start:match.end()])
+            start = match.end()
+        pieces.append(text[start:])
+        return pieces
+
+    @staticmethod
+    def _split_lines(text: str) -> List[str]:
+        return text.splitlines(keepends=True)
+
+    def _split_words(self, text: str) -> List[Tuple[str, int]]:
+        """Last resort: pack whitespace-separated words, cutting words longer than a chunk."""
+        units: List[Unit] = []
+        for word in re.findall(r"\S+\s*|\s+", text):
+            tokens = self.count_tokens(word)
+            if tokens <= self.max_tokens:
+                units.append((word, tokens, None))
+                continue
+            units.extend((piece, tokens, None) for piece, tokens in self._cut(word, tokens))
+        return [(piece, tokens) for piece, tokens, _ in self._pack(units)]
+
+    def _cut(self, word: str, tokens: int) -> List[Tuple[str, int]]:
+        """Cut a word that is longer than a chunk, e.g. minified code or base64."""
+        # Tokens per character vary along the word, so cut at a proportional
+        # length and cut again any piece that is still too long
+        step = max(1, len(word) * self.max_tokens // (tokens + 1))
+        pieces = []
+        for start in range(0, len(word), step):
+            piece = word[start:start + step]
+            piece_tokens = self.count_tokens(piece)
+            if piece_tokens > self.max_tokens and len(piece) > 1:
+                pieces.extend(self._cut(piece, piece_tokens))
+            else:
+                pieces.append((piece, piece_tokens))
+        return pieces
@@ -0,0 +1,292 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+DEDUP_CHUNKS = registry.counter(
+    "ragoorb_dedup_chunks_total", "Chunks checked by the near-duplicate detector, by outcome", ["outcome"]
+)
+
+class NearDuplicateDetector:
+    """
+    MinHash/LSH detector for near-duplicate chunks across the corpus.
+
+    Each chunk is reduced to a MinHash signature over its word shingles.
+    Signatures are split into bands and bucketed (locality-sensitive
+    hashing), so only chunks sharing a band are compared; a candidate is a
+    duplicate when its estimated Jaccard similarity reaches the threshold.
+
+    Signatures of stored chunks are persisted in SQLite so detection keeps
+    working across restarts. In "reference" mode each duplicate is recorded
+    against the chunk it duplicates and stored as a reference stub that is
+    resolved to that chunk's text at query time (see IngestionQueue and
+    ChromaClient). In "drop" mode it is discarded, unless every chunk of the
+    document is a duplicate, in which case the document is kept whole.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("DEDUP_DB_PATH", "./dedup_index.sqlite3")
+        self.threshold = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+        self.num_perm = int(os.getenv("DEDUP_NUM_PERM", "128"))
+        self.bands = int(os.getenv("DEDUP_BANDS", "16"))
+        self.shingle_size = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+        self.mode = os.getenv("DEDUP_MODE", "reference")
+
+        if self.num_perm % self.bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+        if self.mode not in ("reference", "drop"):
+            raise ValueError("DEDUP_MODE must be 'reference' or 'drop'")
+        self.rows_per_band = self.num_perm // self.bands
+
+        # Fixed seed: signatures must stay comparable with the persisted ones
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, 1 << 31, size=self.num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=self.num_perm).astype(np.uint64)
+
+        self._buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(self.bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._documents: Dict[str, List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._create_schema()
+        self._load()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    chunk_id TEXT PRIMARY KEY,
+                    document_id TEXT NOT NULL,
+                    signature BLOB NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS duplicates (
+                    chunk_id TEXT PRIMARY KEY,
+                    document_id TEXT NOT NULL,
+                    canonical_chunk_id TEXT NOT NULL,
+                    similarity REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_document ON signatures (document_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_canonical ON duplicates (canonical_chunk_id)")
+
+    def _load(self):
+        rows = self._conn.execute("SELECT chunk_id, document_id, signature FROM signatures").fetchall()
+        for chunk_id, document_id, blob in rows:
+            signature = np.frombuffer(blob, dtype=np.uint64)
+            if len(signature) != self.num_perm:
+                raise ValueError("Stored signatures were built with a different DEDUP_NUM_PERM")
+            self._index(chunk_id, document_id, signature)
+        logger.info(f"Loaded {len(rows)} chunk signatures for near-duplicate detection")
+
+    def filter_chunks(
+        self,
+        document_id: str,
+        chunks: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split a document's chunks into unique chunks and near-duplicates.
+
+        Unique chunks are registered so later chunks (in this document or
+        others) are checked against them. Any earlier registration of the
+        same document is replaced first, which keeps retried jobs from
+        matching their own chunks.
+
+        Returns:
+            The unique chunks, and a list of duplicates with 'chunk_id',
+            'canonical_chunk_id' and 'similarity' keys
+        """
+        self.remove_document(document_id)
+
+        unique, duplicates = [], []
+        new_signatures, new_duplicates = [], []
+        signatures = []
+
+        with self._lock:
+            for i, chunk in enumerate(chunks):
+                chunk_id = f"{document_id}_{chunk.get('chunk_index', i)}"
+                signature = self.signature(chunk["text"])
+                signatures.append((chunk_id, signature))
+                match = self._best_match(signature)
+
+                if match is not None:
+                    canonical_chunk_id, similarity = match
+                    duplicates.append({
+                        "chunk_id": chunk_id,
+                        "canonical_chunk_id": canonical_chunk_id,
+                        "similarity": round(similarity, 4)
+                    })
+                    new_duplicates.append((chunk_id, document_id, canonical_chunk_id, similarity))
+                    continue
+
+                unique.append(chunk)
+                self._index(chunk_id, document_id, signature)
+                new_signatures.append((chunk_id, document_id, signature.tobytes()))
+
+            if self.mode == "drop" and duplicates and not unique:
+                # Dropping every chunk would leave nothing to retrieve the document by
+                for chunk_id, signature in signatures:
+                    self._index(chunk_id, document_id, signature)
+                new_signatures = [
+                    (chunk_id, document_id, signature.tobytes()) for chunk_id, signature in signatures
+                ]
+                unique, duplicates = list(chunks), []
+
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO signatures (chunk_id, document_id, signature) VALUES (?, ?, ?)",
+                    new_signatures
+                )
+                if self.mode == "reference":
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO duplicates (chunk_id, document_id, canonical_chunk_id, similarity) "
+                        "VALUES (?, ?, ?, ?)",
+                        new_duplicates
+                    )
+
+        DEDUP_CHUNKS.inc(len(unique), outcome="unique")
+        DEDUP_CHUNKS.inc(len(duplicates), outcome="duplicate")
+        if chunks:
+            logger.info(
+                f"Near-duplicate filter for {document_id}: kept {len(unique)}/{len(chunks)} chunks "
+                f"(dedup ratio {len(duplicates) / len(chunks):.1%}, mode={self.mode})"
+            )
+        return unique, duplicates
+
+    def remove_document(self, document_id: str):
+        """Forget a document's signatures and duplicate references."""
+        with self._lock:
+            for chunk_id in self._documents.pop(document_id, []):
+                signature = self._signatures.pop(chunk_id, None)
+                if signature is None:
+                    continue
+                for band, key in enumerate(self._band_keys(signature)):
+                    bucket = self._buckets[band].get(key)
+                    if bucket and chunk_id in bucket:
+                        bucket.remove(chunk_id)
+                        if not bucket:
+                            del self._buckets[band][key]
+
+            with self._conn:
+                dependents = self._conn.execute(
+                    "SELECT DISTINCT d.document_id FROM duplicates d "
+                    "JOIN signatures s ON s.chunk_id = d.canonical_chunk_id "
+                    "WHERE s.document_id = ? AND d.document_id != ?",
+                    (document_id, document_id)
+                ).fetchall()
+                self._conn.execute("DELETE FROM signatures WHERE document_id = ?", (document_id,))
+                self._conn.execute("DELETE FROM duplicates WHERE document_id = ?", (document_id,))
+
+        if dependents:
+            logger.warning(
+                f"Documents {[row[0] for row in dependents]} had chunks deduplicated against "
+                f"{document_id}; re-ingest them to restore that content"
+            )
+
+    def release_references(self, document_id: str) -> List[str]:
+        """
+        Forget the references other documents hold against a deleted document.
+
+        ChromaClient stores those stubs as full chunks before deleting the
+        document, so they no longer depend on it.
+
+        Returns:
+            Ids of the documents whose references were released
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT DISTINCT document_id FROM duplicates WHERE canonical_chunk_id IN "
+                "(SELECT chunk_id FROM signatures WHERE document_id = ?) AND document_id != ?",
+                (document_id, document_id)
+            ).fetchall()
+            self._conn.execute(
+                "DELETE FROM duplicates WHERE canonical_chunk_id IN "
+                "(SELECT chunk_id FROM signatures WHERE document_id = ?) AND document_id != ?",
+                (document_id, document_id)
+            )
+        return [row[0] for row in rows]
+
+    def get_references(self, document_id: str) -> List[Dict[str, Any]]:
+        """Chunks of a document that were stored as references to an existing chunk."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, canonical_chunk_id, similarity FROM duplicates WHERE document_id = ?",
+                (document_id,)
+            ).fetchall()
+        return [
+            {"chunk_id": chunk_id, "canonical_chunk_id": canonical, "similarity": similarity}
+            for chunk_id, canonical, similarity in rows
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        unique = DEDUP_CHUNKS.value(outcome="unique")
+        duplicate = DEDUP_CHUNKS.value(outcome="duplicate")
+        seen = unique + duplicate
+        return {
+            "indexed_chunks": len(self._signatures),
+            "chunks_seen": int(seen),
+            "duplicates": int(duplicate),
+            "dedup_ratio": round(duplicate / seen, 4) if seen else 0.0,
+            "threshold": self.threshold,
+            "mode": self.mode
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles."""
+        words = re.findall(r"\w+", text.lower())
+        if len(words) <= self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_size])
+                for i in range(len(words) - self.shingle_size + 1)
+            }
+
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        # (a * x + b) mod p for each permutation; a, x < 2**32 so nothing overflows
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=1)
+
+    def _best_match(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        best: Optional[Tuple[str, float]] = None
+        for chunk_id in candidates:
+            similarity = float(np.mean(self._signatures[chunk_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (chunk_id, similarity)
+        return best
+
+    def _index(self, chunk_id: str, document_id: str, signature: np.ndarray):
+        if chunk_id in self._signatures:
+            return
+        self._signatures[chunk_id] = signature
+        self._documents[document_id].append(chunk_id)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band][key].append(chunk_id)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        rows = self.rows_per_band
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
@@ -1,9 +1,12 @@
 import os
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 import logging
 
+from services.chunking import StructuredChunker
+from utils.metrics import stage_timer
+
 # Document processing imports
 try:
     import PyPDF2
@@ -20,7 +23,11 @@ logger = logging.getLogger(__name__)
 class DocumentProcessor:
     """Service for processing various document types."""
     
-    def __init__(self):
+    def __init__(self, embedding_service, chunker: Optional[StructuredChunker] = None):
+        # "structured" splits at headings, code blocks and paragraphs; "fixed" uses word windows
+        self.chunking_strategy = os.getenv("CHUNKING_STRATEGY", "structured")
+        # Size chunks with the model's tokenizer so nothing is truncated at encode time
+        self.chunker = chunker or StructuredChunker.for_embedding_service(embedding_service)
         self.max_chunk_size = 1000
         self.chunk_overlap = 200
     
@@ -29,20 +36,24 @@ class DocumentProcessor:
         try:
             file_extension = Path(file_path).suffix.lower()
             
-            if file_extension == ".pdf":
-                text = await self._extract_pdf_text(file_path)
-            elif file_extension == ".docx":
-                text = await self._extract_docx_text(file_path)
-            elif file_extension in [".txt", ".md"]:
-                text = await self._extract_text_file(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
+            with stage_timer("extraction"):
+                if file_extension == ".pdf":
+                    text = await self._extract_pdf_text(file_path)
+                elif file_extension == ".docx":
+                    text = await self._extract_docx_text(file_path)
+                elif file_extension in [".txt", ".md"]:
+                    text = await self._extract_text_file(file_path)
+                else:
+                    raise ValueError(f"Unsupported file type: {file_extension}")
             
             if not text.strip():
                 raise ValueError("No text content found in document")
             
             # Split text into chunks
-            chunks = self._split_text_into_chunks(text, filename)
+            with stage_timer("chunking"):
+                chunks = await asyncio.get_event_loop().run_in_executor(
+                    None, self._split_text_into_chunks, text, filename
+                )
             
             return chunks
             
@@ -88,7 +99,13 @@ class DocumentProcessor:
         return await asyncio.get_event_loop().run_in_executor(None, extract_text)
     
     def _split_text_into_chunks(self, text: str, filename: str) -> List[Dict[str, Any]]:
-        """Split text into overlapping chunks."""
+        """Split text into chunks with the configured strategy."""
+        if self.chunking_strategy == "structured":
+            return self.chunker.split(text, filename)
+        return self._split_fixed_windows(text, filename)
+    
+    def _split_fixed_windows(self, text: str, filename: str) -> List[Dict[str, Any]]:
+        """Split text into overlapping fixed-size word windows."""
         chunks = []
         words = text.split()
         
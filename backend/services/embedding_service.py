@@ -1,11 +1,18 @@
+import os
 import asyncio
 from typing import List
 import logging
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
+from utils.metrics import EMBEDDING_BATCH_SIZE, registry, stage_timer
+
 logger = logging.getLogger(__name__)
 
+TRUNCATED_TEXTS = registry.counter(
+    "ragoorb_embedding_truncated_texts_total", "Texts longer than the embedding model's input limit"
+)
+
 class EmbeddingService:
     """Service for generating text embeddings."""
     
@@ -13,6 +20,8 @@ class EmbeddingService:
         # Use a lightweight but effective model
         self.model_name = "all-MiniLM-L6-v2"
         self.model = None
+        # Tokenizes every batch a second time to catch chunks the model would truncate
+        self.check_lengths = os.getenv("EMBEDDING_CHECK_LENGTHS", "true").lower() == "true"
         self._load_model()
     
     def _load_model(self):
@@ -31,13 +40,17 @@ class EmbeddingService:
                 return []
             
             def encode_texts():
+                if self.check_lengths:
+                    self._check_lengths(texts)
                 embeddings = self.model.encode(texts, convert_to_numpy=True)
                 return embeddings.tolist()
             
             # Run encoding in executor to avoid blocking
-            embeddings = await asyncio.get_event_loop().run_in_executor(
-                None, encode_texts
-            )
+            EMBEDDING_BATCH_SIZE.observe(len(texts))
+            with stage_timer("embedding"):
+                embeddings = await asyncio.get_event_loop().run_in_executor(
+                    None, encode_texts
+                )
             
             logger.info(f"Generated embeddings for {len(texts)} texts")
             return embeddings
@@ -46,6 +59,30 @@ class EmbeddingService:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
     
+    @property
+    def max_seq_length(self) -> int:
+        """Longest input, in tokens, the model encodes without truncating."""
+        return self.model.max_seq_length
+    
+    def count_tokens(self, text: str) -> int:
+        """Count the model's tokens in a text, excluding special tokens."""
+        return len(self.model.tokenizer(text, add_special_tokens=False)["input_ids"])
+    
+    def _check_lengths(self, texts: List[str]):
+        """Warn about texts the model would silently truncate."""
+        lengths = [len(ids) for ids in self.model.tokenizer(texts, add_special_tokens=True)["input_ids"]]
+        truncated = sum(length > self.max_seq_length for length in lengths)
+        if truncated:
+            TRUNCATED_TEXTS.inc(truncated)
+            logger.warning(
+                f"{truncated}/{len(texts)} texts exceed {self.max_seq_length} tokens "
+                f"(longest {max(lengths)}) and will be truncated when embedded"
+            )
+    
+    async def warm_up(self):
+        """Run one encode so the first request doesn't pay for lazy model initialisation."""
+        await self.generate_embeddings(["warm up"])
+    
     def get_embedding_dimension(self) -> int:
         """Get the dimension of the embeddings."""
         return self.model.get_sentence_embedding_dimension()
\ No newline at end of file
@@ -4,9 +4,99 @@ import logging
 import asyncio
 import json
 import re
+import time
+import threading
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from services.prompt_templates import PromptTemplate, estimate_tokens, prompt_registry
+from utils.metrics import LLM_PROMPT_TOKENS, LLM_REQUEST_SECONDS, LLM_TOKENS, stage_timer
+from utils.resilience import CircuitBreaker, Deadline, DeadlineExceeded, hedged
 
 logger = logging.getLogger(__name__)
 
+_STREAM_END = object()
+
+class _CompletionStream:
+    """
+    Streaming chat completion read on an executor thread.
+
+    Deltas are handed to the event loop through a queue. close() stops the
+    reader at the next chunk and closes the HTTP response, so a stream the
+    consumer abandoned does not keep reading from the API. Token usage from
+    the final chunk is kept in `usage`.
+    """
+
+    def __init__(self, create: Callable[[], Any]):
+        self._loop = asyncio.get_event_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = threading.Event()
+        self._stream = None
+        self.usage = None
+        self._loop.run_in_executor(None, self._read, create)
+
+    def _read(self, create: Callable[[], Any]):
+        try:
+            self._stream = create()
+            if self._closed.is_set():
+                return
+            for chunk in self._stream:
+                if self._closed.is_set():
+                    break
+                self.usage = self._chunk_usage(chunk) or self.usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    self._put(delta)
+        except Exception as e:
+            if not self._closed.is_set():
+                self._put(e)
+        finally:
+            self._close_response()
+            self._put(_STREAM_END)
+
+    @staticmethod
+    def _chunk_usage(chunk):
+        """Usage of a stream chunk; Groq sends it on the last chunk under x_groq."""
+        usage = getattr(chunk, "usage", None)
+        if usage is None:
+            x_groq = getattr(chunk, "x_groq", None)
+            usage = x_groq.get("usage") if isinstance(x_groq, dict) else getattr(x_groq, "usage", None)
+        return SimpleNamespace(**usage) if isinstance(usage, dict) else usage
+
+    def _put(self, item: Any):
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # The event loop has shut down; nobody is listening any more
+            pass
+
+    async def next(self, timeout: float) -> Optional[str]:
+        """Next text delta, or None at the end of the stream. Raises the request's error."""
+        if timeout <= 0:
+            raise DeadlineExceeded("generation", 0.0)
+        try:
+            item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("generation", timeout)
+
+        if item is _STREAM_END:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        self._closed.set()
+        self._close_response()
+
+    def _close_response(self):
+        response = getattr(self._stream, "response", None)
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                logger.debug(f"Error closing Groq stream: {str(e)}")
+
 class GroqService:
     """Service for interacting with Groq API."""
     
@@ -15,82 +105,313 @@ class GroqService:
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        self.client = Groq(api_key=self.api_key)
+        # GROQ_BASE_URL points the client at a local stub LLM server for benchmarks
+        self.client = Groq(api_key=self.api_key, base_url=os.getenv("GROQ_BASE_URL") or None)
         self.model = "llama3-8b-8192"  # Default model
+        self.fallback_model = os.getenv("GROQ_FALLBACK_MODEL", "gemma-7b-it")
+        
+        # Tail-latency controls
+        self.request_timeout = float(os.getenv("GROQ_TIMEOUT_SECONDS", "30"))
+        self.website_timeout = float(os.getenv("GROQ_WEBSITE_TIMEOUT_SECONDS", "120"))
+        self.hedge_delay = float(os.getenv("GROQ_HEDGE_DELAY_SECONDS", "0"))
+        self.circuit_breaker = CircuitBreaker(
+            name=f"groq:{self.model}",
+            error_rate_threshold=float(os.getenv("GROQ_BREAKER_ERROR_RATE", "0.5")),
+            min_requests=int(os.getenv("GROQ_BREAKER_MIN_REQUESTS", "10")),
+            window_seconds=float(os.getenv("GROQ_BREAKER_WINDOW_SECONDS", "60")),
+            cooldown_seconds=float(os.getenv("GROQ_BREAKER_COOLDOWN_SECONDS", "30"))
+        )
+        
+        # Connection pre-warming on the query path
+        self.warm_up_interval = float(os.getenv("GROQ_WARM_UP_INTERVAL_SECONDS", "30"))
+        self._last_warm_up = 0.0
     
-    async def generate_answer(self, query: str, context: str) -> str:
-        """Generate an answer using the provided context."""
+    async def generate_answer(
+        self,
+        query: str,
+        context: str,
+        deadline: Optional[Deadline] = None
+    ) -> str:
+        """
+        Generate an answer using the provided context.
+        
+        Raises DeadlineExceeded when the generation budget runs out, and the
+        underlying API error when both the primary and fallback models fail.
+        """
+        timeout = deadline.budget("generation") if deadline else self.request_timeout
+        
         try:
-            prompt = self._create_prompt(query, context)
-            
-            def make_request():
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a helpful assistant that answers questions based on provided context. Always cite your sources and be accurate."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.1,
-                    max_tokens=1000,
-                    top_p=1,
-                    stream=False
-                )
-                return response.choices[0].message.content
-            
-            answer = await asyncio.get_event_loop().run_in_executor(
-                None, make_request
+            template = prompt_registry.get("rag_answer")
+            with stage_timer("prompt_build"):
+                messages = template.render(query=query, context=context)
+            return await self._complete(
+                messages,
+                temperature=0.1,
+                max_tokens=1000,
+                timeout=timeout,
+                template=template,
+                context_tokens=estimate_tokens(context)
             )
             
-            return answer
-            
         except Exception as e:
             logger.error(f"Error generating answer: {str(e)}")
-            return "I apologize, but I encountered an error while processing your question. Please try again."
+            raise
+    
+    async def warm_up_connection(self):
+        """
+        Open (or refresh) the pooled HTTPS connection to the Groq API.
+        
+        Called while the query is still being embedded so the TLS handshake is
+        off the critical path of the completion. Skipped if a request went out
+        within the last GROQ_WARM_UP_INTERVAL_SECONDS, since the connection is
+        then still alive in the client's pool.
+        """
+        now = time.monotonic()
+        if now - self._last_warm_up < self.warm_up_interval:
+            return
+        self._last_warm_up = now
+        
+        models = getattr(self.client, "models", None)
+        if models is None:
+            return
+        
+        def make_request():
+            models.list(timeout=5)
+        
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, make_request)
+        except Exception as e:
+            logger.debug(f"Groq connection warm-up failed: {str(e)}")
+    
+    async def stream_answer(
+        self,
+        query: str,
+        context: str,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream an answer using the provided context, yielding text deltas.
+        
+        The stream runs within the generation budget like generate_answer.
+        Until the first token arrives, a failed primary model is retried on
+        the fallback model; once tokens have been sent an error is raised
+        as is. The upstream stream is closed when the consumer stops early.
+        """
+        timeout = deadline.budget("generation") if deadline else self.request_timeout
+        template = prompt_registry.get("rag_answer")
+        with stage_timer("prompt_build"):
+            messages = template.render(query=query, context=context)
+        
+        started = time.monotonic()
+        model = self._select_model()
+        try:
+            stream, delta = await self._open_stream(model, messages, timeout)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            remaining = timeout - (time.monotonic() - started)
+            if model == self.fallback_model or not self.fallback_model or remaining <= 0:
+                logger.error(f"Error streaming answer: {str(e)}")
+                raise
+            logger.warning(f"Model {model} failed ({str(e)}), retrying stream on {self.fallback_model}")
+            model = self.fallback_model
+            stream, delta = await self._open_stream(model, messages, remaining)
+        
+        completed = False
+        try:
+            while delta is not None:
+                yield delta
+                delta = await stream.next(timeout - (time.monotonic() - started))
+            completed = True
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            self._record_outcome(model, False)
+            raise
+        finally:
+            stream.close()
+            if not completed:
+                # The consumer went away or the stream failed mid-way
+                self._abandon_outcome(model)
+        
+        self._record_outcome(model, True)
+        self._last_warm_up = time.monotonic()
+        self._log_usage(model, stream.usage, template, estimate_tokens(context), time.monotonic() - started)
+    
+    async def _open_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: float
+    ) -> Tuple[_CompletionStream, Optional[str]]:
+        """Start a streaming completion and wait up to timeout seconds for its first delta."""
+        if timeout <= 0:
+            self._abandon_outcome(model)
+            raise DeadlineExceeded("generation", 0.0)
+        
+        def make_request():
+            return self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.1,
+                max_tokens=1000,
+                top_p=1,
+                stream=True,
+                timeout=timeout
+            )
+        
+        stream = _CompletionStream(make_request)
+        try:
+            return stream, await stream.next(timeout)
+        except Exception:
+            stream.close()
+            self._record_outcome(model, False)
+            raise
+        except BaseException:
+            stream.close()
+            self._abandon_outcome(model)
+            raise
+    
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float,
+        template: Optional[PromptTemplate] = None,
+        context_tokens: int = 0
+    ) -> str:
+        """
+        Run a chat completion within timeout seconds.
+        
+        Uses the fallback model while the primary model's circuit is open, and
+        retries once on the fallback model if the primary fails with time to spare.
+        """
+        started = time.monotonic()
+        model = self._select_model()
+        
+        with stage_timer("generation"):
+            try:
+                content, usage = await self._complete_with_model(model, messages, temperature, max_tokens, timeout)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                remaining = timeout - (time.monotonic() - started)
+                if model == self.fallback_model or not self.fallback_model or remaining <= 0:
+                    raise
+                logger.warning(f"Model {model} failed ({str(e)}), retrying on {self.fallback_model}")
+                model = self.fallback_model
+                content, usage = await self._complete_with_model(
+                    model, messages, temperature, max_tokens, remaining
+                )
+        
+        self._log_usage(model, usage, template, context_tokens, time.monotonic() - started)
+        return content
+    
+    async def _complete_with_model(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ):
+        """
+        Run a (possibly hedged) chat completion against a single model.
+        
+        Returns the message content and the response's usage field.
+        """
+        if timeout <= 0:
+            self._abandon_outcome(model)
+            raise DeadlineExceeded("generation", 0.0)
+        
+        def make_request():
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=1,
+                stream=False,
+                timeout=timeout
+            )
+            return response.choices[0].message.content, response.usage
+        
+        async def attempt():
+            return await asyncio.get_event_loop().run_in_executor(None, make_request)
+        
+        try:
+            result = await asyncio.wait_for(hedged(attempt, self.hedge_delay), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._record_outcome(model, False)
+            raise DeadlineExceeded("generation", timeout)
+        except Exception:
+            self._record_outcome(model, False)
+            raise
+        except BaseException:
+            self._abandon_outcome(model)
+            raise
+        
+        self._record_outcome(model, True)
+        self._last_warm_up = time.monotonic()
+        return result
+    
+    def _log_usage(
+        self,
+        model: str,
+        usage,
+        template: Optional[PromptTemplate],
+        context_tokens: int,
+        elapsed: float
+    ):
+        """Log and record prompt, context and completion token counts for a completion."""
+        template_key = template.key if template else "none"
+        LLM_REQUEST_SECONDS.observe(elapsed, model=model, template=template_key)
+        if usage is None:
+            return
+        
+        LLM_TOKENS.inc(usage.prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens, model=model, kind="completion")
+        LLM_PROMPT_TOKENS.observe(usage.prompt_tokens, template=template_key)
+        template_tokens = template.fixed_tokens if template else 0
+        logger.info(
+            f"Groq usage template={template_key} model={model} "
+            f"prompt_tokens={usage.prompt_tokens} (template~{template_tokens}, context~{context_tokens}) "
+            f"completion_tokens={usage.completion_tokens} latency={elapsed:.2f}s"
+        )
+    
+    def _select_model(self) -> str:
+        """Pick the primary model unless its circuit breaker is open."""
+        if not self.fallback_model or self.circuit_breaker.allow():
+            return self.model
+        return self.fallback_model
+    
+    def _record_outcome(self, model: str, ok: bool):
+        """Feed the outcome of a primary-model call into the circuit breaker."""
+        if model != self.model:
+            return
+        if ok:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+    
+    def _abandon_outcome(self, model: str):
+        """Release the breaker's half-open trial for a primary-model call that ended without an outcome."""
+        if model == self.model:
+            self.circuit_breaker.abandon()
     
     async def generate_website(self, prompt: str) -> dict:
         """Generate a complete website based on the user prompt."""
         try:
-            website_prompt = self._create_website_prompt(prompt)
+            template = prompt_registry.get("website")
+            with stage_timer("prompt_build"):
+                messages = template.render(user_prompt=prompt)
             
-            def make_request():
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": """You are an expert full-stack developer who creates complete, production-ready websites. 
-                            You MUST respond with ONLY a valid JSON object containing the file structure and code.
-                            Do not include any explanatory text before or after the JSON.
-                            The JSON must have this exact structure:
-                            {
-                                "files": [
-                                    {
-                                        "path": "src/App.tsx",
-                                        "content": "// file content here"
-                                    }
-                                ]
-                            }"""
-                        },
-                        {
-                            "role": "user",
-                            "content": website_prompt
-                        }
-                    ],
-                    temperature=0.3,
-                    max_tokens=4000,
-                    top_p=1,
-                    stream=False
-                )
-                return response.choices[0].message.content
-            
-            response_content = await asyncio.get_event_loop().run_in_executor(
-                None, make_request
+            response_content = await self._complete(
+                messages,
+                temperature=0.3,
+                max_tokens=4000,
+                timeout=self.website_timeout,
+                template=template
             )
             
             # Parse the JSON response
@@ -118,53 +439,6 @@ class GroqService:
             logger.error(f"Error generating website: {str(e)}")
             return self._create_fallback_website(prompt)
     
-    def _create_website_prompt(self, user_prompt: str) -> str:
-        """Create a comprehensive prompt for website generation."""
-        return f"""
-Create a complete, modern, production-ready website based on this request: "{user_prompt}"
-
-Requirements:
-1. Use React 18 with TypeScript
-2. Use Tailwind CSS for styling
-3. Create a responsive, mobile-first design
-4. Include proper component structure and organization
-5. Add proper TypeScript types and interfaces
-6. Include navigation between pages if multi-page
-7. Use modern React patterns (hooks, functional components)
-8. Add proper error handling and loading states
-9. Include accessibility features (ARIA labels, semantic HTML)
-10. Make it visually appealing with modern design principles
-
-File Structure Guidelines:
-- Main App component: src/App.tsx
-- Components: src/components/[ComponentName].tsx
-- Pages: src/pages/[PageName].tsx (if multi-page)
-- Types: src/types/[TypeName].ts
-- Utils: src/utils/[utilName].ts
-- Styles: src/styles/[styleName].css (if needed beyond Tailwind)
-
-You MUST respond with ONLY a JSON object in this exact format:
-{{
-    "files": [
-        {{
-            "path": "src/App.tsx",
-            "content": "import React from 'react';\\n\\nfunction App() {{\\n  return (\\n    <div className=\\"min-h-screen bg-gray-100\\">\\n      <h1>Hello World</h1>\\n    </div>\\n  );\\n}}\\n\\nexport default App;"
-        }},
-        {{
-            "path": "src/components/Header.tsx",
-            "content": "// component code here"
-        }}
-    ]
-}}
-
-Important:
-- Escape all quotes and newlines properly in the JSON
-- Include ALL necessary files for a complete website
-- Make sure all imports are correct
-- Ensure the code is production-ready
-- Do not include any text outside the JSON object
-"""
-
     def _create_fallback_website(self, prompt: str) -> dict:
         """Create a fallback website structure when AI generation fails."""
         return {
@@ -351,86 +625,3 @@ export const Footer: React.FC = () => {
                 }
             ]
         }
-    
-    def _create_prompt(self, query: str, context: str) -> str:
-        """Master Hybrid Prompt for Web Development RAG Assistant (with animations)."""
-        return f"""
-You are an **AI Web Development Assistant** specialized in creating 
-**modern, production-ready websites**.
-
-You work in a **HYBRID MODE**:
-- First, use the given context (collected from public modern website repositories).  
-- If the context is missing, incomplete, or irrelevant → rely on your own knowledge and expertise.  
-- Do not tell the user that the context is missing. Always provide the best possible answer.  
-
-⚠️ Important Rules:
-- The repositories are from the public domain, but we do not own their rights.  
-  → **Never copy-paste code directly.**  
-  → Always **rewrite, restructure, optimize, and improve** code while taking inspiration.  
-- When asked to create a **complete website**, never replicate a single repo.  
-  → Instead, combine **multiple inspirations** (or your expertise) into a **single unified theme**.
-
----
-
-### ✅ Guidelines for Responses
-
-1. **Knowledge Usage**
-   - Use repo context when available (patterns, structures, techniques).  
-   - If context is weak → fill gaps with your own expertise.  
-   - Always ensure originality.
-
-2. **Code Generation**
-   - Always output **working, production-ready code**.  
-   - Prefer modern frameworks/tools: **React, Next.js, Tailwind CSS, shadcn/ui, Framer Motion**.  
-   - Use modern animation libraries: **Framer Motion, GSAP, Lottie, Tailwind transitions/animations**.  
-   - Add animations to UI components (e.g., page transitions, hover effects, modals) but **do not overdo it**.  
-   - Ensure **responsive design, accessibility, SEO, and clean architecture**.  
-   - Provide **full snippets** (imports included).  
-   - Add short **inline comments** for tricky parts.
-
-3. **Originality & Ethics**
-   - Never directly copy repo code.  
-   - Rename variables, refactor components, restructure logic.  
-   - Blend multiple repo ideas or invent new approaches.  
-   - Output should look **unique, polished, and modern**.  
-
-4. **Best Practices**
-   - Accessibility: ARIA roles, semantic HTML, screen reader support.  
-   - SEO: semantic tags, metadata, OpenGraph.  
-   - Performance: lazy loading, code splitting, optimized assets.  
-   - Security: sanitized inputs, safe API usage.  
-   - Scalability: modular, reusable components, clean folder structure.  
-
-5. **Creativity & UX Enhancements**
-   - Always suggest at least **one improvement** beyond the repos.  
-     (e.g., dark mode, micro-interactions, animations, better UX flow, performance boost).  
-   - Maintain a **consistent theme** (colors, typography, spacing).  
-   - Recommend **design systems** (Material UI, Radix, or custom).  
-   - Use **animations sparingly and tastefully** — subtle transitions, page fade-ins, or hover effects.  
-
-6. **Answer Formatting**
-   - Use **Markdown**.  
-   - Organize answers in sections: **Explanation → Code → Improvements**.  
-   - For full websites, include **suggested file structure**.  
-   - If inspired by context, you may say *"inspired by repo patterns"* but never quote exact code.  
-
-7. **Fallback Handling**
-   - If repo context is irrelevant, rely fully on your own reasoning.  
-   - Always provide a useful answer — never leave the user without a solution.  
-   - If the query is ambiguous, politely suggest clarifications.  
-
-8. **Tone & Style**
-   - Be **helpful, professional, and concise**.  
-   - Assume the user is a **developer** who wants clean code and short explanations.  
-   - Avoid unnecessary verbosity — focus on clarity and usefulness.  
-
----
-
-### Context (from modern website repos):
-{context}
-
-### Question:
-{query}
-
-### Answer:
-"""
\ No newline at end of file
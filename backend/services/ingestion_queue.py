@@ -0,0 +1,457 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from database.chroma_client import ChromaClient
+from services.dedup import NearDuplicateDetector
+from services.document_processor import DocumentProcessor
+from services.embedding_service import EmbeddingService
+from utils.metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+class IngestionQueue:
+    """
+    Persistent, SQLite-backed queue of document ingestion jobs.
+
+    A pool of workers runs each job through the extract, embed and store
+    stages. Stage outputs are checkpointed to disk, so a failed stage is
+    retried on its own (with backoff) and jobs interrupted by a restart
+    resume where they left off. Higher priority jobs are claimed first.
+    """
+
+    def __init__(
+        self,
+        document_processor: DocumentProcessor,
+        embedding_service: EmbeddingService,
+        chroma_client: ChromaClient,
+        near_duplicate_detector: Optional[NearDuplicateDetector] = None
+    ):
+        self.document_processor = document_processor
+        self.embedding_service = embedding_service
+        self.chroma_client = chroma_client
+
+        if near_duplicate_detector is None and os.getenv("DEDUP_ENABLED", "true").lower() == "true":
+            near_duplicate_detector = NearDuplicateDetector()
+        self.near_duplicate_detector = near_duplicate_detector
+        if near_duplicate_detector:
+            chroma_client.add_listener(self._handle_document_event)
+
+        self.db_path = os.getenv("INGESTION_DB_PATH", "./ingestion_jobs.sqlite3")
+        self.work_dir = Path(os.getenv("INGESTION_WORK_DIR", "./ingestion_jobs"))
+        self.num_workers = int(os.getenv("INGESTION_WORKERS", "2"))
+        self.max_attempts = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+        self.embed_batch_size = int(os.getenv("INGESTION_EMBED_BATCH_SIZE", "64"))
+        self.poll_interval = float(os.getenv("INGESTION_POLL_INTERVAL_SECONDS", "1"))
+
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+        QUEUE_DEPTH.set_function(self.get_queue_depth, queue="ingestion")
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    document_id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    chunks_total INTEGER NOT NULL DEFAULT 0,
+                    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                    chunks_processed INTEGER NOT NULL DEFAULT 0,
+                    chunks_duplicate INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    available_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, created_at)"
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "chunks_duplicate" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN chunks_duplicate INTEGER NOT NULL DEFAULT 0")
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """Register a callback invoked with the job once it completes or fails for good."""
+        self._listeners.append(callback)
+
+    async def start(self):
+        """Requeue jobs interrupted by a restart and start the worker pool."""
+        with self._lock, self._conn:
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (time.time(),)
+            ).rowcount
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted ingestion jobs")
+
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.ensure_future(self._worker(i)) for i in range(self.num_workers)
+        ]
+        logger.info(f"Started {self.num_workers} ingestion workers")
+
+    async def stop(self):
+        """Stop the worker pool. Running jobs are resumed on the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(
+        self,
+        document_id: str,
+        filename: str,
+        file_path: str,
+        metadata: Dict[str, Any],
+        priority: int = 0
+    ) -> str:
+        """
+        Queue a saved upload for ingestion.
+
+        Returns:
+            The job id to poll for status
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO jobs (id, document_id, filename, file_path, metadata, priority,
+                                  status, stage, available_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'queued', 'extract', ?, ?, ?)
+                """,
+                (job_id, document_id, filename, file_path, json.dumps(metadata), priority, now, now, now)
+            )
+
+        if self._wakeup:
+            self._wakeup.set()
+
+        logger.info(f"Queued ingestion job {job_id} for {filename} (priority {priority})")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status and progress."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """List the most recent jobs, optionally filtered by status."""
+        query = "SELECT * FROM jobs"
+        params: List[Any] = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def get_queue_depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                job = self._claim_job()
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await self._run_job(job)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    def _claim_job(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the highest-priority available job as running."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE status = 'queued' AND available_at <= ?
+                ORDER BY priority DESC, created_at
+                LIMIT 1
+                """,
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                (now, row["id"])
+            )
+        return self._row_to_job(row)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        try:
+            if job["stage"] == "extract":
+                await self._extract(job)
+                self._update(job_id, stage="embed")
+                job["stage"] = "embed"
+
+            if job["stage"] == "embed":
+                await self._embed(job)
+                self._update(job_id, stage="store")
+                job["stage"] = "store"
+
+            if job["stage"] == "store":
+                await self._store(job)
+                self._update(job_id, stage="done", status="completed", error=None)
+
+            self._cleanup(job_id)
+            logger.info(f"Completed ingestion job {job_id} for {job['filename']}")
+            self._notify(job_id)
+
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            if attempts < self.max_attempts:
+                backoff = 2 ** attempts
+                logger.warning(
+                    f"Ingestion job {job_id} failed at stage {job['stage']} "
+                    f"(attempt {attempts}), retrying in {backoff}s: {str(e)}"
+                )
+                self._update(
+                    job_id, status="queued", attempts=attempts, error=str(e),
+                    available_at=time.time() + backoff
+                )
+            else:
+                logger.error(f"Ingestion job {job_id} failed at stage {job['stage']}: {str(e)}")
+                self._update(job_id, status="failed", attempts=attempts, error=str(e))
+                await self._discard_partial(job)
+                if self.near_duplicate_detector:
+                    # Nothing was stored, so later documents must not be deduplicated against it
+                    self.near_duplicate_detector.remove_document(job["document_id"])
+                self._cleanup(job_id)
+                self._notify(job_id)
+
+    async def _extract(self, job: Dict[str, Any]):
+        chunks = await self.document_processor.process_document(job["file_path"], job["filename"])
+
+        # Near-duplicates (licence headers, vendored files...) are not embedded again
+        duplicates = []
+        if self.near_duplicate_detector:
+            unique, duplicates = self.near_duplicate_detector.filter_chunks(job["document_id"], chunks)
+            if self.near_duplicate_detector.mode == "reference":
+                unique.extend(self._reference_stubs(job["document_id"], chunks, duplicates))
+                unique.sort(key=lambda chunk: chunk["chunk_index"])
+            chunks = unique
+
+        self._save_checkpoint(job["job_id"], "chunks", chunks)
+        self._update(
+            job["job_id"], chunks_total=len(chunks), chunks_duplicate=len(duplicates),
+            chunks_embedded=0, chunks_processed=0
+        )
+
+    @staticmethod
+    def _reference_stubs(
+        document_id: str,
+        chunks: List[Dict[str, Any]],
+        duplicates: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Stub chunks that stand in for a document's duplicates.
+
+        A stub keeps its own position and metadata plus the id of the chunk
+        it duplicates, so the document still has a complete set of chunks
+        to scope queries to, list and delete.
+        """
+        by_id = {f"{document_id}_{chunk.get('chunk_index', i)}": chunk for i, chunk in enumerate(chunks)}
+        stubs = []
+        for duplicate in duplicates:
+            chunk = by_id[duplicate["chunk_id"]]
+            stubs.append({
+                **chunk,
+                "metadata": {**chunk["metadata"], "canonical_chunk_id": duplicate["canonical_chunk_id"]}
+            })
+        return stubs
+
+    async def _embed(self, job: Dict[str, Any]):
+        chunks = self._load_checkpoint(job["job_id"], "chunks")
+        embeddings: List[Optional[List[float]]] = [None] * len(chunks)
+
+        stubs = [i for i, chunk in enumerate(chunks) if chunk["metadata"].get("canonical_chunk_id")]
+        regular = sorted(set(range(len(chunks))) - set(stubs))
+        await self._embed_chunks(job, chunks, regular, embeddings)
+
+        if stubs:
+            # Stubs reuse the vector of the chunk they duplicate, from this document or the store
+            known = {
+                f"{job['document_id']}_{chunk['chunk_index']}": embeddings[i]
+                for i, chunk in enumerate(chunks) if embeddings[i] is not None
+            }
+            canonical_ids = [chunks[i]["metadata"]["canonical_chunk_id"] for i in stubs]
+            known.update(await self.chroma_client.get_embeddings(
+                [chunk_id for chunk_id in canonical_ids if chunk_id not in known]
+            ))
+
+            orphaned = []
+            for i, canonical_chunk_id in zip(stubs, canonical_ids):
+                if canonical_chunk_id in known:
+                    embeddings[i] = known[canonical_chunk_id]
+                else:
+                    # The duplicated chunk was deleted meanwhile; store this one in full
+                    del chunks[i]["metadata"]["canonical_chunk_id"]
+                    orphaned.append(i)
+            self._update(job["job_id"], chunks_embedded=sum(vector is not None for vector in embeddings))
+            if orphaned:
+                await self._embed_chunks(job, chunks, orphaned, embeddings)
+                self._save_checkpoint(job["job_id"], "chunks", chunks)
+
+        self._save_checkpoint(job["job_id"], "embeddings", embeddings)
+
+    async def _embed_chunks(
+        self,
+        job: Dict[str, Any],
+        chunks: List[Dict[str, Any]],
+        indexes: List[int],
+        embeddings: List[Optional[List[float]]]
+    ):
+        for start in range(0, len(indexes), self.embed_batch_size):
+            batch = indexes[start:start + self.embed_batch_size]
+            vectors = await self.embedding_service.generate_embeddings([chunks[i]["text"] for i in batch])
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+            self._update(job["job_id"], chunks_embedded=sum(vector is not None for vector in embeddings))
+
+    async def _store(self, job: Dict[str, Any]):
+        chunks = self._load_checkpoint(job["job_id"], "chunks")
+        embeddings = self._load_checkpoint(job["job_id"], "embeddings")
+        total = len(chunks)
+
+        # Stubs are stored without text; it is read from the canonical chunk at query time
+        chunks = [
+            {**chunk, "text": ""} if chunk["metadata"].get("canonical_chunk_id") else chunk
+            for chunk in chunks
+        ]
+
+        # Lets readers tell a fully stored document from one still being stored
+        metadata = {**job["metadata"], "document_chunks": total}
+
+        # Chunk ids are derived from chunk_index, so re-storing a batch on retry is idempotent
+        for start in range(0, total, self.embed_batch_size):
+            end = start + self.embed_batch_size
+            await self.chroma_client.add_documents(
+                document_id=job["document_id"],
+                chunks=chunks[start:end],
+                embeddings=embeddings[start:end],
+                metadata=metadata
+            )
+            self._update(job["job_id"], chunks_processed=min(end, total))
+
+    async def _discard_partial(self, job: Dict[str, Any]):
+        """
+        Remove the batches a failed job already stored. They carry the
+        upload's content_hash, so leaving them would make every re-upload of
+        the file resolve to this incomplete document.
+        """
+        if job["stage"] != "store":
+            return
+        try:
+            await self.chroma_client.delete_document(job["document_id"])
+        except Exception as e:
+            logger.error(f"Error removing partial chunks of failed job {job['job_id']}: {str(e)}")
+
+    def _handle_document_event(self, event: str, document_id: str):
+        # Deleted chunks must stop matching as canonical copies for new documents;
+        # stubs of them were already stored in full by ChromaClient.delete_document
+        if event == "deleted":
+            self.near_duplicate_detector.release_references(document_id)
+            self.near_duplicate_detector.remove_document(document_id)
+
+    def _update(self, job_id: str, **fields: Any):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def _notify(self, job_id: str):
+        job = self.get_job(job_id)
+        for callback in self._listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                logger.error(f"Error in ingestion job listener: {str(e)}")
+
+    def _checkpoint_path(self, job_id: str, name: str) -> Path:
+        return self.work_dir / f"{job_id}.{name}.json"
+
+    def _save_checkpoint(self, job_id: str, name: str, data: Any):
+        path = self._checkpoint_path(job_id, name)
+        temp = path.with_suffix(".tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp, path)
+
+    def _load_checkpoint(self, job_id: str, name: str) -> Any:
+        with open(self._checkpoint_path(job_id, name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _cleanup(self, job_id: str):
+        for name in ("chunks", "embeddings"):
+            self._checkpoint_path(job_id, name).unlink(missing_ok=True)
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        chunks_total = row["chunks_total"]
+        return {
+            "job_id": row["id"],
+            "document_id": row["document_id"],
+            "filename": row["filename"],
+            "file_path": row["file_path"],
+            "metadata": json.loads(row["metadata"]),
+            "priority": row["priority"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "attempts": row["attempts"],
+            "chunks_total": chunks_total,
+            "chunks_embedded": row["chunks_embedded"],
+            "chunks_processed": row["chunks_processed"],
+            "chunks_duplicate": row["chunks_duplicate"],
+            # Embedding and storing each count for half of the work
+            "progress": round(
+                (row["chunks_embedded"] + row["chunks_processed"]) / (2 * chunks_total), 3
+            ) if chunks_total else 0.0,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
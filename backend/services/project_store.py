@@ -0,0 +1,232 @@
+import os
+import re
+import time
+import uuid
+import zipfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+import logging
+
+from utils.file_writer import FileWriter
+
+logger = logging.getLogger(__name__)
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.pending = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        self.pending += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.pending = 0
+        return data
+
+class VirtualProject:
+    """An in-memory generated project: a flat map of paths to file contents."""
+
+    def __init__(self, project_id: str, files: Dict[str, str], prompt: str = ""):
+        self.project_id = project_id
+        self.prompt = prompt
+        self.files = files
+        self.created_at = time.time()
+        self.size = sum(len(content.encode("utf-8")) for content in files.values())
+
+    def get_tree(self) -> List[Dict[str, Any]]:
+        """Build a nested file tree of folder and file nodes."""
+        root: Dict[str, Any] = {"children": {}}
+
+        for file_path in sorted(self.files):
+            node = root
+            parts = file_path.split("/")
+            for depth, part in enumerate(parts):
+                path = "/".join(parts[:depth + 1])
+                is_file = depth == len(parts) - 1
+                node = node["children"].setdefault(part, {
+                    "name": part,
+                    "path": path,
+                    "type": "file" if is_file else "folder",
+                    "children": {}
+                })
+                if is_file:
+                    node["size"] = len(self.files[file_path].encode("utf-8"))
+
+        def to_list(children: Dict[str, Any]) -> List[Dict[str, Any]]:
+            nodes = []
+            for child in children.values():
+                node = {key: value for key, value in child.items() if key != "children"}
+                if child["type"] == "folder":
+                    node["children"] = to_list(child["children"])
+                nodes.append(node)
+            # Folders first, then files, each alphabetically
+            return sorted(nodes, key=lambda node: (node["type"] != "folder", node["name"]))
+
+        return to_list(root["children"])
+
+    def iter_zip(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Stream the project as a zip archive without touching the disk."""
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for file_path in sorted(self.files):
+                archive.writestr(file_path, self.files[file_path])
+                if sink.pending >= chunk_size:
+                    yield sink.drain()
+        data = sink.drain()
+        if data:
+            yield data
+
+    def get_info(self) -> Dict[str, Any]:
+        """Summary of the project including its file tree."""
+        return {
+            "project_id": self.project_id,
+            "prompt": self.prompt,
+            "file_tree": self.get_tree(),
+            "total_files": len(self.files),
+            "total_size": self.size
+        }
+
+    def to_files_data(self) -> List[Dict[str, str]]:
+        return [{"path": path, "content": content} for path, content in self.files.items()]
+
+class ProjectStore:
+    """
+    Server-side store of generated projects held in memory.
+
+    Projects are evicted least-recently-used first once their total size
+    exceeds PROJECT_STORE_MAX_MB. Nothing is written to disk until a project
+    is explicitly exported.
+    """
+
+    def __init__(self):
+        self.max_bytes = int(float(os.getenv("PROJECT_STORE_MAX_MB", "256")) * 1024 * 1024)
+        self.max_project_bytes = int(float(os.getenv("PROJECT_MAX_MB", "16")) * 1024 * 1024)
+        self._projects: "OrderedDict[str, VirtualProject]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def create_project(self, files_data: List[Dict[str, str]], prompt: str = "") -> VirtualProject:
+        """
+        Store a generated website as a new project.
+
+        Args:
+            files_data: List of dictionaries with 'path' and 'content' keys
+            prompt: Prompt the project was generated from
+
+        Returns:
+            The stored project
+        """
+        files = {}
+        for file_data in files_data:
+            # Generated paths are often written root-relative ("/src/App.tsx")
+            file_path = self._clean_path(file_data.get("path", "").lstrip("/"))
+            files[file_path] = file_data.get("content", "")
+
+        project = VirtualProject(str(uuid.uuid4()), files, prompt)
+        if project.size > self.max_project_bytes:
+            raise ValueError(
+                f"Project size {project.size} bytes exceeds the {self.max_project_bytes} byte limit"
+            )
+
+        with self._lock:
+            self._projects[project.project_id] = project
+            self._size += project.size
+            self._evict()
+
+        logger.info(f"Stored project {project.project_id} ({len(files)} files, {project.size} bytes)")
+        return project
+
+    def get_project(self, project_id: str) -> VirtualProject:
+        """Get a project and mark it as recently used."""
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is None:
+                raise KeyError(f"Project not found: {project_id}")
+            self._projects.move_to_end(project_id)
+            return project
+
+    def get_file(self, project_id: str, file_path: str) -> str:
+        """Get the content of a single project file."""
+        project = self.get_project(project_id)
+        try:
+            return project.files[file_path.strip("/")]
+        except KeyError:
+            raise KeyError(f"File not found in project {project_id}: {file_path}")
+
+    def update_file(self, project_id: str, file_path: str, content: str):
+        """Create or replace a file in a project."""
+        project = self.get_project(project_id)
+        file_path = self._clean_path(file_path)
+
+        with self._lock:
+            if self._projects.get(project_id) is not project:
+                raise KeyError(f"Project not found: {project_id}")
+            old_size = len(project.files.get(file_path, "").encode("utf-8"))
+            new_size = len(content.encode("utf-8"))
+            if project.size - old_size + new_size > self.max_project_bytes:
+                raise ValueError(f"Project {project_id} would exceed the {self.max_project_bytes} byte limit")
+            project.files[file_path] = content
+            project.size += new_size - old_size
+            self._size += new_size - old_size
+            self._evict()
+
+    def delete_project(self, project_id: str):
+        with self._lock:
+            project = self._projects.pop(project_id, None)
+            if project:
+                self._size -= project.size
+
+    def export_project(self, project_id: str, base_path: str) -> Dict[str, Any]:
+        """Write a project to disk through FileWriter, refusing any path that resolves outside base_path."""
+        project = self.get_project(project_id)
+        root = Path(base_path).resolve()
+        escaped = [
+            file_path for file_path in project.files
+            if not (root / file_path).resolve().is_relative_to(root)
+        ]
+        if escaped:
+            raise ValueError(f"File paths outside the export directory: {', '.join(sorted(escaped))}")
+        return FileWriter(base_path).write_files(project.to_files_data(), snapshot=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "projects": len(self._projects),
+                "total_bytes": self._size,
+                "max_bytes": self.max_bytes
+            }
+
+    @staticmethod
+    def _clean_path(file_path: str) -> str:
+        """Normalize a project-relative path, rejecting absolute paths and '..' segments."""
+        normalized = file_path.replace("\\", "/")
+        parts = normalized.split("/")
+        if normalized.startswith("/") or re.match(r"^[A-Za-z]:", normalized) or ".." in parts:
+            raise ValueError(f"Invalid file path: {file_path}")
+        cleaned = "/".join(part for part in parts if part not in ("", "."))
+        if not cleaned:
+            raise ValueError(f"Invalid file path: {file_path}")
+        return cleaned
+
+    def _evict(self):
+        """Drop least-recently-used projects until under the size cap. Caller must hold the lock."""
+        while self._size > self.max_bytes and len(self._projects) > 1:
+            project_id, project = self._projects.popitem(last=False)
+            self._size -= project.size
+            logger.info(f"Evicted project {project_id} from the project store")
@@ -0,0 +1,304 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PLACEHOLDER_PATTERN = re.compile(r"(?<!\{)\{(\w+)\}(?!\})")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the Llama-family token count of a piece of text.
+
+    Words are counted at roughly four characters per token and each
+    punctuation mark or symbol as one token. Exact counts for sent requests
+    come from the Groq usage field; this is for comparing templates offline.
+    """
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0].isalnum() or piece[0] == "_":
+            count += max(1, (len(piece) + 3) // 4)
+        else:
+            count += 1
+    return count
+
+class PromptTemplate:
+    """A versioned system + user prompt pair with a precomputed token count."""
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        system: str,
+        user: str,
+        description: str = "",
+        tokenizer: Callable[[str], int] = estimate_tokens
+    ):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+        self.description = description
+        self.placeholders = sorted(set(_PLACEHOLDER_PATTERN.findall(user)))
+
+        # Tokens paid on every request regardless of the query and context
+        fixed_user = _PLACEHOLDER_PATTERN.sub("", user).replace("{{", "{").replace("}}", "}")
+        self.fixed_tokens = tokenizer(system) + tokenizer(fixed_user)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def render(self, **values: str) -> List[Dict[str, str]]:
+        """Fill in the user template and return chat messages."""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(**values)}
+        ]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "description": self.description,
+            "placeholders": self.placeholders,
+            "fixed_tokens": self.fixed_tokens
+        }
+
+class PromptRegistry:
+    """
+    Registry of prompt templates by name and version.
+
+    The active version of a template is read from PROMPT_<NAME>_VERSION
+    (e.g. PROMPT_RAG_ANSWER_VERSION=v2-compact) and falls back to the
+    template's default version.
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._defaults: Dict[str, str] = {}
+
+    def register(self, template: PromptTemplate, default: bool = False):
+        versions = self._templates.setdefault(template.name, {})
+        if template.version in versions:
+            raise ValueError(f"Prompt template already registered: {template.key}")
+        versions[template.version] = template
+        if default or template.name not in self._defaults:
+            self._defaults[template.name] = template.version
+
+    def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
+        """Get a template by name, using the configured version if none is given."""
+        if name not in self._templates:
+            raise KeyError(f"Unknown prompt template: {name}")
+
+        version = version or os.getenv(f"PROMPT_{name.upper()}_VERSION") or self._defaults[name]
+        try:
+            return self._templates[name][version]
+        except KeyError:
+            raise KeyError(f"Unknown version '{version}' for prompt template: {name}")
+
+    def list_templates(self) -> List[Dict[str, object]]:
+        """List all registered templates with their token counts."""
+        return [
+            {**template.to_dict(), "default": self._defaults[name] == version}
+            for name, versions in self._templates.items()
+            for version, template in versions.items()
+        ]
+
+# RAG answer templates
+
+RAG_ANSWER_V1 = PromptTemplate(
+    name="rag_answer",
+    version="v1",
+    description="Master hybrid prompt for the web development RAG assistant (with animations)",
+    system="You are a helpful assistant that answers questions based on provided context. Always cite your sources and be accurate.",
+    user="""
+You are an **AI Web Development Assistant** specialized in creating 
+**modern, production-ready websites**.
+
+You work in a **HYBRID MODE**:
+- First, use the given context (collected from public modern website repositories).  
+- If the context is missing, incomplete, or irrelevant → rely on your own knowledge and expertise.  
+- Do not tell the user that the context is missing. Always provide the best possible answer.  
+
+⚠️ Important Rules:
+- The repositories are from the public domain, but we do not own their rights.  
+  → **Never copy-paste code directly.**  
+  → Always **rewrite, restructure, optimize, and improve** code while taking inspiration.  
+- When asked to create a **complete website**, never replicate a single repo.  
+  → Instead, combine **multiple inspirations** (or your expertise) into a **single unified theme**.
+
+---
+
+### ✅ Guidelines for Responses
+
+1. **Knowledge Usage**
+   - Use repo context when available (patterns, structures, techniques).  
+   - If context is weak → fill gaps with your own expertise.  
+   - Always ensure originality.
+
+2. **Code Generation**
+   - Always output **working, production-ready code**.  
+   - Prefer modern frameworks/tools: **React, Next.js, Tailwind CSS, shadcn/ui, Framer Motion**.  
+   - Use modern animation libraries: **Framer Motion, GSAP, Lottie, Tailwind transitions/animations**.  
+   - Add animations to UI components (e.g., page transitions, hover effects, modals) but **do not overdo it**.  
+   - Ensure **responsive design, accessibility, SEO, and clean architecture**.  
+   - Provide **full snippets** (imports included).  
+   - Add short **inline comments** for tricky parts.
+
+3. **Originality & Ethics**
+   - Never directly copy repo code.  
+   - Rename variables, refactor components, restructure logic.  
+   - Blend multiple repo ideas or invent new approaches.  
+   - Output should look **unique, polished, and modern**.  
+
+4. **Best Practices**
+   - Accessibility: ARIA roles, semantic HTML, screen reader support.  
+   - SEO: semantic tags, metadata, OpenGraph.  
+   - Performance: lazy loading, code splitting, optimized assets.  
+   - Security: sanitized inputs, safe API usage.  
+   - Scalability: modular, reusable components, clean folder structure.  
+
+5. **Creativity & UX Enhancements**
+   - Always suggest at least **one improvement** beyond the repos.  
+     (e.g., dark mode, micro-interactions, animations, better UX flow, performance boost).  
+   - Maintain a **consistent theme** (colors, typography, spacing).  
+   - Recommend **design systems** (Material UI, Radix, or custom).  
+   - Use **animations sparingly and tastefully** — subtle transitions, page fade-ins, or hover effects.  
+
+6. **Answer Formatting**
+   - Use **Markdown**.  
+   - Organize answers in sections: **Explanation → Code → Improvements**.  
+   - For full websites, include **suggested file structure**.  
+   - If inspired by context, you may say *"inspired by repo patterns"* but never quote exact code.  
+
+7. **Fallback Handling**
+   - If repo context is irrelevant, rely fully on your own reasoning.  
+   - Always provide a useful answer — never leave the user without a solution.  
+   - If the query is ambiguous, politely suggest clarifications.  
+
+8. **Tone & Style**
+   - Be **helpful, professional, and concise**.  
+   - Assume the user is a **developer** who wants clean code and short explanations.  
+   - Avoid unnecessary verbosity — focus on clarity and usefulness.  
+
+---
+
+### Context (from modern website repos):
+{context}
+
+### Question:
+{query}
+
+### Answer:
+"""
+)
+
+RAG_ANSWER_V2_COMPACT = PromptTemplate(
+    name="rag_answer",
+    version="v2-compact",
+    description="Compact rewrite of v1 keeping its rules, for prefill cost comparison",
+    system=(
+        "You are a web development assistant. Use the provided context (from public "
+        "website repositories) when relevant and your own expertise otherwise; never "
+        "mention missing context. Never copy repository code verbatim: rewrite, "
+        "restructure and improve it. Prefer React, Next.js, Tailwind CSS and Framer "
+        "Motion with subtle animations. Give complete, responsive, accessible, "
+        "production-ready code with imports. Suggest one improvement. Answer in "
+        "Markdown as Explanation, Code, Improvements. Always cite your sources and "
+        "be accurate. Be concise."
+    ),
+    user="""Context:
+{context}
+
+Question:
+{query}
+"""
+)
+
+# Website generation templates
+
+WEBSITE_V1 = PromptTemplate(
+    name="website",
+    version="v1",
+    description="Comprehensive website generation prompt",
+    system="""You are an expert full-stack developer who creates complete, production-ready websites. 
+                            You MUST respond with ONLY a valid JSON object containing the file structure and code.
+                            Do not include any explanatory text before or after the JSON.
+                            The JSON must have this exact structure:
+                            {
+                                "files": [
+                                    {
+                                        "path": "src/App.tsx",
+                                        "content": "// file content here"
+                                    }
+                                ]
+                            }""",
+    user="""
+Create a complete, modern, production-ready website based on this request: "{user_prompt}"
+
+Requirements:
+1. Use React 18 with TypeScript
+2. Use Tailwind CSS for styling
+3. Create a responsive, mobile-first design
+4. Include proper component structure and organization
+5. Add proper TypeScript types and interfaces
+6. Include navigation between pages if multi-page
+7. Use modern React patterns (hooks, functional components)
+8. Add proper error handling and loading states
+9. Include accessibility features (ARIA labels, semantic HTML)
+10. Make it visually appealing with modern design principles
+
+File Structure Guidelines:
+- Main App component: src/App.tsx
+- Components: src/components/[ComponentName].tsx
+- Pages: src/pages/[PageName].tsx (if multi-page)
+- Types: src/types/[TypeName].ts
+- Utils: src/utils/[utilName].ts
+- Styles: src/styles/[styleName].css (if needed beyond Tailwind)
+
+You MUST respond with ONLY a JSON object in this exact format:
+{{
+    "files": [
+        {{
+            "path": "src/App.tsx",
+            "content": "import React from 'react';\\n\\nfunction App() {{\\n  return (\\n    <div className=\\"min-h-screen bg-gray-100\\">\\n      <h1>Hello World</h1>\\n    </div>\\n  );\\n}}\\n\\nexport default App;"
+        }},
+        {{
+            "path": "src/components/Header.tsx",
+            "content": "// component code here"
+        }}
+    ]
+}}
+
+Important:
+- Escape all quotes and newlines properly in the JSON
+- Include ALL necessary files for a complete website
+- Make sure all imports are correct
+- Ensure the code is production-ready
+- Do not include any text outside the JSON object
+"""
+)
+
+WEBSITE_V2_COMPACT = PromptTemplate(
+    name="website",
+    version="v2-compact",
+    description="Compact rewrite of v1 keeping its rules, for prefill cost comparison",
+    system=(
+        "You are an expert full-stack developer. Respond with ONLY a valid JSON object "
+        'of the form {"files": [{"path": "src/App.tsx", "content": "..."}]} and no '
+        "other text."
+    ),
+    user="""Build a complete, production-ready website for: "{user_prompt}"
+Stack: React 18 + TypeScript + Tailwind CSS, functional components and hooks.
+Responsive, accessible (ARIA, semantic HTML), typed, with loading and error states.
+Layout: src/App.tsx, src/components/*.tsx, src/pages/*.tsx, src/types/*.ts, src/utils/*.ts.
+Include every file needed, keep imports correct and escape quotes and newlines in JSON strings.
+"""
+)
+
+prompt_registry = PromptRegistry()
+for _template in (RAG_ANSWER_V1, RAG_ANSWER_V2_COMPACT, WEBSITE_V1, WEBSITE_V2_COMPACT):
+    prompt_registry.register(_template)
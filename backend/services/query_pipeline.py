@@ -0,0 +1,419 @@
+import os
+import re
+import asyncio
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+import logging
+
+from database.chroma_client import ChromaClient
+from services.embedding_service import EmbeddingService
+from services.groq_service import GroqService
+from services.semantic_cache import SemanticCache
+from utils.metrics import PIPELINE_IN_FLIGHT
+from utils.resilience import Deadline
+from utils.singleflight import SingleFlight, make_query_key
+from utils.timeline import StageTimeline
+
+logger = logging.getLogger(__name__)
+
+_KEYWORD_PATTERN = re.compile(r"[A-Za-z_][\w\-]{3,}")
+_STOPWORDS = {
+    "about", "add", "also", "build", "can", "could", "create", "does", "from",
+    "have", "how", "into", "make", "should", "that", "the", "them", "then",
+    "there", "these", "this", "using", "what", "when", "where", "which",
+    "while", "will", "with", "would", "your"
+}
+
+class QueryPipeline:
+    """
+    Runs the RAG query flow: embed, retrieve, generate.
+
+    The optional keyword lookup and the Groq connection warm-up are started
+    while the query is still being embedded, and the neighbouring chunks of
+    each hit are fetched in the same executor job as the vector query, so
+    the critical path is embedding -> vector query -> generation. Each
+    request records a StageTimeline.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        chroma_client: ChromaClient,
+        groq_service: GroqService,
+        semantic_cache: Optional[SemanticCache] = None,
+        singleflight: Optional[SingleFlight] = None
+    ):
+        self.embedding_service = embedding_service
+        self.chroma_client = chroma_client
+        self.groq_service = groq_service
+        self.semantic_cache = semantic_cache
+        self.singleflight = singleflight or SingleFlight()
+        PIPELINE_IN_FLIGHT.set_function(self.singleflight.in_flight, pipeline="query")
+        if semantic_cache:
+            chroma_client.add_listener(semantic_cache.handle_document_event)
+
+        self.keyword_search_enabled = os.getenv("QUERY_KEYWORD_SEARCH", "false").lower() == "true"
+        self.context_window = int(os.getenv("CONTEXT_EXPANSION_WINDOW", "1"))
+
+    async def run(
+        self,
+        query: str,
+        max_results: int = 5,
+        document_ids: Optional[List[str]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer a query from the document collection.
+
+        Embedding, retrieval and generation each run within their share of
+        the deadline; DeadlineExceeded is raised when a stage overruns.
+        """
+        deadline = deadline or Deadline.for_query()
+
+        try:
+            key = make_query_key(query, document_ids, max_results)
+            response = await self.singleflight.do(
+                key, lambda: self._run(query, max_results, document_ids, deadline)
+            )
+            return {**response, "query": query}
+
+        except Exception as e:
+            logger.error(f"Error running query pipeline: {str(e)}")
+            raise
+
+    async def run_stream(
+        self,
+        query: str,
+        max_results: int = 5,
+        document_ids: Optional[List[str]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a query as a stream of events.
+
+        Yields a "context" event with sources and chunks, then "token" events
+        with answer deltas, then a final "done" event carrying the timeline.
+        """
+        deadline = deadline or Deadline.for_query()
+        key = make_query_key(query, document_ids, max_results)
+        async for event in self.singleflight.stream(
+            key, lambda: self._run_stream(query, max_results, document_ids, deadline)
+        ):
+            yield event
+
+    async def _run(
+        self,
+        query: str,
+        max_results: int,
+        document_ids: Optional[List[str]],
+        deadline: Deadline
+    ) -> Dict[str, Any]:
+        """Compute a response; shared by all coalesced callers."""
+        timeline = StageTimeline("query")
+        generation = self.semantic_cache.generation() if self.semantic_cache else None
+        speculative = self._start_speculative(query, max_results, document_ids, timeline)
+
+        try:
+            query_embedding, cached = await timeline.track(
+                "embedding", self._embed_and_check_cache(query, max_results, document_ids, deadline)
+            )
+            if cached:
+                return {**cached, "timeline": timeline.to_list()}
+
+            context_chunks, context = await self._retrieve(
+                query_embedding, max_results, document_ids, deadline, timeline, speculative
+            )
+            answer = await timeline.track(
+                "generation", self.groq_service.generate_answer(query, context, deadline=deadline)
+            )
+
+            response = self._build_response(query, answer, context_chunks)
+            self._store_in_cache(
+                query, query_embedding, response, context_chunks, max_results, document_ids, generation
+            )
+            return {**response, "timeline": timeline.to_list()}
+
+        finally:
+            self._cancel(speculative)
+            timeline.log()
+
+    async def _run_stream(
+        self,
+        query: str,
+        max_results: int,
+        document_ids: Optional[List[str]],
+        deadline: Deadline
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Produce the event stream; shared by all coalesced callers."""
+        timeline = StageTimeline("query_stream")
+        generation = self.semantic_cache.generation() if self.semantic_cache else None
+        speculative = self._start_speculative(query, max_results, document_ids, timeline)
+
+        try:
+            query_embedding, cached = await timeline.track(
+                "embedding", self._embed_and_check_cache(query, max_results, document_ids, deadline)
+            )
+            if cached:
+                yield {"type": "context", "sources": cached["sources"], "context_chunks": cached["context_chunks"], "cached": True}
+                yield {"type": "token", "content": cached["answer"]}
+                yield {"type": "done", "timeline": timeline.to_list()}
+                return
+
+            context_chunks, context = await self._retrieve(
+                query_embedding, max_results, document_ids, deadline, timeline, speculative
+            )
+            response = self._build_response(query, "", context_chunks)
+            yield {"type": "context", "sources": response["sources"], "context_chunks": context_chunks, "cached": False}
+
+            parts = []
+            async with timeline.stage("generation"):
+                async for delta in self.groq_service.stream_answer(query, context, deadline=deadline):
+                    parts.append(delta)
+                    yield {"type": "token", "content": delta}
+
+            response["answer"] = "".join(parts)
+            self._store_in_cache(
+                query, query_embedding, response, context_chunks, max_results, document_ids, generation
+            )
+            yield {"type": "done", "timeline": timeline.to_list()}
+
+        finally:
+            self._cancel(speculative)
+            timeline.log()
+
+    def _start_speculative(
+        self,
+        query: str,
+        max_results: int,
+        document_ids: Optional[List[str]],
+        timeline: StageTimeline
+    ) -> Dict[str, asyncio.Task]:
+        """Start work that does not depend on the query embedding."""
+        tasks = {
+            "llm_connect": asyncio.ensure_future(
+                timeline.track("llm_connect", self.groq_service.warm_up_connection())
+            )
+        }
+
+        terms = self._keyword_terms(query)
+        if self.keyword_search_enabled and terms:
+            tasks["keyword"] = asyncio.ensure_future(timeline.track(
+                "keyword_search",
+                self.chroma_client.keyword_search(terms, max_results, document_ids)
+            ))
+
+        return tasks
+
+    @staticmethod
+    def _cancel(tasks: Dict[str, asyncio.Task]):
+        """Cancel speculative work that is still running."""
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception():
+                logger.warning(f"Speculative task failed: {str(task.exception())}")
+
+    async def _embed_and_check_cache(
+        self,
+        query: str,
+        max_results: int,
+        document_ids: Optional[List[str]],
+        deadline: Deadline
+    ) -> Tuple[List[float], Optional[Dict[str, Any]]]:
+        """Embed the query and look it up in the semantic cache."""
+        embeddings = await deadline.run("embedding", self.embedding_service.generate_embeddings([query]))
+        query_embedding = embeddings[0]
+
+        if self.semantic_cache:
+            cached = self.semantic_cache.lookup(query, query_embedding, document_ids, max_results)
+            if cached:
+                logger.info(f"Semantic cache hit for query: {query[:80]}")
+                return query_embedding, {**cached, "query": query, "cached": True}
+
+        return query_embedding, None
+
+    async def _retrieve(
+        self,
+        query_embedding: List[float],
+        max_results: int,
+        document_ids: Optional[List[str]],
+        deadline: Deadline,
+        timeline: StageTimeline,
+        speculative: Dict[str, asyncio.Task]
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """Fetch the most similar chunks and build the expanded prompt context."""
+        results = await timeline.track("vector_search", deadline.run(
+            "retrieval",
+            self.chroma_client.query_with_neighbors(
+                query_embedding=query_embedding,
+                n_results=max_results,
+                document_ids=document_ids,
+                window=self.context_window
+            )
+        ))
+
+        keyword_results = None
+        keyword_task = speculative.get("keyword")
+        if keyword_task:
+            try:
+                keyword_results = await deadline.run("retrieval", asyncio.shield(keyword_task))
+            except Exception as e:
+                logger.warning(f"Keyword search skipped: {str(e)}")
+
+        async with timeline.stage("prompt_build"):
+            context_chunks = self._merge_results(results, keyword_results, max_results)
+            context = self._build_context(context_chunks, results.get("neighbors", {}))
+
+        return context_chunks, context
+
+    def _build_response(
+        self,
+        query: str,
+        answer: str,
+        context_chunks: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Assemble the response payload for a query."""
+        return {
+            "query": query,
+            "answer": answer,
+            "sources": self._unique(chunk["metadata"].get("filename", "Unknown") for chunk in context_chunks),
+            "context_chunks": context_chunks,
+            "cached": False
+        }
+
+    def _store_in_cache(
+        self,
+        query: str,
+        query_embedding: List[float],
+        response: Dict[str, Any],
+        context_chunks: List[Dict[str, Any]],
+        max_results: int,
+        document_ids: Optional[List[str]],
+        generation: Optional[int] = None
+    ):
+        """Cache a computed response under its query embedding, unless invalidated since `generation`."""
+        if not self.semantic_cache or not context_chunks:
+            return
+
+        source_document_ids = self._unique(
+            chunk["metadata"].get("document_id") for chunk in context_chunks
+            if chunk["metadata"].get("document_id")
+        )
+        self.semantic_cache.store(
+            query, query_embedding, response, source_document_ids, document_ids, max_results, generation
+        )
+
+    def _build_context_chunks(self, results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Flatten a Chroma query result into scored context chunks."""
+        if not results.get("ids") or not results["ids"][0]:
+            return []
+
+        documents = results["documents"][0]
+        metadatas = results["metadatas"][0] if results.get("metadatas") else [{}] * len(documents)
+        distances = results["distances"][0] if results.get("distances") else [0.0] * len(documents)
+
+        return [
+            {
+                "text": text,
+                "metadata": metadata or {},
+                # Cosine distance -> similarity
+                "score": 1.0 - float(distance)
+            }
+            for text, metadata, distance in zip(documents, metadatas, distances)
+        ]
+
+    def _merge_results(
+        self,
+        results: Dict[str, Any],
+        keyword_results: Optional[Dict[str, Any]],
+        max_results: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Vector hits first, then the best keyword hits in any slots left over.
+
+        Keyword hits never displace a vector hit; they only matter when the
+        vector search returns fewer than max_results chunks (small or
+        narrowly scoped collections). They carry a score of 0.0, since no
+        vector similarity was computed for them.
+        """
+        context_chunks = self._build_context_chunks(results)
+        if not keyword_results or not keyword_results.get("ids") or len(context_chunks) >= max_results:
+            return context_chunks
+
+        seen = set(chunk["metadata"].get("chunk_id") or chunk["text"] for chunk in context_chunks)
+        for text, metadata in zip(keyword_results["documents"], keyword_results["metadatas"]):
+            metadata = metadata or {}
+            chunk_id = metadata.get("chunk_id") or text
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            context_chunks.append({"text": text, "metadata": metadata, "score": 0.0})
+            if len(context_chunks) >= max_results:
+                break
+
+        return context_chunks
+
+    def _build_context(
+        self,
+        context_chunks: List[Dict[str, Any]],
+        neighbors: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> str:
+        """Join context chunks, each expanded with its prefetched neighbours, into one block."""
+        neighbors = neighbors or {}
+        used = set(chunk["metadata"].get("chunk_id") for chunk in context_chunks)
+        blocks = []
+
+        for chunk in context_chunks:
+            metadata = chunk["metadata"]
+            document_id = metadata.get("document_id")
+            chunk_index = metadata.get("chunk_index")
+            before, after = [], []
+
+            if document_id is not None and chunk_index is not None:
+                for offset in range(-self.context_window, self.context_window + 1):
+                    neighbor = neighbors.get(f"{document_id}_{chunk_index + offset}")
+                    if not offset or not neighbor or neighbor["metadata"].get("chunk_id") in used:
+                        continue
+                    if offset < 0:
+                        before.append(self._trim_overlap(neighbor, metadata, before=True))
+                    else:
+                        after.append(self._trim_overlap(neighbor, metadata, before=False))
+
+            text = " ".join(part for part in before + [chunk["text"]] + after if part)
+            blocks.append(f"Source: {metadata.get('filename', 'Unknown')}\n{text}")
+
+        return "\n\n".join(blocks)
+
+    @staticmethod
+    def _trim_overlap(neighbor: Dict[str, Any], metadata: Dict[str, Any], before: bool) -> str:
+        """Drop the words a neighbouring chunk shares with the hit it expands."""
+        neighbor_start = neighbor["metadata"].get("start_word")
+        start = metadata.get("start_word")
+        end = metadata.get("end_word")
+
+        if None in (neighbor_start, start, end):
+            return neighbor["text"]
+
+        words = neighbor["text"].split()
+        if before:
+            return " ".join(words[:max(0, start - neighbor_start)])
+        return " ".join(words[max(0, end - neighbor_start):])
+
+    @staticmethod
+    def _keyword_terms(query: str, limit: int = 3) -> List[str]:
+        """Pick the most distinctive words of a query for the keyword lookup."""
+        terms = [
+            term for term in dict.fromkeys(_KEYWORD_PATTERN.findall(query))
+            if term.lower() not in _STOPWORDS
+        ]
+        return sorted(terms, key=len, reverse=True)[:limit]
+
+    @staticmethod
+    def _unique(values) -> List[Any]:
+        """De-duplicate values while preserving order."""
+        seen = set()
+        unique = []
+        for value in values:
+            if value not in seen:
+                seen.add(value)
+                unique.append(value)
+        return unique
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import logging
+
+import numpy as np
+
+from utils.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """
+    Answer cache keyed by query embedding similarity, document scope and
+    result count.
+
+    Register handle_document_event with ChromaClient.add_listener so that
+    answers are invalidated when documents are stored or deleted. Take a
+    generation() token before retrieving context and pass it to store(), so
+    an answer computed across an invalidation is not cached afterwards.
+
+    Entries and invalidation are local to the process. With several API
+    workers, a document change seen by one worker does not reach the
+    caches of the others; there, entries only go stale until their TTL
+    (SEMANTIC_CACHE_TTL_SECONDS), so keep it short or run one worker.
+    """
+
+    def __init__(self):
+        self.threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+        self.max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+        self.ttl_seconds = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+        self.audit_log_path = Path(
+            os.getenv("SEMANTIC_CACHE_AUDIT_LOG", "./logs/semantic_cache_audit.jsonl")
+        )
+
+        self._entries: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+        # Invalidations are numbered; each scope remembers the last one that hit it
+        self._sequence = 0
+        self._invalidated_at: Dict[str, int] = {}
+        self._unscoped_invalidated_at = 0
+        self._cleared_at = 0
+
+    def set_threshold(self, threshold: float):
+        """Adjust the cosine similarity threshold used for cache hits."""
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("Threshold must be in the range (0, 1]")
+        self.threshold = threshold
+        logger.info(f"Semantic cache threshold set to {threshold}")
+
+    def lookup(
+        self,
+        query: str,
+        query_embedding: List[float],
+        document_ids: Optional[List[str]] = None,
+        max_results: int = 5
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a semantically equivalent query.
+
+        Args:
+            query: Raw query text, used for the audit log
+            query_embedding: Embedding of the incoming query
+            document_ids: Document scope of the incoming query
+            max_results: Number of context chunks the query asked for
+
+        Returns:
+            The cached response payload, or None on a miss
+        """
+        scope = self._scope_key(document_ids)
+        vector = self._normalize(query_embedding)
+
+        with self._lock:
+            self._evict_expired()
+            if not self._entries:
+                CACHE_LOOKUPS.inc(cache="semantic", result="miss")
+                return None
+
+            if self._matrix is None:
+                self._matrix = np.vstack([entry["embedding"] for entry in self._entries])
+
+            similarities = self._matrix @ vector
+
+            best_index = -1
+            best_similarity = -1.0
+            for index in np.argsort(-similarities):
+                entry = self._entries[index]
+                if entry["scope"] == scope and entry["max_results"] == max_results:
+                    best_index = int(index)
+                    best_similarity = float(similarities[index])
+                    break
+
+            if best_index < 0 or best_similarity < self.threshold:
+                CACHE_LOOKUPS.inc(cache="semantic", result="miss")
+                return None
+
+            entry = self._entries[best_index]
+            entry["hits"] += 1
+            CACHE_LOOKUPS.inc(cache="semantic", result="hit")
+
+        self._audit(query, entry, best_similarity)
+        return entry["response"]
+
+    def generation(self) -> int:
+        """Token identifying the invalidations seen so far; see store()."""
+        with self._lock:
+            return self._sequence
+
+    def store(
+        self,
+        query: str,
+        query_embedding: List[float],
+        response: Dict[str, Any],
+        source_document_ids: List[str],
+        document_ids: Optional[List[str]] = None,
+        max_results: int = 5,
+        generation: Optional[int] = None
+    ):
+        """
+        Cache an answered query.
+
+        Args:
+            query: Query text the answer was generated for
+            query_embedding: Embedding of the query
+            response: Response payload returned to the client
+            source_document_ids: Documents the answer's context was drawn from
+            document_ids: Document scope the query was restricted to
+            max_results: Number of context chunks the answer was built from
+            generation: generation() taken before the answer's context was
+                retrieved; the answer is dropped if its scope or sources were
+                invalidated since
+        """
+        entry = {
+            "query": query,
+            "embedding": self._normalize(query_embedding),
+            "response": response,
+            "scope": self._scope_key(document_ids),
+            "max_results": max_results,
+            "source_document_ids": set(source_document_ids),
+            "created_at": time.time(),
+            "hits": 0
+        }
+
+        with self._lock:
+            if generation is not None and self._invalidated_since(entry, generation):
+                logger.info(f"Not caching answer invalidated while it was generated: {query[:80]}")
+                return
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                # Drop the oldest entries first
+                self._entries = self._entries[-self.max_entries:]
+            self._matrix = None
+
+    def invalidate_document(self, document_id: str):
+        """Drop cached answers that may depend on the given document."""
+        with self._lock:
+            self._sequence += 1
+            self._invalidated_at[document_id] = self._sequence
+            before = len(self._entries)
+            self._entries = [
+                entry for entry in self._entries
+                if document_id not in entry["source_document_ids"]
+                and (entry["scope"] is None or document_id not in entry["scope"])
+            ]
+            self._matrix = None
+
+        removed = before - len(self._entries)
+        if removed:
+            logger.info(f"Invalidated {removed} cached answers for document {document_id}")
+
+    def invalidate_unscoped(self):
+        """Drop cached answers for unscoped queries, e.g. after a new upload."""
+        with self._lock:
+            self._sequence += 1
+            self._unscoped_invalidated_at = self._sequence
+            self._entries = [entry for entry in self._entries if entry["scope"] is not None]
+            self._matrix = None
+
+    def handle_document_event(self, event: str, document_id: str):
+        """
+        ChromaClient listener. Stored chunks can change any unscoped answer and
+        any answer scoped to their document; a deletion invalidates the answers
+        drawn from or scoped to the deleted document.
+        """
+        self.invalidate_document(document_id)
+        if event == "added":
+            self.invalidate_unscoped()
+
+    def clear(self):
+        """Remove all cached answers."""
+        with self._lock:
+            self._sequence += 1
+            self._cleared_at = self._sequence
+            self._entries = []
+            self._matrix = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": sum(entry["hits"] for entry in self._entries),
+                "threshold": self.threshold,
+                "max_entries": self.max_entries
+            }
+
+    def _invalidated_since(self, entry: Dict[str, Any], generation: int) -> bool:
+        """Whether the entry's scope or sources were invalidated after `generation`. Caller must hold the lock."""
+        if self._cleared_at > generation:
+            return True
+        if entry["scope"] is None and self._unscoped_invalidated_at > generation:
+            return True
+        documents = entry["source_document_ids"] | (entry["scope"] or frozenset())
+        return any(self._invalidated_at.get(document_id, 0) > generation for document_id in documents)
+
+    def _evict_expired(self):
+        """Remove entries older than the TTL. Caller must hold the lock."""
+        cutoff = time.time() - self.ttl_seconds
+        if self._entries and self._entries[0]["created_at"] < cutoff:
+            self._entries = [entry for entry in self._entries if entry["created_at"] >= cutoff]
+            self._matrix = None
+
+    def _audit(self, query: str, entry: Dict[str, Any], similarity: float):
+        """Append a cache hit to the audit log."""
+        record = {
+            "timestamp": time.time(),
+            "query": query,
+            "cached_query": entry["query"],
+            "similarity": round(similarity, 4),
+            "threshold": self.threshold,
+            "scope": sorted(entry["scope"]) if entry["scope"] is not None else None
+        }
+
+        try:
+            self.audit_log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.audit_log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            logger.warning(f"Error writing semantic cache audit log: {str(e)}")
+
+    @staticmethod
+    def _scope_key(document_ids: Optional[List[str]]) -> Optional[frozenset]:
+        """Normalize a document scope so that ordering does not matter."""
+        if not document_ids:
+            return None
+        return frozenset(document_ids)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
@@ -0,0 +1,175 @@
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from database.chroma_client import ChromaClient
+
+logger = logging.getLogger(__name__)
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE_MB."""
+
+class UploadService:
+    """
+    Service for receiving uploaded documents.
+
+    Uploads are streamed to disk in fixed-size chunks, so memory use does not
+    depend on the file size, and hashed on the fly. An upload whose content
+    hash is already stored or being ingested short-circuits to the existing
+    document id, skipping extraction, embedding and the Chroma insert.
+
+    Uploads of the same content are resolved one at a time (a lock per
+    content hash), so concurrent identical uploads yield one new document.
+    An in-progress entry is released by the ingestion queue listener, or
+    expires after UPLOAD_PENDING_TTL_SECONDS when no listener reports back.
+    """
+
+    SUPPORTED_EXTENSIONS = [".pdf", ".docx", ".txt", ".md"]
+
+    def __init__(self, chroma_client: ChromaClient, ingestion_queue=None):
+        self.chroma_client = chroma_client
+        self.upload_dir = Path(os.getenv("UPLOAD_DIR", "./uploads"))
+        self.chunk_size = int(os.getenv("UPLOAD_CHUNK_SIZE_KB", "1024")) * 1024
+        self.max_size = int(float(os.getenv("MAX_UPLOAD_SIZE_MB", "50")) * 1024 * 1024)
+        self.pending_ttl = float(os.getenv("UPLOAD_PENDING_TTL_SECONDS", "3600"))
+
+        # Content hash -> (document id, reserved at) for uploads that are still being ingested
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        # Content hash -> (lock, number of uploads using it)
+        self._hash_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        if ingestion_queue is not None:
+            ingestion_queue.add_listener(self.handle_ingestion_job)
+
+    async def save_upload(self, upload_file, filename: str) -> Dict[str, Any]:
+        """
+        Stream an upload to disk, or resolve it to an existing document.
+
+        Args:
+            upload_file: Object with an async read(size) method, e.g. a
+                FastAPI UploadFile
+            filename: Original filename of the upload
+
+        Returns:
+            Dictionary with 'document_id', 'filename', 'file_path',
+            'file_size', 'content_hash' and 'duplicate'. When 'duplicate' is
+            True the file was not kept and needs no ingestion.
+        """
+        filename = Path(filename).name
+        file_extension = Path(filename).suffix.lower()
+        if file_extension not in self.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.upload_dir / f".{uuid.uuid4().hex}.part"
+        loop = asyncio.get_event_loop()
+        digest = hashlib.sha256()
+        file_size = 0
+
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await upload_file.read(self.chunk_size)
+                    if not chunk:
+                        break
+
+                    file_size += len(chunk)
+                    if file_size > self.max_size:
+                        raise UploadTooLargeError(
+                            f"File exceeds the {self.max_size // (1024 * 1024)} MB upload limit"
+                        )
+
+                    digest.update(chunk)
+                    await loop.run_in_executor(None, f.write, chunk)
+
+            content_hash = digest.hexdigest()
+            async with self._hash_lock(content_hash):
+                existing_id = await self.find_existing(content_hash)
+                if existing_id:
+                    temp_path.unlink(missing_ok=True)
+                    logger.info(f"Upload {filename} matches existing document {existing_id}, skipping ingestion")
+                    return {
+                        "document_id": existing_id,
+                        "filename": filename,
+                        "file_path": None,
+                        "file_size": file_size,
+                        "content_hash": content_hash,
+                        "duplicate": True
+                    }
+
+                document_id = str(uuid.uuid4())
+                file_path = self.upload_dir / f"{document_id}_{filename}"
+                os.replace(temp_path, file_path)
+                self._pending[content_hash] = (document_id, time.monotonic())
+
+            logger.info(f"Saved upload {filename} ({file_size} bytes) as document {document_id}")
+            return {
+                "document_id": document_id,
+                "filename": filename,
+                "file_path": str(file_path),
+                "file_size": file_size,
+                "content_hash": content_hash,
+                "duplicate": False
+            }
+
+        except Exception:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    async def find_existing(self, content_hash: str) -> Optional[str]:
+        """Document id for a content hash that is being ingested or already stored."""
+        pending = self._pending.get(content_hash)
+        if pending:
+            document_id, reserved_at = pending
+            if time.monotonic() - reserved_at < self.pending_ttl:
+                return document_id
+            # Nobody reported the ingestion's outcome; look in Chroma instead
+            self.release(content_hash)
+        return await self.chroma_client.find_document_by_hash(content_hash)
+
+    def release(self, content_hash: str):
+        """Forget an in-progress upload once its ingestion finished or failed."""
+        self._pending.pop(content_hash, None)
+
+    def handle_ingestion_job(self, job: Dict[str, Any]):
+        """
+        IngestionQueue listener. Once a job completes its hash is found in
+        Chroma instead; once it fails the content may be uploaded again.
+        """
+        content_hash = job["metadata"].get("content_hash")
+        pending = self._pending.get(content_hash) if content_hash else None
+        if pending and pending[0] == job["document_id"]:
+            self.release(content_hash)
+
+    @asynccontextmanager
+    async def _hash_lock(self, content_hash: str):
+        """Serialize uploads of the same content; the lock is dropped once unused."""
+        lock, users = self._hash_locks.get(content_hash, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._hash_locks[content_hash] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._hash_locks[content_hash]
+            if users == 1:
+                del self._hash_locks[content_hash]
+            else:
+                self._hash_locks[content_hash] = (lock, users - 1)
+
+    def build_metadata(self, saved: Dict[str, Any]) -> Dict[str, Any]:
+        """Document metadata to store with every chunk of a saved upload."""
+        return {
+            "filename": saved["filename"],
+            "upload_date": datetime.now().isoformat(),
+            "file_size": saved["file_size"],
+            "file_type": Path(saved["filename"]).suffix.lower(),
+            "file_path": saved["file_path"] or "",
+            "content_hash": saved["content_hash"]
+        }
@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other as top-level packages (services, utils, database)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """Run each test in its own directory, so default ./paths (SQLite files, logs) never collide."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionMiddleware, AdmissionRejected, ClientQuotas, EndpointClass, TokenBucket
+
+def test_token_bucket_rejects_when_empty():
+    bucket = TokenBucket(rate=1.0, capacity=2)
+
+    assert bucket.take(1) == 0
+    assert bucket.take(1) == 0
+    wait = bucket.take(1)
+    assert 0 < wait <= 1.0
+
+def test_token_bucket_without_refill_never_recovers():
+    bucket = TokenBucket(rate=0.0, capacity=1)
+    bucket.take(1)
+
+    assert bucket.take(1) == float("inf")
+
+def test_client_quotas_are_per_client_and_bounded():
+    quotas = ClientQuotas(rate_per_minute=0, burst=1, max_clients=2)
+    assert quotas.take("a", 1) == 0
+    assert quotas.take("a", 1) > 0
+    assert quotas.take("b", 1) == 0
+
+    # "a" is the least recently seen client and is dropped, with its empty bucket
+    quotas.take("c", 1)
+    assert quotas.check("a", 1) == 0
+
+def test_endpoint_class_sheds_when_queue_is_full():
+    async def main():
+        endpoint = EndpointClass("query", max_concurrency=1, max_queue=1, deadline=10.0, cost=1.0)
+        await endpoint.acquire()
+        waiter = asyncio.ensure_future(endpoint.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as error:
+            await endpoint.acquire()
+        assert (error.value.status, error.value.reason) == (503, "queue_full")
+
+        # Releasing hands the slot to the queued request
+        endpoint.release(0.01)
+        await waiter
+        assert endpoint.active == 1
+
+    asyncio.run(main())
+
+@pytest.fixture
+def quota_env(monkeypatch):
+    monkeypatch.setenv("CLIENT_QUOTA_PER_MINUTE", "1")
+    monkeypatch.setenv("CLIENT_QUOTA_BURST", "2")
+    monkeypatch.setenv("ADMISSION_QUERY_COST", "1")
+
+def request(middleware, peer="10.0.0.1", forwarded=None, path="/api/query", method="POST"):
+    headers = [(b"x-forwarded-for", forwarded.encode("latin-1"))] if forwarded else []
+    scope = {"type": "http", "method": method, "path": path, "client": (peer, 1234), "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+def test_over_quota_client_gets_429_with_retry_after(quota_env):
+    middleware = AdmissionMiddleware(ok_app)
+
+    assert [request(middleware)[0] for _ in range(2)] == [200, 200]
+    status, headers = request(middleware)
+    assert status == 429
+    assert int(headers[b"retry-after"]) >= 1
+
+def test_quota_is_keyed_by_peer_address(quota_env):
+    middleware = AdmissionMiddleware(ok_app)
+    for _ in range(2):
+        request(middleware, peer="10.0.0.1")
+
+    assert request(middleware, peer="10.0.0.1")[0] == 429
+    assert request(middleware, peer="10.0.0.2")[0] == 200
+    # X-Forwarded-For from an untrusted peer is ignored
+    assert request(middleware, peer="10.0.0.1", forwarded="192.168.1.9")[0] == 429
+
+def test_trusted_proxy_forwards_client_address(quota_env, monkeypatch):
+    monkeypatch.setenv("ADMISSION_TRUSTED_PROXIES", "10.0.0.254")
+    middleware = AdmissionMiddleware(ok_app)
+    for _ in range(2):
+        request(middleware, peer="10.0.0.254", forwarded="203.0.113.5")
+
+    assert request(middleware, peer="10.0.0.254", forwarded="203.0.113.5")[0] == 429
+    # A spoofed hop ahead of the real client does not change the key
+    assert request(middleware, peer="10.0.0.254", forwarded="1.2.3.4, 203.0.113.5")[0] == 429
+    assert request(middleware, peer="10.0.0.254", forwarded="203.0.113.6")[0] == 200
+
+def test_shed_request_is_not_charged(quota_env, monkeypatch):
+    monkeypatch.setenv("ADMISSION_QUERY_CONCURRENCY", "1")
+    monkeypatch.setenv("ADMISSION_QUERY_QUEUE", "0")
+    middleware = AdmissionMiddleware(ok_app)
+    endpoint = middleware.classes["query"]
+
+    asyncio.run(endpoint.acquire())
+    status, headers = request(middleware)
+    assert status == 503
+    assert b"retry-after" in headers
+
+    endpoint.release()
+    assert [request(middleware)[0] for _ in range(2)] == [200, 200]
+
+def test_unclassified_requests_pass_through(quota_env):
+    middleware = AdmissionMiddleware(ok_app)
+
+    assert [request(middleware, path="/health", method="GET")[0] for _ in range(5)] == [200] * 5
@@ -0,0 +1,79 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmarks.run_benchmarks import percentile, summarize
+from benchmarks.stub_llm import StubLLMServer
+from benchmarks.synthetic import make_markdown, make_queries, make_text, write_documents
+
+def test_percentile_is_nearest_rank():
+    values = [float(value) for value in range(1, 11)]
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 90) == 9.0
+    assert percentile(values, 99) == 10.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([], 50) == 0.0
+
+def test_summarize_reports_milliseconds():
+    summary = summarize([0.1, 0.2, 0.3])
+    assert summary["count"] == 3
+    assert summary["mean_ms"] == pytest.approx(200.0)
+    assert summary["p50_ms"] == 200.0 and summary["max_ms"] == 300.0
+    assert summarize([])["mean_ms"] == 0.0
+
+def test_synthetic_data_is_deterministic(tmp_path):
+    assert make_text(500, seed=3) == make_text(500, seed=3)
+    assert len(make_text(500).split()) == 500
+    assert "```tsx" in make_markdown(300)
+    assert make_queries(10, seed=1) == make_queries(10, seed=1)
+
+    documents = write_documents(str(tmp_path), {"small": 100})
+    assert [document["filename"] for document in documents] == ["synthetic_small.txt", "synthetic_small.md"]
+
+def post(server, body):
+    request = urllib.request.Request(
+        f"{server.base_url}/openai/v1/chat/completions",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode("utf-8")
+
+@pytest.fixture
+def stub():
+    with StubLLMServer(latency=0.0, tokens_per_second=10_000, completion_tokens=20) as server:
+        yield server
+
+def test_stub_completion_with_usage(stub):
+    response = json.loads(post(stub, {"model": "m", "messages": [{"role": "user", "content": "hello there"}]}))
+
+    assert response["model"] == "m"
+    assert len(response["choices"][0]["message"]["content"].split()) == 20
+    assert response["usage"]["completion_tokens"] == 20
+    assert stub.requests == 1
+
+def test_stub_website_prompt_returns_files_json(stub):
+    body = {"messages": [{"role": "system", "content": 'Reply with {"files": []}'}, {"role": "user", "content": "site"}]}
+    content = json.loads(post(stub, body))["choices"][0]["message"]["content"]
+
+    files = json.loads(content)["files"]
+    assert files[0]["path"] == "src/App.tsx" and len(files) == stub.website_files
+
+def test_stub_stream_ends_with_usage_and_done(stub):
+    events = [
+        line[len("data: "):] for line in post(stub, {"stream": True, "max_tokens": 5, "messages": []}).splitlines()
+        if line.startswith("data: ")
+    ]
+
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+    assert len(text.split()) == 5
+    assert chunks[-1]["x_groq"]["usage"]["completion_tokens"] == 5
+
+def test_stub_unknown_path_is_404(stub):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"{stub.base_url}/nope", timeout=5)
+    assert error.value.code == 404
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from database.chroma_client import ChromaClient
+
+def candidates(*texts):
+    return {
+        "ids": [f"c{i}" for i in range(len(texts))],
+        "documents": list(texts),
+        "metadatas": [{"chunk_id": f"c{i}"} for i in range(len(texts))]
+    }
+
+def test_keyword_hits_ranked_by_bm25():
+    ranked = ChromaClient._rank_keyword_hits(
+        candidates("router setup once", "Router router ROUTER guards", "nothing relevant here"),
+        ["router"],
+        n_results=5
+    )
+    assert ranked["ids"] == ["c1", "c0"]
+    assert ranked["scores"][0] > ranked["scores"][1] > 0
+
+def test_keyword_hits_inside_longer_words_are_dropped():
+    ranked = ChromaClient._rank_keyword_hits(candidates("subrouters only", "a router"), ["router"], n_results=5)
+    assert ranked["ids"] == ["c1"]
+
+def test_keyword_hits_limited_to_n_results():
+    ranked = ChromaClient._rank_keyword_hits(candidates("hook", "hook hook", "hook hook hook"), ["Hook"], n_results=2)
+    assert len(ranked["ids"]) == 2
+
+def test_keyword_hits_without_candidates():
+    assert ChromaClient._rank_keyword_hits(candidates(), ["hook"], n_results=2)["ids"] == []
+
+def stored_chunk(index, text, canonical_chunk_id=None):
+    metadata = {"chunk_index": index}
+    if canonical_chunk_id:
+        metadata["canonical_chunk_id"] = canonical_chunk_id
+    return {"text": "" if canonical_chunk_id else text, "chunk_index": index, "metadata": metadata}
+
+@pytest.fixture
+def client(work_dir, monkeypatch):
+    monkeypatch.setenv("CHROMA_DB_PATH", str(work_dir / "chroma"))
+    monkeypatch.setenv("PREFILTER_EXACT_THRESHOLD", "0")
+    client = ChromaClient()
+
+    async def fill():
+        # doc2's first chunk is a reference stub of doc1_0 and shares its vector
+        await client.add_documents(
+            "doc1", [stored_chunk(0, "shared licence header"), stored_chunk(1, "router guards explained")],
+            [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], {"filename": "doc1.md"}
+        )
+        await client.add_documents(
+            "doc2", [stored_chunk(0, None, "doc1_0"), stored_chunk(1, "theme tokens and dark mode")],
+            [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]], {"filename": "doc2.md"}
+        )
+
+    asyncio.run(fill())
+    return client
+
+def test_stub_resolves_to_canonical_text(client):
+    results = asyncio.run(client.query([1.0, 0.0, 0.0], n_results=1, document_ids=["doc2"]))
+    assert results["ids"][0] == ["doc2_0"]
+    assert results["documents"][0] == ["shared licence header"]
+
+def test_collapsed_stub_is_made_up_for(client):
+    results = asyncio.run(client.query([1.0, 0.0, 0.0], n_results=3))
+    ids = results["ids"][0]
+    assert len(ids) == 3
+    assert len({"doc1_0", "doc2_0"} & set(ids)) == 1
+
+def test_neighbor_stubs_are_resolved(client):
+    results = asyncio.run(client.query_with_neighbors([0.0, 0.0, 1.0], n_results=1, document_ids=["doc2"]))
+    assert results["neighbors"]["doc2_0"]["text"] == "shared licence header"
+
+def test_scoped_keyword_search_matches_stub(client):
+    results = asyncio.run(client.keyword_search(["licence"], 5, document_ids=["doc2"]))
+    assert results["ids"] == ["doc2_0"]
+    assert results["documents"] == ["shared licence header"]
+
+def test_deleting_canonical_document_keeps_stub_content(client):
+    asyncio.run(client.delete_document("doc1"))
+
+    results = asyncio.run(client.query([1.0, 0.0, 0.0], n_results=2, document_ids=["doc2"]))
+    assert results["ids"][0][0] == "doc2_0"
+    assert results["documents"][0][0] == "shared licence header"
+    assert not results["metadatas"][0][0].get("canonical_chunk_id")
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.chunking import StructuredChunker
+from services.document_processor import DocumentProcessor
+
+def count_words(text):
+    return len(text.split())
+
+def test_markdown_sections_keep_heading_path():
+    text = "# Guide\n\nIntro text.\n\n## Install\n\nRun the installer now.\n"
+    chunks = StructuredChunker(count_words, 6).split(text, "guide.md")
+
+    assert [chunk["metadata"].get("section") for chunk in chunks] == ["Guide", "Guide > Install"]
+    assert all(chunk["metadata"]["chunk_type"] == "markdown" for chunk in chunks)
+
+def test_code_is_split_between_functions():
+    text = "def first():\n    return one + two\n\ndef second():\n    return three + four\n"
+    chunks = StructuredChunker(count_words, 8).split(text, "module.py")
+
+    assert [chunk["text"].splitlines()[0] for chunk in chunks] == ["def first():", "def second():"]
+
+def test_every_chunk_fits_the_limit():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = StructuredChunker(count_words, 16).split(text, "notes.txt")
+
+    assert len(chunks) > 1
+    assert all(chunk["metadata"]["token_count"] <= 16 for chunk in chunks)
+    assert " ".join(chunk["text"] for chunk in chunks).split() == text.split()
+
+def test_long_word_is_cut_until_every_piece_fits():
+    # Ten "a"s make one token but every "X" is a token, so cutting at the
+    # word's average tokens per character leaves pieces that are too long
+    def count_tokens(text):
+        return text.count("X") + (text.count("a") + 9) // 10
+
+    word = "a" * 100 + "X" * 100
+    chunks = StructuredChunker(count_tokens, 20).split(word, "blob.txt")
+
+    assert "".join(chunk["text"] for chunk in chunks) == word
+    assert all(count_tokens(chunk["text"]) <= 20 for chunk in chunks)
+
+def test_processor_sizes_chunks_with_the_embedding_tokenizer(tmp_path):
+    embedding_service = SimpleNamespace(count_tokens=count_words, max_seq_length=10)
+    processor = DocumentProcessor(embedding_service)
+    path = tmp_path / "notes.txt"
+    path.write_text(" ".join(f"word{i}" for i in range(50)))
+
+    chunks = asyncio.run(processor.process_document(str(path), "notes.txt"))
+
+    assert processor.chunker.max_tokens == 8
+    assert all(chunk["metadata"]["token_count"] <= 8 for chunk in chunks)
@@ -0,0 +1,61 @@
+import pytest
+
+from services.dedup import NearDuplicateDetector
+
+LICENCE = "Permission is hereby granted free of charge to any person obtaining a copy of this software"
+
+def chunks(*texts):
+    return [{"text": text, "chunk_index": i, "metadata": {"chunk_index": i}} for i, text in enumerate(texts)]
+
+@pytest.fixture
+def detector(work_dir):
+    return NearDuplicateDetector(str(work_dir / "dedup.sqlite3"))
+
+def test_duplicate_chunk_references_the_first_copy(detector):
+    detector.filter_chunks("doc1", chunks(LICENCE, "router guards and lazy routes in the app shell"))
+    unique, duplicates = detector.filter_chunks("doc2", chunks(LICENCE, "theme tokens and dark mode toggles"))
+
+    assert [chunk["text"] for chunk in unique] == ["theme tokens and dark mode toggles"]
+    assert duplicates == [{"chunk_id": "doc2_0", "canonical_chunk_id": "doc1_0", "similarity": 1.0}]
+    assert detector.get_references("doc2")[0]["canonical_chunk_id"] == "doc1_0"
+
+def test_dissimilar_chunks_are_kept(detector):
+    detector.filter_chunks("doc1", chunks(LICENCE))
+    unique, duplicates = detector.filter_chunks("doc2", chunks("completely different text about grid layouts"))
+    assert len(unique) == 1 and duplicates == []
+
+def test_retried_document_does_not_match_itself(detector):
+    detector.filter_chunks("doc1", chunks(LICENCE))
+    unique, duplicates = detector.filter_chunks("doc1", chunks(LICENCE))
+    assert len(unique) == 1 and duplicates == []
+
+def test_signatures_survive_a_restart(detector, work_dir):
+    detector.filter_chunks("doc1", chunks(LICENCE))
+
+    restarted = NearDuplicateDetector(str(work_dir / "dedup.sqlite3"))
+    assert restarted.filter_chunks("doc2", chunks(LICENCE))[1][0]["canonical_chunk_id"] == "doc1_0"
+
+def test_drop_mode_keeps_documents_that_are_entirely_duplicates(work_dir, monkeypatch):
+    monkeypatch.setenv("DEDUP_MODE", "drop")
+    detector = NearDuplicateDetector(str(work_dir / "dedup.sqlite3"))
+    detector.filter_chunks("doc1", chunks(LICENCE))
+
+    unique, duplicates = detector.filter_chunks("doc2", chunks(LICENCE))
+    assert len(unique) == 1 and duplicates == []
+    assert detector.get_references("doc2") == []
+
+def test_deleted_document_releases_references_and_stops_matching(detector):
+    detector.filter_chunks("doc1", chunks(LICENCE))
+    detector.filter_chunks("doc2", chunks(LICENCE))
+
+    assert detector.release_references("doc1") == ["doc2"]
+    detector.remove_document("doc1")
+
+    assert detector.get_references("doc2") == []
+    unique, duplicates = detector.filter_chunks("doc3", chunks(LICENCE))
+    assert len(unique) == 1 and duplicates == []
+
+def test_bands_must_divide_permutations(work_dir, monkeypatch):
+    monkeypatch.setenv("DEDUP_BANDS", "7")
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(str(work_dir / "dedup.sqlite3"))
@@ -0,0 +1,98 @@
+import json
+import os
+
+from utils import file_writer
+from utils.file_writer import FileWriter
+
+def files(contents):
+    return [{"path": path, "content": content} for path, content in contents.items()]
+
+def test_unchanged_files_are_skipped(tmp_path):
+    writer = FileWriter(str(tmp_path))
+    first = writer.write_files(files({"src/a.ts": "a", "src/b.ts": "b"}))
+    assert sorted(first["files_changed"]) == ["src/a.ts", "src/b.ts"]
+
+    second = writer.write_files(files({"src/a.ts": "a", "src/b.ts": "b2"}))
+    assert second["files_unchanged"] == ["src/a.ts"]
+    assert second["files_changed"] == ["src/b.ts"]
+    assert (tmp_path / "src" / "b.ts").read_text() == "b2"
+
+def test_file_edited_outside_the_writer_is_rewritten(tmp_path):
+    writer = FileWriter(str(tmp_path))
+    writer.write_files(files({"src/a.ts": "a"}))
+    (tmp_path / "src" / "a.ts").write_text("edited by hand")
+
+    result = writer.write_files(files({"src/a.ts": "a"}))
+    assert result["files_changed"] == ["src/a.ts"]
+    assert (tmp_path / "src" / "a.ts").read_text() == "a"
+
+def test_conflicting_paths_are_reported(tmp_path):
+    writer = FileWriter(str(tmp_path))
+    result = writer.write_files([
+        {"path": "src/x", "content": "file"},
+        {"path": "src/x/y.ts", "content": "nested"},
+        {"path": "src/z.ts", "content": "ok"}
+    ])
+
+    assert not result["success"]
+    assert len(result["errors"]) == 2
+    assert result["files_written"] == ["src/z.ts"]
+
+def test_failed_batch_rolls_back(tmp_path, monkeypatch):
+    writer = FileWriter(str(tmp_path))
+    writer.write_files(files({"src/a.ts": "old a", "src/b.ts": "old b"}))
+
+    real_replace = os.replace
+    def failing_replace(src, dst):
+        if str(dst).endswith("b.ts"):
+            raise OSError("disk full")
+        return real_replace(src, dst)
+    monkeypatch.setattr(file_writer.os, "replace", failing_replace)
+
+    result = writer.write_files(files({"src/a.ts": "new a", "src/b.ts": "new b", "src/c.ts": "new c"}))
+
+    assert not result["success"]
+    assert (tmp_path / "src" / "a.ts").read_text() == "old a"
+    assert (tmp_path / "src" / "b.ts").read_text() == "old b"
+    assert not (tmp_path / "src" / "c.ts").exists()
+    assert not writer.journal_path.exists()
+    assert sorted(path.name for path in (tmp_path / "src").iterdir()) == ["a.ts", "b.ts"]
+
+def test_interrupted_batch_is_rolled_forward(tmp_path):
+    writer = FileWriter(str(tmp_path))
+    writer.write_files(files({"src/a.ts": "old a"}))
+
+    # A batch that crashed after journaling, with one file already swapped in
+    target = tmp_path / "src" / "a.ts"
+    backup = tmp_path / "src" / ".a.ts.1.bak"
+    os.link(target, backup)
+    temp_a = tmp_path / "src" / ".a.ts.1.tmp"
+    temp_a.write_text("new a")
+    os.replace(temp_a, target)
+    temp_b = tmp_path / "src" / ".b.ts.1.tmp"
+    temp_b.write_text("new b")
+    writer.journal_path.write_text(json.dumps([
+        {"path": "src/a.ts", "temp": str(temp_a), "hash": "h1", "backup": str(backup)},
+        {"path": "src/b.ts", "temp": str(temp_b), "hash": "h2", "backup": None}
+    ]))
+
+    recovered = FileWriter(str(tmp_path))
+
+    assert target.read_text() == "new a"
+    assert (tmp_path / "src" / "b.ts").read_text() == "new b"
+    assert not backup.exists()
+    assert not recovered.journal_path.exists()
+
+def test_unreadable_journal_is_discarded(tmp_path):
+    (tmp_path / ".filewriter").mkdir()
+    (tmp_path / ".filewriter" / "journal.json").write_text("{not json")
+
+    writer = FileWriter(str(tmp_path))
+    assert not writer.journal_path.exists()
+    assert writer.write_single_file("src/a.ts", "a")
+
+def test_validate_file_paths(tmp_path):
+    errors = FileWriter(str(tmp_path)).validate_file_paths(files({"src/ok.ts": "x"}) + [
+        {"path": "../etc/passwd"}, {"path": "/abs"}, {"path": "other/a.ts"}, {"path": ""}
+    ])
+    assert len(errors) == 4
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("groq")
+
+from services.groq_service import GroqService
+from utils.resilience import Deadline, DeadlineExceeded
+
+class FakeCompletions:
+    """Chat completions endpoint whose behaviour is set per model."""
+
+    def __init__(self, behaviours):
+        self.behaviours = behaviours
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs["model"])
+        return self.behaviours[kwargs["model"]](kwargs)
+
+def completion(text, prompt_tokens=10, completion_tokens=5):
+    def respond(kwargs):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        )
+    return respond
+
+def failing(kwargs):
+    raise RuntimeError("model unavailable")
+
+def stream(*deltas, usage=None):
+    def respond(kwargs):
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))]) for delta in deltas]
+        chunks.append(SimpleNamespace(choices=[], x_groq={"usage": usage} if usage else None))
+        return iter(chunks)
+    return respond
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setenv("GROQ_BREAKER_MIN_REQUESTS", "2")
+    monkeypatch.setenv("GROQ_BREAKER_COOLDOWN_SECONDS", "60")
+    return GroqService()
+
+def use(service, behaviours):
+    completions = FakeCompletions(behaviours)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return completions
+
+def test_answer_from_primary_model(service):
+    completions = use(service, {service.model: completion("primary answer")})
+
+    assert asyncio.run(service.generate_answer("q", "context")) == "primary answer"
+    assert completions.calls == [service.model]
+
+def test_failed_primary_falls_back(service):
+    completions = use(service, {service.model: failing, service.fallback_model: completion("fallback answer")})
+
+    assert asyncio.run(service.generate_answer("q", "context")) == "fallback answer"
+    assert completions.calls == [service.model, service.fallback_model]
+
+def test_open_breaker_routes_to_fallback(service):
+    completions = use(service, {service.model: failing, service.fallback_model: completion("fallback answer")})
+    for _ in range(2):
+        asyncio.run(service.generate_answer("q", "context"))
+    assert service.circuit_breaker.state == "open"
+
+    completions.calls.clear()
+    asyncio.run(service.generate_answer("q", "context"))
+    assert completions.calls == [service.fallback_model]
+
+def test_generation_deadline(service):
+    def slow(kwargs):
+        time.sleep(0.3)
+        return completion("late")(kwargs)
+
+    use(service, {service.model: slow, service.fallback_model: slow})
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(service.generate_answer("q", "context", deadline=Deadline(0.05)))
+
+def test_stream_falls_back_before_first_token(service):
+    use(service, {service.model: failing, service.fallback_model: stream("Hello", " world")})
+
+    async def collect():
+        return [delta async for delta in service.stream_answer("q", "context")]
+
+    assert asyncio.run(collect()) == ["Hello", " world"]
+
+def test_cancelled_stream_releases_breaker_trial(service):
+    use(service, {service.model: stream("a", "b", "c")})
+    service.circuit_breaker._opened_at = time.monotonic() - 120
+    assert service.circuit_breaker.state == "half_open"
+
+    async def read_one():
+        answer = service.stream_answer("q", "context")
+        first = await answer.__anext__()
+        await answer.aclose()
+        return first
+
+    assert asyncio.run(read_one()) == "a"
+    assert service.circuit_breaker.allow()
+
+def test_stream_records_usage_from_final_chunk(service):
+    from utils.metrics import LLM_TOKENS
+
+    use(service, {service.model: stream("Hi", usage={"prompt_tokens": 40, "completion_tokens": 2})})
+    before = LLM_TOKENS.value(model=service.model, kind="prompt")
+
+    async def collect():
+        return [delta async for delta in service.stream_answer("q", "context")]
+
+    asyncio.run(collect())
+    assert LLM_TOKENS.value(model=service.model, kind="prompt") == before + 40
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from database.index_snapshot import export_snapshot, import_snapshot, load_snapshot
+
+class MemoryCollection:
+    """The slice of a Chroma collection the snapshot functions use."""
+
+    def __init__(self, name="documents"):
+        self.name = name
+        self.metadata = {"hnsw:space": "cosine"}
+        self.rows = {}
+        self.upserts = 0
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = list(self.rows)[offset:offset + limit]
+        return {
+            "ids": ids,
+            "embeddings": [self.rows[i][0] for i in ids],
+            "documents": [self.rows[i][1] for i in ids],
+            "metadatas": [self.rows[i][2] for i in ids]
+        }
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.upserts += 1
+        for row in zip(ids, embeddings, documents, metadatas):
+            self.rows[row[0]] = list(row[1:])
+
+def filled(count, dimension=4):
+    collection = MemoryCollection()
+    for i in range(count):
+        collection.rows[f"doc_{i}"] = [[float(i)] * dimension, f"text {i}", {"chunk_index": i}]
+    return collection
+
+def test_round_trip_without_re_embedding(tmp_path):
+    source = filled(25)
+    manifest = export_snapshot(source, str(tmp_path / "snap"), batch_size=10, embedding_model="m1")
+    assert (manifest["count"], manifest["dimension"]) == (25, 4)
+    assert not (tmp_path / "snap.tmp").exists()
+
+    target = MemoryCollection()
+    import_snapshot(target, str(tmp_path / "snap"), batch_size=10, embedding_model="m1")
+    assert target.rows == source.rows
+    assert target.upserts == 3
+
+def test_vectors_are_memory_mapped(tmp_path):
+    export_snapshot(filled(3), str(tmp_path / "snap"))
+    manifest, vectors = load_snapshot(str(tmp_path / "snap"))
+
+    assert isinstance(vectors, np.memmap) and not vectors.flags.writeable
+    assert vectors.shape == (3, 4) and vectors[2][0] == 2.0
+
+def test_empty_collection_exports_empty_snapshot(tmp_path):
+    export_snapshot(MemoryCollection(), str(tmp_path / "snap"))
+    manifest, vectors = load_snapshot(str(tmp_path / "snap"))
+    assert manifest["count"] == 0 and vectors.shape == (0, 0)
+
+def test_snapshot_from_other_model_is_refused(tmp_path):
+    export_snapshot(filled(2), str(tmp_path / "snap"), embedding_model="m1")
+    with pytest.raises(ValueError):
+        import_snapshot(MemoryCollection(), str(tmp_path / "snap"), embedding_model="m2")
+
+def test_unknown_format_version_is_refused(tmp_path):
+    export_snapshot(filled(2), str(tmp_path / "snap"))
+    manifest_path = tmp_path / "snap" / "manifest.json"
+    manifest_path.write_text(json.dumps({**json.loads(manifest_path.read_text()), "format_version": 99}))
+
+    with pytest.raises(ValueError):
+        load_snapshot(str(tmp_path / "snap"))
+
+def test_mixed_dimensions_fail_export_and_keep_old_snapshot(tmp_path):
+    export_snapshot(filled(2), str(tmp_path / "snap"))
+    broken = filled(3)
+    broken.rows["doc_2"][0] = [1.0, 2.0]
+
+    with pytest.raises(ValueError):
+        export_snapshot(broken, str(tmp_path / "snap"), batch_size=2)
+    assert load_snapshot(str(tmp_path / "snap"))[0]["count"] == 2
@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+from services.dedup import NearDuplicateDetector
+from services.ingestion_queue import IngestionQueue
+
+class FakeProcessor:
+    def __init__(self, texts=("one", "two", "three")):
+        self.texts = texts
+        self.calls = 0
+
+    async def process_document(self, file_path, filename):
+        self.calls += 1
+        return [
+            {"text": text, "chunk_index": i, "metadata": {"chunk_index": i}}
+            for i, text in enumerate(self.texts)
+        ]
+
+class FakeEmbeddings:
+    async def generate_embeddings(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+class FakeChroma:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.stored = {}
+        self.texts = {}
+        self.vectors = {}
+        self.deleted = []
+
+    def add_listener(self, listener):
+        pass
+
+    async def add_documents(self, document_id, chunks, embeddings, metadata):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("store unavailable")
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk_id = f"{document_id}_{chunk['chunk_index']}"
+            self.stored[chunk_id] = {**metadata, **chunk["metadata"]}
+            self.texts[chunk_id] = chunk["text"]
+            self.vectors[chunk_id] = embedding
+
+    async def delete_document(self, document_id):
+        self.deleted.append(document_id)
+
+    async def get_embeddings(self, chunk_ids):
+        return {chunk_id: self.vectors[chunk_id] for chunk_id in chunk_ids if chunk_id in self.vectors}
+
+@pytest.fixture
+def make_queue(monkeypatch):
+    monkeypatch.setenv("DEDUP_ENABLED", "false")
+    monkeypatch.setenv("INGESTION_EMBED_BATCH_SIZE", "2")
+
+    def make(chroma=None, processor=None, max_attempts=3, detector=None):
+        monkeypatch.setenv("INGESTION_MAX_ATTEMPTS", str(max_attempts))
+        queue = IngestionQueue(processor or FakeProcessor(), FakeEmbeddings(), chroma or FakeChroma(), detector)
+        queue.work_dir.mkdir(parents=True, exist_ok=True)
+        return queue
+    return make
+
+def run_next(queue):
+    """Make every queued job available now, then run the highest-priority one."""
+    queue._conn.execute("UPDATE jobs SET available_at = 0")
+    job = queue._claim_job()
+    asyncio.run(queue._run_job(job))
+    return job["job_id"]
+
+def test_job_runs_through_every_stage(make_queue):
+    queue = make_queue()
+    finished = []
+    queue.add_listener(finished.append)
+    job_id = queue.enqueue("doc1", "a.md", "a.md", {"filename": "a.md"})
+
+    run_next(queue)
+
+    job = queue.get_job(job_id)
+    assert job["status"] == "completed" and job["progress"] == 1.0
+    assert sorted(queue.chroma_client.stored) == ["doc1_0", "doc1_1", "doc1_2"]
+    assert queue.chroma_client.stored["doc1_0"]["document_chunks"] == 3
+    assert [finished_job["job_id"] for finished_job in finished] == [job_id]
+    assert list(queue.work_dir.iterdir()) == []
+
+def test_failed_stage_is_retried_from_its_checkpoint(make_queue):
+    processor = FakeProcessor()
+    queue = make_queue(FakeChroma(failures=1), processor)
+    job_id = queue.enqueue("doc1", "a.md", "a.md", {})
+
+    run_next(queue)
+    job = queue.get_job(job_id)
+    assert (job["status"], job["stage"], job["attempts"]) == ("queued", "store", 1)
+    assert job["error"] == "store unavailable"
+
+    run_next(queue)
+    assert queue.get_job(job_id)["status"] == "completed"
+    assert processor.calls == 1
+
+def test_final_failure_discards_partial_chunks_and_notifies(make_queue):
+    queue = make_queue(FakeChroma(failures=5), max_attempts=2)
+    finished = []
+    queue.add_listener(finished.append)
+    job_id = queue.enqueue("doc1", "a.md", "a.md", {})
+
+    run_next(queue)
+    run_next(queue)
+
+    job = queue.get_job(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 2
+    assert queue.chroma_client.deleted == ["doc1"]
+    assert [finished_job["status"] for finished_job in finished] == ["failed"]
+
+def test_failure_before_store_leaves_chroma_alone(make_queue):
+    class BrokenProcessor(FakeProcessor):
+        async def process_document(self, file_path, filename):
+            raise ValueError("unreadable file")
+
+    queue = make_queue(processor=BrokenProcessor(), max_attempts=1)
+    job_id = queue.enqueue("doc1", "a.md", "a.md", {})
+
+    run_next(queue)
+    assert queue.get_job(job_id)["status"] == "failed"
+    assert queue.chroma_client.deleted == []
+
+def test_higher_priority_jobs_are_claimed_first(make_queue):
+    queue = make_queue()
+    low = queue.enqueue("doc1", "a.md", "a.md", {})
+    high = queue.enqueue("doc2", "b.md", "b.md", {}, priority=5)
+
+    assert queue.get_queue_depth() == 2
+    assert run_next(queue) == high
+    assert run_next(queue) == low
+
+def test_listener_error_does_not_fail_the_job(make_queue):
+    queue = make_queue()
+    queue.add_listener(lambda job: 1 / 0)
+    job_id = queue.enqueue("doc1", "a.md", "a.md", {})
+
+    run_next(queue)
+    assert queue.get_job(job_id)["status"] == "completed"
+
+def test_interrupted_jobs_resume_after_restart(make_queue):
+    queue = make_queue()
+    job_id = queue.enqueue("doc1", "a.md", "a.md", {})
+    queue._claim_job()
+
+    async def restart():
+        await queue.start()
+        for _ in range(100):
+            if queue.get_job(job_id)["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(restart())
+    assert queue.get_job(job_id)["status"] == "completed"
+
+def test_duplicate_chunk_is_stored_as_a_stub_with_the_canonical_vector(make_queue, work_dir):
+    licence = "Permission is hereby granted free of charge to any person obtaining a copy"
+    processor = FakeProcessor((licence, "router guards"))
+    queue = make_queue(processor=processor, detector=NearDuplicateDetector(str(work_dir / "dedup.sqlite3")))
+
+    queue.enqueue("doc1", "a.md", "a.md", {})
+    run_next(queue)
+    processor.texts = (licence, "theme tokens and dark mode")
+    job_id = queue.enqueue("doc2", "b.md", "b.md", {})
+    run_next(queue)
+
+    chroma = queue.chroma_client
+    assert chroma.stored["doc2_0"]["canonical_chunk_id"] == "doc1_0"
+    assert chroma.texts["doc2_0"] == ""
+    assert chroma.vectors["doc2_0"] == chroma.vectors["doc1_0"]
+    assert queue.get_job(job_id)["chunks_duplicate"] == 1
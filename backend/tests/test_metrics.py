@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from utils.metrics import MetricsMiddleware, MetricsRegistry, _Metric, current_request_id, stage_timer
+
+def test_counter_renders_labelled_series():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["route"])
+    counter.inc(route="/query")
+    counter.inc(2, route="/query")
+
+    assert counter.value(route="/query") == 3
+    assert 'requests_total{route="/query"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc(-1, route="/query")
+    with pytest.raises(ValueError):
+        counter.inc(kind="wrong")
+
+def test_gauge_reads_callbacks_at_scrape_time():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("depth", "Queue depth", ["queue"])
+    depth = [4]
+    gauge.set_function(lambda: depth[0], queue="ingestion")
+    gauge.set(2, queue="other")
+    gauge.dec(queue="other")
+
+    depth[0] = 7
+    rendered = registry.render()
+    assert 'depth{queue="ingestion"} 7' in rendered
+    assert 'depth{queue="other"} 1' in rendered
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    rendered = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in rendered
+    assert 'latency_seconds_bucket{le="1"} 2' in rendered
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in rendered
+    assert "latency_seconds_count 3" in rendered
+    assert histogram.count() == 3
+
+def test_registry_returns_same_metric_and_rejects_kind_change():
+    registry = MetricsRegistry()
+    assert registry.counter("x", "X") is registry.counter("x", "X")
+    with pytest.raises(ValueError):
+        registry.gauge("x", "X")
+
+def test_base_metric_renders_without_samples():
+    assert _Metric("bare", "Bare metric").render() == "# HELP bare Bare metric\n# TYPE bare untyped"
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("c", "C", ["path"]).inc(path='a"b\\c')
+    assert 'c{path="a\\"b\\\\c"} 1' in registry.render()
+
+def call(middleware, path="/query", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+def test_middleware_adds_request_id_and_server_timing():
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["request_id"] = current_request_id()
+        with stage_timer("retrieval"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    messages = call(MetricsMiddleware(app, metrics_registry=MetricsRegistry()), headers=[(b"x-request-id", b"abc")])
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"x-request-id"] == b"abc" == seen["request_id"].encode()
+    assert headers[b"server-timing"].startswith(b"retrieval;dur=")
+    assert b"total;dur=" in headers[b"server-timing"]
+    assert current_request_id() is None
+
+def test_middleware_serves_metrics_endpoint():
+    registry = MetricsRegistry()
+    registry.counter("served_total", "Served").inc()
+
+    async def app(scope, receive, send):
+        raise AssertionError("the app must not see metrics scrapes")
+
+    messages = call(MetricsMiddleware(app, metrics_registry=registry), path="/metrics")
+    assert messages[0]["status"] == 200
+    assert b"served_total 1" in messages[1]["body"]
+
+def test_middleware_records_failed_requests_as_500():
+    from utils.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
+
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    before = HTTP_REQUEST_SECONDS.count(method="GET", route="unmatched", status=500)
+    with pytest.raises(RuntimeError):
+        call(MetricsMiddleware(app, metrics_registry=MetricsRegistry()))
+
+    assert HTTP_REQUEST_SECONDS.count(method="GET", route="unmatched", status=500) == before + 1
+    assert HTTP_REQUESTS_IN_FLIGHT.value() == 0
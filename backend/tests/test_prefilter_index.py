@@ -0,0 +1,91 @@
+from database.prefilter_index import DocumentScopeIndex
+
+class FakeCollection:
+    """Chunks by id with metadata and embeddings, answering get() by ids or by document id."""
+
+    def __init__(self):
+        self.chunks = {}
+        self.before_get_by_ids = None
+
+    def add(self, document_id, index, embedding, total=0):
+        chunk_id = f"{document_id}_{index}"
+        metadata = {"document_id": document_id, "chunk_index": index, "document_chunks": total}
+        self.chunks[chunk_id] = (f"text of {chunk_id}", metadata, embedding)
+        return chunk_id
+
+    def get(self, ids=None, where=None, include=()):
+        if ids is not None:
+            if self.before_get_by_ids:
+                hook, self.before_get_by_ids = self.before_get_by_ids, None
+                hook()
+            selected = [chunk_id for chunk_id in ids if chunk_id in self.chunks]
+        else:
+            allowed = where["document_id"]["$in"]
+            selected = [chunk_id for chunk_id, chunk in self.chunks.items() if chunk[1]["document_id"] in allowed]
+        return {
+            "ids": selected,
+            "documents": [self.chunks[chunk_id][0] for chunk_id in selected],
+            "metadatas": [self.chunks[chunk_id][1] for chunk_id in selected],
+            "embeddings": [self.chunks[chunk_id][2] for chunk_id in selected]
+        }
+
+def make_collection():
+    collection = FakeCollection()
+    collection.add("doc1", 0, [1.0, 0.0], total=2)
+    collection.add("doc1", 1, [0.0, 1.0], total=2)
+    collection.add("doc2", 0, [0.7, 0.7], total=1)
+    return collection
+
+def test_exact_scoped_query_ranks_by_cosine_distance():
+    index = DocumentScopeIndex(exact_threshold=10, max_cached_chunks=100, mapping_ttl=60)
+    result = index.query(make_collection(), [2.0, 0.0], 2, ["doc1"])
+
+    assert result["ids"] == [["doc1_0", "doc1_1"]]
+    assert result["distances"][0][0] == 0.0
+    assert result["documents"][0][0] == "text of doc1_0"
+
+def test_broad_scope_uses_the_ann_index():
+    index = DocumentScopeIndex(exact_threshold=2, max_cached_chunks=100, mapping_ttl=60)
+
+    assert index.query(make_collection(), [1.0, 0.0], 2, ["doc1", "doc2"]) is None
+
+def test_document_still_being_ingested_uses_the_ann_index():
+    collection = make_collection()
+    collection.add("doc3", 0, [1.0, 0.0], total=2)
+    index = DocumentScopeIndex(exact_threshold=10, max_cached_chunks=100, mapping_ttl=60)
+
+    assert index.query(collection, [1.0, 0.0], 2, ["doc3"]) is None
+
+def test_document_changed_while_loading_is_still_searched():
+    collection = make_collection()
+    index = DocumentScopeIndex(exact_threshold=10, max_cached_chunks=100, mapping_ttl=60)
+
+    def upsert_more_chunks():
+        index.add_chunks("doc1", [collection.add("doc1", 2, [0.0, -1.0], total=3)])
+    collection.before_get_by_ids = upsert_more_chunks
+
+    result = index.query(collection, [1.0, 0.0], 5, ["doc1", "doc2"])
+
+    assert sorted(result["ids"][0]) == ["doc1_0", "doc1_1", "doc1_2", "doc2_0"]
+    assert result["ids"][0][0] == "doc1_0"
+    # Not cached from the partial load; the next query loads it in full
+    assert index.get_stats()["cached_documents"] == 1
+    assert sorted(index.query(collection, [1.0, 0.0], 5, ["doc1"])["ids"][0]) == ["doc1_0", "doc1_1", "doc1_2"]
+
+def test_deleted_chunks_drop_out_of_results():
+    collection = make_collection()
+    index = DocumentScopeIndex(exact_threshold=10, max_cached_chunks=100, mapping_ttl=60)
+    index.query(collection, [1.0, 0.0], 2, ["doc1"])
+
+    del collection.chunks["doc1_0"]
+
+    assert index.query(collection, [1.0, 0.0], 2, ["doc1"])["ids"] == [["doc1_1"]]
+
+def test_cached_vectors_are_bounded():
+    collection = make_collection()
+    index = DocumentScopeIndex(exact_threshold=10, max_cached_chunks=2, mapping_ttl=60)
+    index.query(collection, [1.0, 0.0], 2, ["doc1"])
+    index.query(collection, [1.0, 0.0], 2, ["doc2"])
+
+    stats = index.get_stats()
+    assert stats["cached_chunks"] <= 2 and stats["mapped_documents"] == 2
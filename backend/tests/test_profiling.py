@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.profiling import Profile, ProfileStore, ProfilingMiddleware, SamplingProfiler
+
+ADMIN = [(b"x-profile", b"1"), (b"x-admin-token", b"secret")]
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def call(middleware, path="/query", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+async def ok_app(scope, receive, send):
+    busy(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+@pytest.fixture
+def make_middleware(work_dir, monkeypatch):
+    monkeypatch.setenv("PROFILING_ADMIN_TOKEN", "secret")
+
+    def make(app=ok_app):
+        return ProfilingMiddleware(app, SamplingProfiler(interval=0.001), ProfileStore(str(work_dir / "profiles")))
+    return make
+
+def test_flagged_admin_request_is_profiled_and_saved(make_middleware):
+    middleware = make_middleware()
+    messages = call(middleware, headers=ADMIN)
+
+    profile_id = dict(messages[0]["headers"])[b"x-profile-id"].decode()
+    [saved] = middleware.store.list_profiles()
+    assert saved["id"] == profile_id and saved["status"] == 200
+    assert saved["samples"] > 0
+    assert "busy" in middleware.store.get_path(profile_id).read_text()
+
+def test_request_without_admin_token_is_not_profiled(make_middleware):
+    middleware = make_middleware()
+    messages = call(middleware, headers=[(b"x-profile", b"1"), (b"x-admin-token", b"wrong")])
+
+    assert b"x-profile-id" not in dict(messages[0]["headers"])
+    assert middleware.store.list_profiles() == []
+
+def test_failed_request_profile_is_saved_with_error(make_middleware):
+    async def failing_app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    middleware = make_middleware(failing_app)
+    with pytest.raises(RuntimeError):
+        call(middleware, headers=ADMIN)
+
+    [saved] = middleware.store.list_profiles()
+    assert saved["status"] == 500 and saved["error"] == "RuntimeError"
+
+def test_profile_is_saved_off_the_event_loop(make_middleware):
+    middleware = make_middleware()
+    save = middleware.store.save
+    threads = []
+
+    def recording_save(profile, details=None):
+        threads.append(threading.get_ident())
+        save(profile, details)
+
+    middleware.store.save = recording_save
+    call(middleware, headers=ADMIN)
+    assert threads and threads[0] != threading.get_ident()
+
+def test_admin_endpoints_require_token_and_reject_traversal(make_middleware):
+    middleware = make_middleware()
+    call(middleware, headers=ADMIN)
+    profile_id = middleware.store.list_profiles()[0]["id"]
+
+    assert call(middleware, "/admin/profiles")[0]["status"] == 403
+    token = [(b"x-admin-token", b"secret")]
+    assert profile_id.encode() in call(middleware, "/admin/profiles", token)[1]["body"]
+    assert call(middleware, f"/admin/profiles/{profile_id}", token)[0]["status"] == 200
+    assert call(middleware, "/admin/profiles/..%2Fsecret", token)[0]["status"] == 404
+
+def test_store_keeps_newest_profiles(tmp_path):
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    profiles = [Profile(f"GET /{i}", None) for i in range(3)]
+    for i, profile in enumerate(profiles):
+        profile.id = f"2026-{i}"
+        store.save(profile)
+
+    assert [saved["id"] for saved in store.list_profiles()] == ["2026-2", "2026-1"]
+    assert store.get_path("2026-0") is None
@@ -0,0 +1,96 @@
+import io
+import zipfile
+
+import pytest
+
+from services.project_store import ProjectStore
+
+def project_files(**sizes):
+    return [{"path": f"src/{name}.ts", "content": "x" * size} for name, size in sizes.items()]
+
+def test_create_cleans_root_relative_paths_and_builds_tree():
+    project = ProjectStore().create_project([
+        {"path": "/src/App.tsx", "content": "app"},
+        {"path": "./src/components/Nav.tsx", "content": "nav"},
+        {"path": "README.md", "content": "readme"}
+    ])
+
+    assert sorted(project.files) == ["README.md", "src/App.tsx", "src/components/Nav.tsx"]
+    tree = project.get_tree()
+    assert [node["name"] for node in tree] == ["src", "README.md"]
+    assert [node["name"] for node in tree[0]["children"]] == ["components", "App.tsx"]
+
+@pytest.mark.parametrize("path", ["../escape.ts", "src/../../escape.ts", "C:/windows.ts", "src\\..\\..\\x.ts", ""])
+def test_traversal_paths_are_rejected(path):
+    store = ProjectStore()
+    with pytest.raises(ValueError):
+        store.create_project([{"path": path, "content": "x"}])
+
+    project = store.create_project([{"path": "src/a.ts", "content": "a"}])
+    with pytest.raises(ValueError):
+        store.update_file(project.project_id, path, "x")
+
+def test_zip_stream_contains_every_file():
+    project = ProjectStore().create_project([{"path": "src/a.ts", "content": "a" * 100_000}, {"path": "b.md", "content": "b"}])
+
+    data = b"".join(project.iter_zip(chunk_size=1024))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert sorted(archive.namelist()) == ["b.md", "src/a.ts"]
+        assert archive.read("src/a.ts") == b"a" * 100_000
+
+def test_least_recently_used_project_is_evicted(monkeypatch):
+    monkeypatch.setenv("PROJECT_STORE_MAX_MB", str(250 / (1024 * 1024)))
+    store = ProjectStore()
+    first = store.create_project(project_files(a=100))
+    second = store.create_project(project_files(b=100))
+
+    store.get_project(first.project_id)
+    store.create_project(project_files(c=100))
+
+    with pytest.raises(KeyError):
+        store.get_project(second.project_id)
+    assert store.get_project(first.project_id) is first
+    assert store.get_stats()["total_bytes"] == 200
+
+def test_project_size_limit(monkeypatch):
+    monkeypatch.setenv("PROJECT_MAX_MB", str(150 / (1024 * 1024)))
+    store = ProjectStore()
+    with pytest.raises(ValueError):
+        store.create_project(project_files(a=200))
+
+    project = store.create_project(project_files(a=100))
+    with pytest.raises(ValueError):
+        store.update_file(project.project_id, "src/b.ts", "x" * 100)
+    store.update_file(project.project_id, "src/a.ts", "x" * 150)
+    assert store.get_project(project.project_id).size == 150
+
+def test_update_of_evicted_project_raises_key_error():
+    store = ProjectStore()
+    project = store.create_project(project_files(a=1))
+    store.delete_project(project.project_id)
+
+    with pytest.raises(KeyError):
+        store.update_file(project.project_id, "src/a.ts", "x")
+    assert store.get_stats()["total_bytes"] == 0
+
+def test_export_writes_files(tmp_path):
+    store = ProjectStore()
+    project = store.create_project([{"path": "src/a.ts", "content": "a"}])
+
+    result = store.export_project(project.project_id, str(tmp_path / "out"))
+    assert result["success"]
+    assert (tmp_path / "out" / "src" / "a.ts").read_text() == "a"
+
+def test_export_refuses_paths_escaping_through_symlinks(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    export_dir = tmp_path / "out"
+    export_dir.mkdir()
+    (export_dir / "src").symlink_to(outside)
+
+    store = ProjectStore()
+    project = store.create_project([{"path": "src/a.ts", "content": "a"}])
+
+    with pytest.raises(ValueError):
+        store.export_project(project.project_id, str(export_dir))
+    assert not (outside / "a.ts").exists()
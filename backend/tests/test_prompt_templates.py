@@ -0,0 +1,53 @@
+import pytest
+
+from services.prompt_templates import PromptRegistry, PromptTemplate, estimate_tokens, prompt_registry
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("cite sources.") == 4
+    assert estimate_tokens("internationalization") == 5
+
+def test_fixed_tokens_exclude_placeholders():
+    template = PromptTemplate("t", "v1", "system prompt", "Question: {query}")
+    assert template.placeholders == ["query"]
+    assert template.fixed_tokens == estimate_tokens("system prompt") + estimate_tokens("Question: ")
+
+def test_render_fills_user_template_and_keeps_literal_braces():
+    template = PromptTemplate("t", "v1", "system", 'Answer {query} as {{"json": true}}')
+    messages = template.render(query="why")
+    assert messages == [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": 'Answer why as {"json": true}'}
+    ]
+
+def test_registry_version_from_env(monkeypatch):
+    registry = PromptRegistry()
+    registry.register(PromptTemplate("t", "v1", "one", "{query}"))
+    registry.register(PromptTemplate("t", "v2", "two", "{query}"))
+
+    assert registry.get("t").version == "v1"
+    monkeypatch.setenv("PROMPT_T_VERSION", "v2")
+    assert registry.get("t").version == "v2"
+    assert registry.get("t", "v1").version == "v1"
+
+def test_registry_rejects_unknown_and_duplicate_templates():
+    registry = PromptRegistry()
+    registry.register(PromptTemplate("t", "v1", "one", "{query}"))
+
+    with pytest.raises(ValueError):
+        registry.register(PromptTemplate("t", "v1", "again", "{query}"))
+    with pytest.raises(KeyError):
+        registry.get("missing")
+    with pytest.raises(KeyError):
+        registry.get("t", "v9")
+
+@pytest.mark.parametrize("name", ["rag_answer", "website"])
+def test_compact_versions_are_cheaper_with_same_placeholders(name):
+    v1 = prompt_registry.get(name, "v1")
+    v2 = prompt_registry.get(name, "v2-compact")
+    assert v2.fixed_tokens < v1.fixed_tokens
+    assert v2.placeholders == v1.placeholders
+
+def test_compact_rag_answer_keeps_citation_rule():
+    for version in ("v1", "v2-compact"):
+        assert "cite your sources" in prompt_registry.get("rag_answer", version).system
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("groq")
+pytest.importorskip("sentence_transformers")
+
+from services.query_pipeline import QueryPipeline
+from services.semantic_cache import SemanticCache
+
+def chunk(chunk_id, document_id="doc1", text=None):
+    return {"chunk_id": chunk_id, "document_id": document_id, "filename": f"{document_id}.md", "chunk_index": 0}, text or f"text of {chunk_id}"
+
+class FakeEmbeddings:
+    async def generate_embeddings(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+class FakeChroma:
+    def __init__(self, hits, keyword_hits=()):
+        self.hits = hits
+        self.keyword_hits = list(keyword_hits)
+        self.queries = 0
+
+    def add_listener(self, listener):
+        pass
+
+    async def query_with_neighbors(self, query_embedding, n_results, document_ids=None, window=1):
+        self.queries += 1
+        return {
+            "ids": [[metadata["chunk_id"] for metadata, _ in self.hits]],
+            "documents": [[text for _, text in self.hits]],
+            "metadatas": [[metadata for metadata, _ in self.hits]],
+            "distances": [[0.1] * len(self.hits)],
+            "neighbors": {}
+        }
+
+    async def keyword_search(self, terms, n_results=5, document_ids=None):
+        return {
+            "ids": [metadata["chunk_id"] for metadata, _ in self.keyword_hits],
+            "documents": [text for _, text in self.keyword_hits],
+            "metadatas": [metadata for metadata, _ in self.keyword_hits],
+            "scores": [1.0] * len(self.keyword_hits)
+        }
+
+class FakeGroq:
+    def __init__(self):
+        self.generations = 0
+
+    async def warm_up_connection(self):
+        pass
+
+    async def generate_answer(self, query, context, deadline=None):
+        self.generations += 1
+        await asyncio.sleep(0.01)
+        return f"answer from {len(context)} chars"
+
+    async def stream_answer(self, query, context, deadline=None):
+        self.generations += 1
+        for delta in ("Hello", " world"):
+            await asyncio.sleep(0.005)
+            yield delta
+
+def make_pipeline(hits, keyword_hits=(), semantic_cache=None):
+    return QueryPipeline(FakeEmbeddings(), FakeChroma(hits, keyword_hits), FakeGroq(), semantic_cache)
+
+def test_concurrent_identical_queries_generate_once():
+    pipeline = make_pipeline([chunk("c1")])
+
+    async def main():
+        return await asyncio.gather(*(pipeline.run("What is X?") for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert pipeline.groq_service.generations == 1
+    assert len({result["answer"] for result in results}) == 1
+
+def test_stream_events_and_cache_hit_on_repeat():
+    cache = SemanticCache()
+    pipeline = make_pipeline([chunk("c1")], semantic_cache=cache)
+
+    async def collect():
+        return [event async for event in pipeline.run_stream("What is X?")]
+
+    events = asyncio.run(collect())
+    assert [event["type"] for event in events] == ["context", "token", "token", "done"]
+    assert events[0]["sources"] == ["doc1.md"]
+
+    repeat = asyncio.run(pipeline.run("What is X?"))
+    assert repeat["cached"] is True
+    assert repeat["answer"] == "Hello world"
+    assert pipeline.groq_service.generations == 1
+
+def test_keyword_hits_only_fill_leftover_slots(monkeypatch):
+    monkeypatch.setenv("QUERY_KEYWORD_SEARCH", "true")
+    pipeline = make_pipeline(
+        [chunk("c1"), chunk("c2")],
+        keyword_hits=[chunk("c2"), chunk("k1", "doc2"), chunk("k2", "doc2")]
+    )
+
+    result = asyncio.run(pipeline.run("explain middleware ordering", max_results=3))
+    chunk_ids = [context_chunk["metadata"]["chunk_id"] for context_chunk in result["context_chunks"]]
+    assert chunk_ids == ["c1", "c2", "k1"]
+    assert result["context_chunks"][2]["score"] == 0.0
+
+def test_merge_keeps_vector_ranking_when_full():
+    pipeline = make_pipeline([])
+    results = {
+        "ids": [["c1", "c2"]],
+        "documents": [["one", "two"]],
+        "metadatas": [[{"chunk_id": "c1"}, {"chunk_id": "c2"}]],
+        "distances": [[0.1, 0.3]]
+    }
+    keyword_results = {"ids": ["k1"], "documents": ["kw"], "metadatas": [{"chunk_id": "k1"}]}
+
+    merged = pipeline._merge_results(results, keyword_results, 2)
+    assert [item["metadata"]["chunk_id"] for item in merged] == ["c1", "c2"]
+    assert merged[0]["score"] == pytest.approx(0.9)
+
+def test_keyword_terms_skip_stopwords_and_short_words():
+    assert QueryPipeline._keyword_terms("How should I create the useEffect cleanup in Vue?") == ["useEffect", "cleanup"]
@@ -0,0 +1,62 @@
+import json
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from benchmarks.replay import DocumentMapper, hashed_records, replay
+from utils.traffic_recorder import hash_text
+
+def write_recording(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(path)
+
+def args(recording, **overrides):
+    options = {
+        "recording": recording, "kinds": None, "max_requests": None, "allow_hashed": False,
+        "base_url": "http://127.0.0.1:9", "speed": 1000.0, "timeout": 0.5, "start_stub": None
+    }
+    options.update(overrides)
+    return SimpleNamespace(**options)
+
+def test_document_mapper_maps_uploads_and_reuses_existing_documents():
+    mapper = DocumentMapper(["local1", "local2"])
+    mapper.add("recorded-upload", "local3")
+
+    assert mapper.map(["recorded-upload"]) == ["local3"]
+    assert mapper.map(["unknown"]) == mapper.map(["unknown"])
+    assert mapper.map(None) is None
+
+def test_hashed_records_counts_hashed_queries_and_prompts():
+    records = [
+        {"kind": "query", "query": hash_text("q", b"key")},
+        {"kind": "generate", "prompt": "plain prompt", "text": "hashed"},
+        {"kind": "query", "query": "plain question", "text": "redacted"},
+        {"kind": "upload", "text": "hashed"}
+    ]
+
+    assert hashed_records(records) == 2
+
+def test_replay_refuses_hashed_recording(tmp_path):
+    recording = write_recording(tmp_path / "traffic.jsonl", [
+        {"t": 1.0, "kind": "query", "path": "/api/query", "query": hash_text("q", b"key"), "text": "hashed"}
+    ])
+
+    with pytest.raises(ValueError, match="--allow-hashed"):
+        asyncio.run(replay(args(recording)))
+
+def test_replay_of_hashed_recording_warns_when_allowed(tmp_path, caplog):
+    recording = write_recording(tmp_path / "traffic.jsonl", [
+        {"t": 1.0, "kind": "query", "path": "/api/query", "query": hash_text("q", b"key"),
+         "text": "hashed", "duration_ms": 5.0}
+    ])
+
+    with caplog.at_level(logging.WARNING, logger="benchmarks.replay"):
+        report = asyncio.run(replay(args(recording, allow_hashed=True)))
+
+    assert any("HASHED" in message for message in caplog.messages)
+    # Nothing listens on the target port, so the request fails rather than being skipped
+    assert report["endpoints"]["query"]["requests"] == 1
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.resilience import CircuitBreaker, Deadline, DeadlineExceeded, hedged
+
+def make_breaker(**overrides):
+    options = {"error_rate_threshold": 0.5, "min_requests": 4, "window_seconds": 60.0, "cooldown_seconds": 0.05}
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+def trip(breaker):
+    for _ in range(breaker.min_requests):
+        breaker.record_failure()
+
+def test_deadline_caps_stage_budget_by_time_left():
+    deadline = Deadline(0.05, {"generation": 10.0})
+    assert deadline.budget("generation") <= 0.05
+    assert deadline.budget("unknown") <= 0.05
+
+def test_deadline_run_raises_when_stage_overruns():
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(DeadlineExceeded) as error:
+        asyncio.run(Deadline(5.0, {"retrieval": 0.01}).run("retrieval", slow()))
+    assert error.value.stage == "retrieval"
+
+def test_breaker_opens_at_error_rate():
+    breaker = make_breaker()
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_breaker_needs_min_requests():
+    breaker = make_breaker(min_requests=10)
+    for _ in range(5):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_breaker_half_open_trial_success_closes():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Only one trial at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_breaker_recovery_starts_with_a_fresh_window():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+
+    # The failures that opened the breaker no longer count
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_breaker_failed_trial_reopens():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_breaker_abandoned_trial_is_released():
+    breaker = make_breaker(cooldown_seconds=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.abandon()
+    assert breaker.allow()
+
+def test_breaker_unreported_trial_expires():
+    breaker = make_breaker(cooldown_seconds=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+
+def test_hedged_returns_fast_primary_without_hedging():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        return "primary"
+
+    assert asyncio.run(hedged(call, 0.05)) == "primary"
+    assert calls == 1
+
+def test_hedged_slow_primary_loses_to_hedge_and_is_cancelled():
+    attempts = []
+
+    async def call():
+        index = len(attempts)
+        task = asyncio.current_task()
+        attempts.append(task)
+        await asyncio.sleep(1.0 if index == 0 else 0.01)
+        return f"attempt {index}"
+
+    async def main():
+        result = await hedged(call, 0.02)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "attempt 1"
+    assert attempts[0].cancelled()
+
+def test_hedged_failed_primary_hedges_immediately():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("primary failed")
+        return "hedge"
+
+    started = time.monotonic()
+    assert asyncio.run(hedged(call, 5.0)) == "hedge"
+    assert time.monotonic() - started < 1.0
+
+def test_hedged_raises_last_error_when_all_attempts_fail():
+    async def call():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError, match="down"):
+        asyncio.run(hedged(call, 0.01))
+
+def test_hedged_cancelled_caller_cancels_attempts():
+    attempts = []
+
+    async def call():
+        attempts.append(asyncio.current_task())
+        await asyncio.sleep(1.0)
+
+    async def main():
+        task = asyncio.ensure_future(hedged(call, 0.01))
+        await asyncio.sleep(0.03)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert len(attempts) == 2
+    assert all(attempt.cancelled() for attempt in attempts)
+
+def test_hedged_cancelled_primary_is_treated_as_failure():
+    attempts = []
+
+    async def call():
+        attempts.append(asyncio.current_task())
+        if len(attempts) == 1:
+            await asyncio.sleep(1.0)
+        return "hedge"
+
+    async def main():
+        task = asyncio.ensure_future(hedged(call, 0.5))
+        await asyncio.sleep(0.01)
+        # Someone else cancels the primary attempt before the hedge is due
+        attempts[0].cancel()
+        return await task
+
+    assert asyncio.run(main()) == "hedge"
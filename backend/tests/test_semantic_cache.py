@@ -0,0 +1,78 @@
+from services.semantic_cache import SemanticCache
+
+def make_cache():
+    cache = SemanticCache()
+    cache.set_threshold(0.9)
+    return cache
+
+def answer(text="answer"):
+    return {"answer": text, "sources": ["a.md"], "context_chunks": []}
+
+def test_hit_for_similar_query_in_same_scope():
+    cache = make_cache()
+    cache.store("what is x", [1.0, 0.0], answer(), ["doc1"], ["doc1"], 5)
+
+    assert cache.lookup("what's x", [0.99, 0.05], ["doc1"], 5) == answer()
+    assert cache.get_stats()["hits"] == 1
+
+def test_miss_for_other_scope_or_max_results():
+    cache = make_cache()
+    cache.store("what is x", [1.0, 0.0], answer(), ["doc1"], ["doc1"], 5)
+
+    assert cache.lookup("what is x", [1.0, 0.0], ["doc2"], 5) is None
+    assert cache.lookup("what is x", [1.0, 0.0], None, 5) is None
+    assert cache.lookup("what is x", [1.0, 0.0], ["doc1"], 10) is None
+
+def test_miss_below_threshold():
+    cache = make_cache()
+    cache.store("what is x", [1.0, 0.0], answer(), ["doc1"])
+
+    assert cache.lookup("something else", [0.0, 1.0]) is None
+
+def test_deleting_a_source_document_invalidates_its_answers():
+    cache = make_cache()
+    cache.store("q1", [1.0, 0.0], answer("from doc1"), ["doc1"])
+    cache.store("q2", [0.0, 1.0], answer("from doc2"), ["doc2"], ["doc2"])
+
+    cache.handle_document_event("deleted", "doc1")
+
+    assert cache.lookup("q1", [1.0, 0.0]) is None
+    assert cache.lookup("q2", [0.0, 1.0], ["doc2"]) == answer("from doc2")
+
+def test_adding_a_document_invalidates_unscoped_answers():
+    cache = make_cache()
+    cache.store("q1", [1.0, 0.0], answer("unscoped"), ["doc1"])
+    cache.store("q2", [0.0, 1.0], answer("scoped"), ["doc1"], ["doc1"])
+
+    cache.handle_document_event("added", "doc3")
+
+    assert cache.lookup("q1", [1.0, 0.0]) is None
+    assert cache.lookup("q2", [0.0, 1.0], ["doc1"]) == answer("scoped")
+
+def test_answer_generated_across_an_invalidation_is_not_stored():
+    cache = make_cache()
+    generation = cache.generation()
+
+    # A document in the answer's scope changes while the answer is being generated
+    cache.handle_document_event("added", "doc1")
+    cache.store("q", [1.0, 0.0], answer("stale"), ["doc1"], ["doc1"], generation=generation)
+
+    assert cache.lookup("q", [1.0, 0.0], ["doc1"]) is None
+
+def test_unrelated_invalidation_does_not_block_store():
+    cache = make_cache()
+    generation = cache.generation()
+
+    cache.handle_document_event("deleted", "doc9")
+    cache.store("q", [1.0, 0.0], answer(), ["doc1"], ["doc1"], generation=generation)
+
+    assert cache.lookup("q", [1.0, 0.0], ["doc1"]) == answer()
+
+def test_max_entries_drops_oldest(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_MAX_ENTRIES", "1")
+    cache = make_cache()
+    cache.store("old", [1.0, 0.0], answer("old"), ["doc1"])
+    cache.store("new", [0.0, 1.0], answer("new"), ["doc1"])
+
+    assert cache.lookup("old", [1.0, 0.0]) is None
+    assert cache.lookup("new", [0.0, 1.0]) == answer("new")
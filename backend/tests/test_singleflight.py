@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight, make_query_key
+
+def test_query_key_normalizes_text_and_scope():
+    assert make_query_key("  What is X? ", ["b", "a"], 5) == make_query_key("what   is x", ["a", "b"], 5)
+    assert make_query_key("what is x", None, 5) != make_query_key("what is x", ["a"], 5)
+    assert make_query_key("what is x", None, 5) != make_query_key("what is x", None, 10)
+
+def test_concurrent_identical_calls_run_once():
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"answer": "shared"}
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", generate) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert calls == 1
+    assert results == [{"answer": "shared"}] * 5
+    assert flight.in_flight() == 0
+
+def test_later_call_after_completion_runs_again():
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def main():
+        flight = SingleFlight()
+        return await flight.do("key", generate), await flight.do("key", generate)
+
+    assert asyncio.run(main()) == (1, 2)
+    assert calls == 2
+
+def test_error_is_shared_by_all_callers():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    async def generate():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("key", generate))
+        second = asyncio.ensure_future(flight.do("key", generate))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+def test_stream_is_fanned_out_and_replayed_to_late_subscribers():
+    runs = 0
+
+    async def tokens():
+        nonlocal runs
+        runs += 1
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.005)
+            yield token
+
+    async def collect(flight, delay):
+        await asyncio.sleep(delay)
+        return [token async for token in flight.stream("key", tokens)]
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(collect(flight, 0), collect(flight, 0.008))
+
+    early, late = asyncio.run(main())
+    assert runs == 1
+    assert early == late == ["a", "b", "c"]
+
+def test_stream_error_reaches_subscribers():
+    async def tokens():
+        yield "a"
+        raise RuntimeError("stream failed")
+
+    async def main():
+        flight = SingleFlight()
+        return [token async for token in flight.stream("key", tokens)]
+
+    with pytest.raises(RuntimeError, match="stream failed"):
+        asyncio.run(main())
@@ -0,0 +1,75 @@
+import pytest
+
+from utils.file_writer import FileWriter
+from utils.snapshot_store import SnapshotStore
+
+def write(base, path, content):
+    target = base / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(content)
+
+def blobs(store):
+    return sorted(blob.name for blob in store.objects_path.glob("*/*"))
+
+def test_identical_content_is_stored_once(tmp_path):
+    write(tmp_path, "src/a.ts", "same")
+    write(tmp_path, "src/b.ts", "same")
+    store = SnapshotStore(str(tmp_path))
+
+    first = store.create_snapshot(["src/a.ts", "src/b.ts", "src/missing.ts"], label="one")
+    second = store.create_snapshot(["src/a.ts"])
+
+    assert len(blobs(store)) == 1
+    assert store.get_snapshot(first)["files"].keys() == {"src/a.ts", "src/b.ts"}
+    assert [snapshot["id"] for snapshot in store.list_snapshots()] == [second, first]
+
+def test_snapshot_of_missing_files_is_none(tmp_path):
+    assert SnapshotStore(str(tmp_path)).create_snapshot(["src/none.ts"]) is None
+
+def test_read_snapshot_files_returns_old_content(tmp_path):
+    write(tmp_path, "src/a.ts", "v1")
+    store = SnapshotStore(str(tmp_path))
+    snapshot_id = store.create_snapshot(["src/a.ts"])
+    write(tmp_path, "src/a.ts", "v2 is longer")
+
+    assert store.read_snapshot_files(snapshot_id) == [{"path": "src/a.ts", "content": "v1"}]
+
+def test_unknown_snapshot_raises_key_error(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    with pytest.raises(KeyError):
+        store.get_snapshot("../../etc/passwd")
+
+def test_prune_keeps_newest_and_collects_unreferenced_blobs(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    ids = []
+    for version in ("v1", "v2", "v3"):
+        write(tmp_path, "src/a.ts", version * 3)
+        ids.append(store.create_snapshot(["src/a.ts"]))
+
+    assert store.prune(keep_last=1) == [ids[1], ids[0]]
+    assert [snapshot["id"] for snapshot in store.list_snapshots()] == [ids[2]]
+    assert len(blobs(store)) == 1
+    assert store.read_snapshot_files(ids[2])[0]["content"] == "v3v3v3"
+
+def test_prune_by_age(tmp_path):
+    write(tmp_path, "src/a.ts", "a")
+    store = SnapshotStore(str(tmp_path))
+    snapshot_id = store.create_snapshot(["src/a.ts"])
+
+    assert store.prune(max_age_seconds=3600) == []
+    assert store.prune(max_age_seconds=-1) == [snapshot_id]
+    assert blobs(store) == []
+
+def test_file_writer_snapshots_and_restores_changed_files(tmp_path):
+    writer = FileWriter(str(tmp_path))
+    writer.write_files([{"path": "src/a.ts", "content": "old"}, {"path": "src/b.ts", "content": "same"}])
+
+    result = writer.write_files(
+        [{"path": "src/a.ts", "content": "new"}, {"path": "src/b.ts", "content": "same"}], snapshot=True
+    )
+    snapshot = writer.snapshots.get_snapshot(result["snapshot_id"])
+    assert list(snapshot["files"]) == ["src/a.ts"]
+
+    restored = writer.restore_snapshot(result["snapshot_id"])
+    assert restored["files_changed"] == ["src/a.ts"]
+    assert (tmp_path / "src" / "a.ts").read_text() == "old"
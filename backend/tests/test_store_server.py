@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("uvicorn")
+pytest.importorskip("chromadb.server.fastapi")
+
+from database.chroma_client import ChromaClient
+from database.store_server import StandInStoreServer
+
+@pytest.fixture(scope="module")
+def server():
+    with StandInStoreServer() as server:
+        yield server
+
+def chunks(*texts):
+    return [{"text": text, "chunk_index": i, "metadata": {"chunk_index": i}} for i, text in enumerate(texts)]
+
+def test_workers_share_one_store(server):
+    writer = ChromaClient(server_host=server.host, server_port=server.port)
+    reader = ChromaClient(server_host=server.host, server_port=server.port)
+
+    async def main():
+        await writer.add_documents(
+            "shared", chunks("alpha", "beta"), [[1.0, 0.0], [0.0, 1.0]], {"content_hash": "h-shared"}
+        )
+        found = await reader.find_document_by_hash("h-shared")
+        results = await reader.query([1.0, 0.0], n_results=1)
+        return found, results
+
+    found, results = asyncio.run(main())
+    assert found == "shared"
+    assert results["ids"][0] == ["shared_0"]
+
+def test_delete_is_seen_by_other_workers(server):
+    writer = ChromaClient(server_host=server.host, server_port=server.port)
+    reader = ChromaClient(server_host=server.host, server_port=server.port)
+
+    async def main():
+        await writer.add_documents("gone", chunks("gamma"), [[0.5, 0.5]], {"content_hash": "h-gone"})
+        await reader.delete_document("gone")
+        return await writer.find_document_by_hash("h-gone")
+
+    assert asyncio.run(main()) is None
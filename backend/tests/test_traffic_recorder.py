@@ -0,0 +1,83 @@
+import json
+import asyncio
+import hashlib
+
+import pytest
+
+from utils.traffic_recorder import TrafficRecorder, hash_text, is_hashed_text, load_recording, sanitize_text
+
+def test_sanitize_text_redacts_identifiers():
+    text = sanitize_text("mail bob@example.com or see https://x.io/a with key sk-abcdefghijklmnop")
+
+    assert text == "mail <email> or see <url> with key <secret>"
+
+def test_hash_text_is_keyed_and_detectable():
+    hashed = hash_text("what is x", b"key")
+
+    assert hashed == hash_text("what is x", b"key")
+    assert hashed != hash_text("what is x", b"other key")
+    assert hashed != "text-" + hashlib.sha256(b"what is x").hexdigest()[:16]
+    assert is_hashed_text(hashed)
+    assert not is_hashed_text("what is x")
+
+def record(recording, body):
+    scope = {"type": "http", "method": "POST", "path": "/api/query", "client": ("10.0.0.1", 1234), "headers": []}
+    messages = [{"type": "http.request", "body": json.dumps(body).encode("utf-8")}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    async def app(scope, receive, send):
+        await receive()
+        payload = json.dumps({"answer": "a", "cached": True}).encode("utf-8")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": payload})
+
+    asyncio.run(TrafficRecorder(app, path=recording)(scope, receive, send))
+    return load_recording(recording)[-1]
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRAFFIC_RECORD_HASH_KEY", "secret")
+    return str(tmp_path / "traffic.jsonl")
+
+def test_hashed_mode_records_no_plain_text(recording):
+    recorded = record(recording, {"query": "my private question", "max_results": 3})
+
+    assert recorded["kind"] == "query" and recorded["text"] == "hashed"
+    assert recorded["query"] == hash_text("my private question", b"secret")
+    assert recorded["max_results"] == 3 and recorded["cached"] is True and recorded["status"] == 200
+
+def test_redacted_mode_keeps_sanitized_text(recording, monkeypatch):
+    monkeypatch.setenv("TRAFFIC_RECORD_TEXT", "redacted")
+    recorded = record(recording, {"query": "email me at bob@example.com"})
+
+    assert recorded["text"] == "redacted"
+    assert recorded["query"] == "email me at <email>"
+
+def test_client_id_is_keyed_by_the_secret(recording, monkeypatch):
+    first = record(recording, {"query": "q"})["client"]
+    assert record(recording, {"query": "q"})["client"] == first
+    assert first != hashlib.sha256(b"10.0.0.1").hexdigest()[:12]
+
+    monkeypatch.setenv("TRAFFIC_RECORD_HASH_KEY", "rotated")
+    assert record(recording, {"query": "q"})["client"] != first
+
+def test_client_id_uses_random_key_without_secret(tmp_path, monkeypatch):
+    monkeypatch.delenv("TRAFFIC_RECORD_HASH_KEY", raising=False)
+    recording = str(tmp_path / "traffic.jsonl")
+
+    assert record(recording, {"query": "q"})["client"] != record(recording, {"query": "q"})["client"]
+
+def test_unrecorded_routes_are_not_written(recording):
+    async def app(scope, receive, send):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/api/documents", "headers": []}
+    asyncio.run(TrafficRecorder(app, path=recording)(scope, None, None))
+
+    with pytest.raises(FileNotFoundError):
+        load_recording(recording)
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from services.upload_service import UploadService, UploadTooLargeError
+
+class FakeUpload:
+    def __init__(self, data, piece=4):
+        self.data = data
+        self.piece = piece
+        self.offset = 0
+
+    async def read(self, size):
+        await asyncio.sleep(0)
+        chunk = self.data[self.offset:self.offset + min(size, self.piece)]
+        self.offset += len(chunk)
+        return chunk
+
+class FakeChroma:
+    def __init__(self, stored=None):
+        self.stored = stored or {}
+        self.lookups = 0
+
+    async def find_document_by_hash(self, content_hash):
+        self.lookups += 1
+        await asyncio.sleep(0.01)
+        return self.stored.get(content_hash)
+
+class FakeQueue:
+    def add_listener(self, listener):
+        self.listener = listener
+
+@pytest.fixture
+def service(work_dir, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(work_dir / "uploads"))
+    return UploadService(FakeChroma())
+
+def uploaded_files(work_dir):
+    return sorted(path.name for path in (work_dir / "uploads").iterdir())
+
+def test_concurrent_identical_uploads_ingest_once(service, work_dir):
+    async def main():
+        return await asyncio.gather(*(service.save_upload(FakeUpload(b"same content"), "a.md") for _ in range(3)))
+
+    results = asyncio.run(main())
+
+    assert len({result["document_id"] for result in results}) == 1
+    assert sorted(result["duplicate"] for result in results) == [False, True, True]
+    assert len(uploaded_files(work_dir)) == 1
+    assert service._hash_locks == {}
+
+def test_upload_matching_stored_document_is_not_kept(service, work_dir):
+    first = asyncio.run(service.save_upload(FakeUpload(b"content"), "a.md"))
+    service.release(first["content_hash"])
+    service.chroma_client.stored[first["content_hash"]] = "stored-doc"
+
+    second = asyncio.run(service.save_upload(FakeUpload(b"content"), "copy.md"))
+    assert second["duplicate"] and second["document_id"] == "stored-doc"
+    assert uploaded_files(work_dir) == [f"{first['document_id']}_a.md"]
+
+def test_queue_listener_releases_finished_ingestion(work_dir, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(work_dir / "uploads"))
+    queue = FakeQueue()
+    service = UploadService(FakeChroma(), ingestion_queue=queue)
+    saved = asyncio.run(service.save_upload(FakeUpload(b"content"), "a.md"))
+
+    # A job for another document with the same hash does not release the entry
+    queue.listener({"document_id": "other", "metadata": {"content_hash": saved["content_hash"]}})
+    assert asyncio.run(service.find_existing(saved["content_hash"])) == saved["document_id"]
+
+    queue.listener({"document_id": saved["document_id"], "metadata": service.build_metadata(saved)})
+    assert asyncio.run(service.find_existing(saved["content_hash"])) is None
+
+def test_unreported_pending_upload_expires(work_dir, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(work_dir / "uploads"))
+    monkeypatch.setenv("UPLOAD_PENDING_TTL_SECONDS", "0")
+    service = UploadService(FakeChroma())
+    saved = asyncio.run(service.save_upload(FakeUpload(b"content"), "a.md"))
+
+    again = asyncio.run(service.save_upload(FakeUpload(b"content"), "a.md"))
+    assert not again["duplicate"]
+    assert again["document_id"] != saved["document_id"]
+
+def test_too_large_upload_leaves_nothing_behind(work_dir, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(work_dir / "uploads"))
+    monkeypatch.setenv("MAX_UPLOAD_SIZE_MB", str(8 / (1024 * 1024)))
+    service = UploadService(FakeChroma())
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(service.save_upload(FakeUpload(b"0123456789"), "a.md"))
+    assert uploaded_files(work_dir) == []
+
+def test_unsupported_extension_is_rejected(service):
+    with pytest.raises(ValueError):
+        asyncio.run(service.save_upload(FakeUpload(b"x"), "script.exe"))
@@ -0,0 +1,289 @@
+import os
+import math
+import json
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# (method, path prefix, endpoint class); the first match wins
+DEFAULT_ROUTES = [
+    ("POST", "/api/query", "query"),
+    ("POST", "/api/generate-website", "generate"),
+    ("POST", "/api/documents/upload", "upload"),
+    ("GET", "/api/", "list"),
+    ("DELETE", "/api/", "list")
+]
+
+# name: (concurrency, queue size, deadline seconds, quota cost)
+DEFAULT_CLASSES = {
+    "query": (8, 32, 30.0, 1.0),
+    "generate": (2, 8, 120.0, 10.0),
+    "upload": (4, 16, 60.0, 2.0),
+    "list": (16, 64, 5.0, 0.2)
+}
+
+ADMISSION_REJECTED = registry.counter(
+    "ragoorb_admission_rejected_total", "Requests shed by admission control, by class and reason", ["endpoint_class", "reason"]
+)
+ADMISSION_ACTIVE = registry.gauge(
+    "ragoorb_admission_active", "Requests holding an admission slot", ["endpoint_class"]
+)
+ADMISSION_QUEUED = registry.gauge(
+    "ragoorb_admission_queued", "Requests waiting for an admission slot", ["endpoint_class"]
+)
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class EndpointClass:
+    """
+    Concurrency limit and bounded FIFO queue for one class of endpoints.
+
+    The expected queue wait is estimated from the moving average service
+    time. A request is shed up front when the queue is full, or when it
+    would wait past its deadline, instead of being admitted only to time
+    out together with everything queued behind it.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, deadline: float, cost: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.cost = cost
+
+        self.active = 0
+        self.service_time = 0.0
+        self._waiters: deque = deque()
+
+        ADMISSION_ACTIVE.set_function(lambda: self.active, endpoint_class=name)
+        ADMISSION_QUEUED.set_function(lambda: len(self._waiters), endpoint_class=name)
+
+    def estimated_wait(self) -> float:
+        """Seconds a newly arriving request would wait for a slot."""
+        if self.active < self.max_concurrency:
+            return 0.0
+        return (len(self._waiters) + 1) / self.max_concurrency * self.service_time
+
+    async def acquire(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+
+        wait = self.estimated_wait()
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(503, "queue_full", max(wait, 1.0))
+        # Leave time to actually serve the request once it is admitted
+        budget = self.deadline - self.service_time
+        if wait > budget:
+            raise AdmissionRejected(503, "deadline", wait)
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max(budget, 0.0))
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ran out; keep it
+                return
+            waiter.cancel()
+            raise AdmissionRejected(503, "deadline", self.estimated_wait())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, elapsed: Optional[float] = None):
+        if elapsed is not None:
+            # Exponential moving average of how long a slot is held
+            self.service_time = elapsed if not self.service_time else 0.8 * self.service_time + 0.2 * elapsed
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def available_in(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available; 0 if they are now."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def take(self, cost: float) -> float:
+        """Take `cost` tokens; returns 0 on success, else seconds until they are available."""
+        wait = self.available_in(cost)
+        if not wait:
+            self.tokens -= cost
+        return wait
+
+class ClientQuotas:
+    """Per-client token buckets, keeping the most recently seen clients."""
+
+    def __init__(self, rate_per_minute: float, burst: float, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, client_id: str, cost: float) -> float:
+        """Seconds until the client could afford `cost`, without taking anything."""
+        return self._bucket(client_id).available_in(cost)
+
+    def take(self, client_id: str, cost: float) -> float:
+        return self._bucket(client_id).take(cost)
+
+    def _bucket(self, client_id: str) -> TokenBucket:
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[client_id] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        return bucket
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware for admission control, load shedding and client quotas.
+
+    Each request is mapped to an endpoint class (query, generate, upload or
+    list) that has its own concurrency limit, queue and deadline, so slow
+    website generations cannot starve cheap document listings. Clients draw
+    from a token bucket, with costlier classes taking more tokens, charged
+    only once the request is admitted. A client is the authenticated user
+    when an authentication middleware has set scope["user"], otherwise the
+    peer address, or the X-Forwarded-For client when the peer is one of
+    ADMISSION_TRUSTED_PROXIES.
+
+    Rejected requests get 429 (client over quota) or 503 (server busy) with
+    a Retry-After header. Limits are read from ADMISSION_<CLASS>_CONCURRENCY,
+    _QUEUE, _DEADLINE_SECONDS and _COST, and quotas from
+    CLIENT_QUOTA_PER_MINUTE and CLIENT_QUOTA_BURST.
+    """
+
+    def __init__(self, app, routes: Optional[List[Tuple[str, str, str]]] = None):
+        self.app = app
+        self.routes = routes or DEFAULT_ROUTES
+        self.enabled = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+
+        self.classes: Dict[str, EndpointClass] = {}
+        for name, (concurrency, queue, deadline, cost) in DEFAULT_CLASSES.items():
+            prefix = f"ADMISSION_{name.upper()}"
+            self.classes[name] = EndpointClass(
+                name,
+                max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+                max_queue=int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+                deadline=float(os.getenv(f"{prefix}_DEADLINE_SECONDS", str(deadline))),
+                cost=float(os.getenv(f"{prefix}_COST", str(cost)))
+            )
+
+        quota_per_minute = float(os.getenv("CLIENT_QUOTA_PER_MINUTE", "60"))
+        self.quotas = ClientQuotas(quota_per_minute, float(os.getenv("CLIENT_QUOTA_BURST", "30"))) \
+            if quota_per_minute > 0 else None
+        self.trusted_proxies = {
+            address.strip() for address in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if address.strip()
+        }
+
+    async def __call__(self, scope, receive, send):
+        endpoint_class = self._classify(scope) if self.enabled and scope["type"] == "http" else None
+        if endpoint_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        client_id = self._client_id(scope) if self.quotas else None
+        try:
+            if self.quotas:
+                # Reject over-quota clients before they queue, but charge only admitted requests
+                retry_after = self.quotas.check(client_id, endpoint_class.cost)
+                if retry_after:
+                    raise AdmissionRejected(429, "quota", retry_after)
+            await endpoint_class.acquire()
+            if self.quotas:
+                retry_after = self.quotas.take(client_id, endpoint_class.cost)
+                if retry_after:
+                    endpoint_class.release()
+                    raise AdmissionRejected(429, "quota", retry_after)
+        except AdmissionRejected as e:
+            ADMISSION_REJECTED.inc(endpoint_class=endpoint_class.name, reason=e.reason)
+            logger.warning(f"Shed {scope['method']} {scope['path']} ({endpoint_class.name}): {e.reason}")
+            await self._reject(send, e)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            endpoint_class.release(time.monotonic() - start)
+
+    def _classify(self, scope) -> Optional[EndpointClass]:
+        method, path = scope["method"], scope["path"]
+        for route_method, prefix, name in self.routes:
+            if method == route_method and path.startswith(prefix):
+                return self.classes.get(name)
+        return None
+
+    def _client_id(self, scope) -> str:
+        # Only an identity an authentication middleware verified; raw credentials are client-chosen
+        user = scope.get("user")
+        if user is not None and getattr(user, "is_authenticated", False):
+            return f"user:{user.display_name}"
+
+        client = scope.get("client")
+        address = client[0] if client else None
+        if address in self.trusted_proxies:
+            headers = dict(scope.get("headers") or [])
+            forwarded = [hop.strip() for hop in headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",")]
+            # The nearest hop not added by one of our proxies is the client
+            for hop in reversed(forwarded):
+                if hop and hop not in self.trusted_proxies:
+                    address = hop
+                    break
+        return f"addr:{address}" if address else "anonymous"
+
+    @staticmethod
+    async def _reject(send, error: AdmissionRejected):
+        detail = "Rate limit exceeded" if error.status == 429 else "Server is busy, try again later"
+        body = json.dumps({"detail": detail, "reason": error.reason}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": error.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(max(1, math.ceil(error.retry_after))).encode("ascii"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
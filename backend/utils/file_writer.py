@@ -1,58 +1,123 @@
 import os
+import json
+import uuid
+import shutil
+import hashlib
 import logging
-from pathlib import Path
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import List, Dict, Any, Optional
+
+from utils.snapshot_store import SnapshotStore
 
 logger = logging.getLogger(__name__)
 
 class FileWriter:
-    """Utility class for writing generated files to the filesystem."""
+    """
+    Utility class for writing generated files to the filesystem.
+    
+    Batches are diff-aware and atomic: files whose content already matches
+    what is on disk are skipped, changed files are staged to temp files in
+    parallel, and the batch is committed through a journal so a crash leaves
+    either the old or the new version of every file. State lives in
+    `<base_path>/.filewriter/`.
+    """
     
     def __init__(self, base_path: str = "./"):
         self.base_path = Path(base_path).resolve()
+        self.state_dir = self.base_path / ".filewriter"
+        self.manifest_path = self.state_dir / "manifest.json"
+        self.journal_path = self.state_dir / "journal.json"
+        self.max_workers = int(os.getenv("FILE_WRITER_MAX_WORKERS", "8"))
+        self.fsync = os.getenv("FILE_WRITER_FSYNC", "false").lower() == "true"
+        
+        self.snapshots = SnapshotStore(str(self.base_path))
+        self.snapshot_keep_last = int(os.getenv("SNAPSHOT_KEEP_LAST", "20"))
+        self.snapshot_max_age = float(os.getenv("SNAPSHOT_MAX_AGE_DAYS", "30")) * 86400
+        
+        self._recover()
     
-    def write_files(self, files_data: List[Dict[str, str]]) -> Dict[str, Any]:
+    def write_files(self, files_data: List[Dict[str, str]], snapshot: bool = False) -> Dict[str, Any]:
         """
-        Write multiple files to the filesystem.
+        Write multiple files to the filesystem as one atomic batch.
         
         Args:
             files_data: List of dictionaries with 'path' and 'content' keys
+            snapshot: Snapshot the files about to be overwritten first
             
         Returns:
-            Dictionary with success status and details
+            Dictionary with success status and details. `files_written` lists
+            every path that is up to date after the batch; `files_changed` and
+            `files_unchanged` split it by whether a write was needed.
         """
         results = {
             "success": True,
             "files_written": [],
+            "files_changed": [],
+            "files_unchanged": [],
             "errors": [],
-            "total_files": len(files_data)
+            "total_files": len(files_data),
+            "snapshot_id": None
         }
         
+        manifest = self._load_manifest()
+        pending = {}
+        
         for file_data in files_data:
+            file_path = file_data.get("path", "")
+            content = file_data.get("content", "")
+            
+            if not file_path:
+                results["errors"].append("Missing file path")
+                continue
+            
+            data = content.encode("utf-8")
+            content_hash = hashlib.sha256(data).hexdigest()
+            
+            # Later entries for the same path win
+            pending[file_path] = (data, content_hash)
+        
+        # "src/x" and "src/x/y.ts" cannot both be written: one needs x to be a file, the other a directory
+        for file_path in self._conflicting_paths(pending):
+            error_msg = f"Error processing file {file_path}: conflicts with another path in the batch"
+            results["errors"].append(error_msg)
+            logger.error(error_msg)
+            del pending[file_path]
+        
+        changed = {}
+        for file_path, (data, content_hash) in pending.items():
             try:
-                file_path = file_data.get("path", "")
-                content = file_data.get("content", "")
-                
-                if not file_path:
-                    results["errors"].append("Missing file path")
-                    continue
-                
-                # Write the file
-                success = self.write_single_file(file_path, content)
-                
-                if success:
-                    results["files_written"].append(file_path)
+                if self._current_hash(file_path, manifest) == content_hash:
+                    results["files_unchanged"].append(file_path)
                 else:
-                    results["errors"].append(f"Failed to write {file_path}")
-                    
+                    changed[file_path] = (data, content_hash)
             except Exception as e:
-                error_msg = f"Error processing file {file_data.get('path', 'unknown')}: {str(e)}"
+                error_msg = f"Error processing file {file_path}: {str(e)}"
                 results["errors"].append(error_msg)
                 logger.error(error_msg)
         
+        if changed and snapshot:
+            # Only files that are about to change need their old version kept
+            results["snapshot_id"] = self.backup_existing_files(
+                [{"path": file_path} for file_path in changed], label="pre-write"
+            )
+        
+        if changed:
+            errors = self._commit_batch(changed, manifest)
+            results["errors"].extend(errors)
+            if not errors:
+                results["files_changed"] = list(changed)
+        
+        results["files_written"] = results["files_unchanged"] + results["files_changed"]
+        
         # Set overall success status
         results["success"] = len(results["errors"]) == 0
         
+        logger.info(
+            f"Wrote {len(results['files_changed'])} changed files, "
+            f"skipped {len(results['files_unchanged'])} unchanged"
+        )
+        
         return results
     
     def write_single_file(self, file_path: str, content: str) -> bool:
@@ -66,61 +131,228 @@ class FileWriter:
         Returns:
             True if successful, False otherwise
         """
+        return not self.write_files([{"path": file_path, "content": content}])["errors"]
+    
+    def _commit_batch(self, changed: Dict[str, Any], manifest: Dict[str, Any]) -> List[str]:
+        """
+        Stage changed files in parallel, then swap them into place.
+        
+        Returns a list of errors; on any error nothing is committed.
+        """
+        # Create each parent directory once for the whole batch
+        errors = []
+        for directory in {(self.base_path / path).parent for path in changed}:
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                error_msg = f"Error creating directory {directory.relative_to(self.base_path)}: {str(e)}"
+                errors.append(error_msg)
+                logger.error(error_msg)
+        if errors:
+            return errors
+        
+        def stage(item):
+            file_path, (data, _) = item
+            target = self.base_path / file_path
+            temp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+            with open(temp, 'wb') as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            return file_path, temp
+        
+        staged = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(changed))) as executor:
+            futures = {executor.submit(stage, item): item[0] for item in changed.items()}
+            for future, file_path in futures.items():
+                try:
+                    staged[file_path] = future.result()[1]
+                except Exception as e:
+                    error_msg = f"Error writing file {file_path}: {str(e)}"
+                    errors.append(error_msg)
+                    logger.error(error_msg)
+        
+        if errors:
+            for temp in staged.values():
+                temp.unlink(missing_ok=True)
+            return errors
+        
+        journal = []
+        for file_path, temp in staged.items():
+            target = self.base_path / file_path
+            journal.append({
+                "path": file_path,
+                "temp": str(temp),
+                "hash": changed[file_path][1],
+                # Where the replaced version is kept until the whole batch is in
+                "backup": str(target.with_name(f".{target.name}.{uuid.uuid4().hex}.bak"))
+                if target.exists() else None
+            })
+        
         try:
-            # Resolve the full path
-            full_path = self.base_path / file_path
-            
-            # Create parent directories if they don't exist
-            full_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Write the file
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            logger.info(f"Successfully wrote file: {file_path}")
-            return True
-            
+            self._write_json(self.journal_path, journal)
+            self._apply_journal(journal, manifest)
         except Exception as e:
-            logger.error(f"Error writing file {file_path}: {str(e)}")
-            return False
+            self._rollback(journal)
+            error_msg = f"Error committing write batch, rolled back: {str(e)}"
+            logger.error(error_msg)
+            return [error_msg]
+        return []
+    
+    def _apply_journal(self, journal: List[Dict[str, str]], manifest: Dict[str, Any]):
+        """Move staged files into place, record them in the manifest and clear the journal."""
+        for entry in journal:
+            temp = Path(entry["temp"])
+            target = self.base_path / entry["path"]
+            backup = Path(entry["backup"]) if entry.get("backup") else None
+            if not temp.exists():
+                continue
+            if backup is not None and target.exists() and not backup.exists():
+                self._keep_backup(target, backup)
+            os.replace(temp, target)
+        
+        for entry in journal:
+            target = self.base_path / entry["path"]
+            if target.is_file():
+                stat = target.stat()
+                manifest[entry["path"]] = {
+                    "hash": entry["hash"],
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns
+                }
+            if entry.get("backup"):
+                Path(entry["backup"]).unlink(missing_ok=True)
+        
+        self._write_json(self.manifest_path, manifest)
+        self.journal_path.unlink(missing_ok=True)
+    
+    @staticmethod
+    def _keep_backup(target: Path, backup: Path):
+        """Keep the current version of a file; the file itself stays in place."""
+        try:
+            os.link(target, backup)
+        except OSError:
+            shutil.copy2(target, backup)
     
-    def backup_existing_files(self, files_data: List[Dict[str, str]]) -> bool:
+    def _rollback(self, journal: List[Dict[str, str]]):
+        """Undo a partly applied batch: restore replaced files, remove new ones and clear the journal."""
+        for entry in reversed(journal):
+            temp = Path(entry["temp"])
+            target = self.base_path / entry["path"]
+            backup = Path(entry["backup"]) if entry.get("backup") else None
+            try:
+                if temp.exists():
+                    # Never swapped in; the target still holds its old version
+                    temp.unlink()
+                    if backup is not None:
+                        backup.unlink(missing_ok=True)
+                elif backup is not None:
+                    if backup.exists():
+                        os.replace(backup, target)
+                elif target.is_file():
+                    target.unlink()
+            except Exception as e:
+                logger.error(f"Error rolling back {entry['path']}: {str(e)}")
+        
+        self.journal_path.unlink(missing_ok=True)
+    
+    def _recover(self):
+        """Roll forward a batch that was interrupted after it was journaled, or roll it back if it cannot be replayed."""
+        if not self.journal_path.exists():
+            return
+        
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                journal = json.load(f)
+        except Exception as e:
+            logger.error(f"Discarding unreadable write journal: {str(e)}")
+            self.journal_path.unlink(missing_ok=True)
+            return
+        
+        try:
+            self._apply_journal(journal, self._load_manifest())
+            logger.warning(f"Recovered interrupted write batch of {len(journal)} files")
+        except Exception as e:
+            self._rollback(journal)
+            logger.error(f"Could not replay interrupted write batch, rolled it back: {str(e)}")
+    
+    @staticmethod
+    def _conflicting_paths(paths) -> List[str]:
+        """Paths in a batch that are a parent directory of, or nested under, another path in it."""
+        parts = {PurePosixPath(path).parts: path for path in paths}
+        conflicts = []
+        for key, path in parts.items():
+            for depth in range(1, len(key)):
+                parent = parts.get(key[:depth])
+                if parent is not None:
+                    conflicts.extend([parent, path])
+        return list(dict.fromkeys(conflicts))
+    
+    def _current_hash(self, file_path: str, manifest: Dict[str, Any]) -> Optional[str]:
+        """Hash of the file currently on disk, or None if it does not exist."""
+        full_path = self.base_path / file_path
+        if not full_path.exists():
+            return None
+        
+        # Trust the manifest while the file's size and mtime are unchanged
+        stat = full_path.stat()
+        entry = manifest.get(file_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["hash"]
+        
+        with open(full_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    
+    def _load_manifest(self) -> Dict[str, Any]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable write manifest: {str(e)}")
+            return {}
+    
+    def _write_json(self, path: Path, data: Any):
+        """Atomically replace a JSON state file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp, path)
+    
+    def backup_existing_files(self, files_data: List[Dict[str, str]], label: str = "") -> Optional[str]:
         """
-        Create backups of existing files before overwriting.
+        Snapshot the existing versions of the given files before overwriting.
         
         Args:
             files_data: List of dictionaries with 'path' and 'content' keys
+            label: Optional label stored with the snapshot
             
         Returns:
-            True if all backups successful, False otherwise
+            The snapshot id, or None if nothing existed or the snapshot failed
         """
         try:
-            backup_dir = self.base_path / ".backups" / f"backup_{int(os.time())}"
-            backup_dir.mkdir(parents=True, exist_ok=True)
+            paths = [file_data.get("path", "") for file_data in files_data if file_data.get("path")]
+            snapshot_id = self.snapshots.create_snapshot(paths, label=label)
             
-            for file_data in files_data:
-                file_path = file_data.get("path", "")
-                if not file_path:
-                    continue
-                
-                full_path = self.base_path / file_path
-                
-                # Only backup if file exists
-                if full_path.exists():
-                    backup_path = backup_dir / file_path
-                    backup_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # Copy existing file to backup location
-                    with open(full_path, 'r', encoding='utf-8') as src:
-                        with open(backup_path, 'w', encoding='utf-8') as dst:
-                            dst.write(src.read())
+            if snapshot_id:
+                self.snapshots.prune(keep_last=self.snapshot_keep_last, max_age_seconds=self.snapshot_max_age)
             
-            logger.info(f"Created backup in: {backup_dir}")
-            return True
+            return snapshot_id
             
         except Exception as e:
             logger.error(f"Error creating backups: {str(e)}")
-            return False
+            return None
+    
+    def restore_snapshot(self, snapshot_id: str) -> Dict[str, Any]:
+        """
+        Restore the files recorded in a snapshot.
+        
+        Only files that differ from the snapshot are rewritten.
+        """
+        return self.write_files(self.snapshots.read_snapshot_files(snapshot_id))
     
     def validate_file_paths(self, files_data: List[Dict[str, str]]) -> List[str]:
         """
@@ -0,0 +1,410 @@
+import os
+import time
+import uuid
+import math
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+# Stage timings of the HTTP request being handled, for the Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """Base class for a named metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        """Exposition lines for every labelled series; subclasses override it."""
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: Any):
+        """Read the gauge from `function` on every scrape."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def value(self, **labels: Any) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return float(self._functions[key]())
+        return self._values.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+
+        for key, function in functions:
+            try:
+                values[key] = float(function())
+            except Exception as e:
+                logger.warning(f"Error reading gauge {self.name}: {str(e)}")
+
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels: Any):
+        """Observe the wall-clock duration of the enclosed block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        series = self._values.get(self._key(labels))
+        return series["count"] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series["counts"]), series["sum"], series["count"])
+                     for key, series in self._values.items()]
+
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide collection of metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "ragoorb_stage_duration_seconds",
+    "Latency of pipeline stages (extraction, chunking, embedding, chroma_*, prompt_build, generation)",
+    ["stage"]
+)
+EMBEDDING_BATCH_SIZE = registry.histogram(
+    "ragoorb_embedding_batch_size", "Number of texts per embedding call", buckets=SIZE_BUCKETS
+)
+LLM_REQUEST_SECONDS = registry.histogram(
+    "ragoorb_llm_request_seconds", "Latency of LLM completions by model and prompt template", ["model", "template"]
+)
+LLM_TOKENS = registry.counter(
+    "ragoorb_llm_tokens_total", "LLM tokens used, by model and kind (prompt/completion)", ["model", "kind"]
+)
+LLM_PROMPT_TOKENS = registry.histogram(
+    "ragoorb_llm_prompt_tokens", "Prompt tokens per LLM completion", ["template"], buckets=TOKEN_BUCKETS
+)
+CACHE_LOOKUPS = registry.counter(
+    "ragoorb_cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"]
+)
+EXECUTOR_QUEUE_DEPTH = registry.gauge(
+    "ragoorb_executor_queue_depth", "Work items waiting for a free executor thread", ["executor"]
+)
+QUEUE_DEPTH = registry.gauge(
+    "ragoorb_queue_depth", "Jobs waiting in background queues", ["queue"]
+)
+PIPELINE_IN_FLIGHT = registry.gauge(
+    "ragoorb_pipeline_in_flight", "Distinct (coalesced) pipeline computations currently running", ["pipeline"]
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "ragoorb_http_requests_in_flight", "HTTP requests currently being handled"
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "ragoorb_http_request_duration_seconds", "HTTP request latency by route and status", ["method", "route", "status"]
+)
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Time the enclosed block as a pipeline stage.
+
+    The duration goes into the stage histogram and, inside an HTTP request,
+    into that request's Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def track_executor(name: str, executor):
+    """Export the backlog of a ThreadPoolExecutor as a queue depth gauge."""
+    work_queue = getattr(executor, "_work_queue", None)
+    if work_queue is None:
+        logger.warning(f"Executor {name} has no work queue to track")
+        return
+    EXECUTOR_QUEUE_DEPTH.set_function(work_queue.qsize, executor=name)
+
+def track_default_executor(loop=None, max_workers: Optional[int] = None):
+    """
+    Install and track an explicit default executor on the event loop.
+
+    asyncio creates its default executor lazily and keeps it private, so the
+    queue depth of run_in_executor(None, ...) work can only be observed when
+    the executor is set up front, e.g. in the application's startup hook.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = loop or asyncio.get_event_loop()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asyncio")
+    loop.set_default_executor(executor)
+    track_executor("default", executor)
+    return executor
+
+def current_request_id() -> Optional[str]:
+    """Id of the HTTP request being handled, if any."""
+    return _request_id.get()
+
+def _server_timing(timings: List[Tuple[str, float]], total: float) -> bytes:
+    totals: Dict[str, float] = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    entries = [f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries).encode("latin-1")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that serves the metrics endpoint and times every request.
+
+    Each response carries an X-Request-ID header (taken from the request when
+    the client sends one) and a Server-Timing header listing the stages that
+    ran while handling it, so a slow request can be broken down from the
+    client side or in access logs. Mount it with:
+
+        app.add_middleware(MetricsMiddleware)
+    """
+
+    def __init__(self, app, metrics_path: Optional[str] = None, metrics_registry: MetricsRegistry = registry):
+        self.app = app
+        self.metrics_path = metrics_path or os.getenv("METRICS_PATH", "/metrics")
+        self.registry = metrics_registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] == self.metrics_path and scope["method"] == "GET":
+            await self._send_metrics(send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:128] or uuid.uuid4().hex
+        timings: List[Tuple[str, float]] = []
+        timings_token = _request_timings.set(timings)
+        request_id_token = _request_id.set(request_id)
+
+        start = time.perf_counter()
+        status = 500
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers") or [])
+                response_headers.append((b"x-request-id", request_id.encode("latin-1")))
+                response_headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start)))
+                message = {**message, "headers": response_headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=self._route(scope),
+                status=status
+            )
+            _request_timings.reset(timings_token)
+            _request_id.reset(request_id_token)
+
+    async def _send_metrics(self, send):
+        body = self.registry.render().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                (b"content-length", str(len(body)).encode("ascii"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    def _route(scope) -> str:
+        # The router stores the matched endpoint in the scope; using its name
+        # rather than the raw path keeps ids out of the label values
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            return getattr(endpoint, "__name__", "unknown")
+        return "unmatched"
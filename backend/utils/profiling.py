@@ -0,0 +1,378 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+import contextvars
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Profile of the request (or job) the current task is working for
+_active_profile: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar(
+    "active_profile", default=None
+)
+
+MAX_STACK_DEPTH = 128
+
+class Profile:
+    """Folded stack samples collected for one request or job."""
+
+    def __init__(self, label: str, loop_thread_id: Optional[int]):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.label = label
+        self.loop_thread_id = loop_thread_id
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples: Counter = Counter()
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        # Executor thread id -> work items running for this profile
+        self.threads: Counter = Counter()
+        self.threads_lock = threading.Lock()
+
+    def enter_thread(self, thread_id: int):
+        with self.threads_lock:
+            self.threads[thread_id] += 1
+
+    def exit_thread(self, thread_id: int):
+        with self.threads_lock:
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] <= 0:
+                del self.threads[thread_id]
+
+    def busy_threads(self) -> List[int]:
+        with self.threads_lock:
+            return list(self.threads)
+
+    def folded(self) -> str:
+        """Samples in the collapsed stack format read by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": sum(self.samples.values())
+        }
+
+class SamplingProfiler:
+    """
+    Statistical profiler that attributes stack samples to individual requests.
+
+    While at least one profile is active, a background thread samples the
+    stacks of the threads doing work for it every `interval` seconds:
+
+    - the event loop thread, when the task running on it belongs to the
+      profile (the request's task or any task it created), and
+    - executor threads, while they run a work item submitted on the
+      profile's behalf (see ProfilingExecutor).
+
+    When no profile is active the thread is idle and the only cost on the
+    request path is a context variable lookup.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or float(os.getenv("PROFILING_INTERVAL_MS", "5")) / 1000
+        self._active: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start_profile(self, label: str) -> Profile:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        profile = Profile(label, threading.get_ident() if loop else None)
+        if loop:
+            task = asyncio.current_task()
+            if task is not None:
+                profile.tasks.add(task)
+
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def stop_profile(self, profile: Profile) -> Profile:
+        with self._lock:
+            self._active.pop(profile.id, None)
+        profile.duration = time.time() - profile.started_at
+        return profile
+
+    @contextmanager
+    def profile(self, label: str):
+        """Profile the enclosed block, including tasks and executor work it starts."""
+        profile = self.start_profile(label)
+        token = _active_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            _active_profile.reset(token)
+            self.stop_profile(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                profiles = list(self._active.values())
+            if not profiles:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            for profile in profiles:
+                for thread_id in self._threads_for(profile):
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.samples[self._fold(frame)] += 1
+
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _threads_for(profile: Profile) -> List[int]:
+        thread_ids = profile.busy_threads()
+        if profile.loop_thread_id is not None and SamplingProfiler._loop_busy_for(profile):
+            thread_ids.append(profile.loop_thread_id)
+        return thread_ids
+
+    @staticmethod
+    def _loop_busy_for(profile: Profile) -> bool:
+        # A task's coroutine reports cr_running only while the loop is executing
+        # it; read from another thread this is racy, which is fine for sampling
+        try:
+            return any(getattr(task.get_coro(), "cr_running", False) for task in list(profile.tasks))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+class ProfilingExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that lets the profiler follow run_in_executor work.
+
+    Work submitted while a profile is active marks its worker thread as
+    belonging to that profile for as long as the work item runs.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return super().submit(fn, *args, **kwargs)
+
+        def run_profiled():
+            thread_id = threading.get_ident()
+            profile.enter_thread(thread_id)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.exit_thread(thread_id)
+
+        return super().submit(run_profiled)
+
+def install_profiling(loop=None, max_workers: Optional[int] = None) -> ProfilingExecutor:
+    """
+    Make the event loop's tasks and default executor visible to the profiler.
+
+    Call once from the application's startup hook. Tasks created while a
+    profile is active join it, and run_in_executor(None, ...) work runs on a
+    ProfilingExecutor. Returns the executor, e.g. for metrics.track_executor.
+    """
+    loop = loop or asyncio.get_event_loop()
+    executor = ProfilingExecutor(max_workers=max_workers, thread_name_prefix="asyncio")
+    loop.set_default_executor(executor)
+
+    previous_factory = loop.get_task_factory()
+
+    def task_factory(loop, coro, **kwargs):
+        if previous_factory is not None:
+            task = previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.tasks.add(task)
+        return task
+
+    loop.set_task_factory(task_factory)
+    return executor
+
+class ProfileStore:
+    """Bounded directory of saved profiles, oldest removed first."""
+
+    def __init__(self, directory: Optional[str] = None, max_profiles: Optional[int] = None):
+        self.directory = Path(directory or os.getenv("PROFILING_DIR", "./profiles"))
+        self.max_profiles = max_profiles or int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+        self._lock = threading.Lock()
+
+    def save(self, profile: Profile, details: Optional[Dict[str, Any]] = None):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        info = {**profile.info(), **(details or {})}
+        with self._lock:
+            (self.directory / f"{profile.id}.folded").write_text(profile.folded(), encoding="utf-8")
+            (self.directory / f"{profile.id}.json").write_text(json.dumps(info), encoding="utf-8")
+            self._prune()
+        logger.info(f"Saved profile {profile.id} ({info['samples']} samples) for {profile.label}")
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profiles.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return profiles
+
+    def get_path(self, profile_id: str) -> Optional[Path]:
+        # Ids are generated by Profile; anything else could escape the directory
+        if not profile_id or "/" in profile_id or "\\" in profile_id or profile_id.startswith("."):
+            return None
+        path = self.directory / f"{profile_id}.folded"
+        return path if path.exists() else None
+
+    def _prune(self):
+        metadata = sorted(self.directory.glob("*.json"))
+        for path in metadata[:max(0, len(metadata) - self.max_profiles)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".folded").unlink(missing_ok=True)
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware for admin-only, opt-in request profiling.
+
+    A request is profiled when it carries `X-Profile: 1` together with the
+    admin token in `X-Admin-Token`, or when it is picked by the sampling
+    rate (PROFILING_SAMPLE_RATE, 0 by default). The response gets an
+    X-Profile-ID header. Saved profiles are listed as JSON at PROFILING_PATH
+    and downloaded in folded stack format from PROFILING_PATH/<id>, both
+    also requiring the admin token. Flag-based profiling and the admin
+    endpoints are disabled unless PROFILING_ADMIN_TOKEN is set.
+    """
+
+    def __init__(
+        self,
+        app,
+        profiler: Optional[SamplingProfiler] = None,
+        store: Optional[ProfileStore] = None
+    ):
+        self.app = app
+        self.profiler = profiler or SamplingProfiler()
+        self.store = store or ProfileStore()
+        self.admin_token = os.getenv("PROFILING_ADMIN_TOKEN", "")
+        self.sample_rate = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+        self.path = os.getenv("PROFILING_PATH", "/admin/profiles").rstrip("/")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path == self.path or path.startswith(self.path + "/"):
+            await self._serve_admin(scope, send)
+            return
+
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {path}"
+        status = 500
+        profile = None
+        error = None
+
+        try:
+            with self.profiler.profile(label) as profile:
+                async def send_with_header(message):
+                    nonlocal status
+                    if message["type"] == "http.response.start":
+                        status = message["status"]
+                        headers = list(message.get("headers") or [])
+                        headers.append((b"x-profile-id", profile.id.encode("ascii")))
+                        message = {**message, "headers": headers}
+                    await send(message)
+
+                await self.app(scope, receive, send_with_header)
+        except BaseException as e:
+            # Failed and cancelled requests are often the ones worth profiling
+            error = type(e).__name__
+            raise
+        finally:
+            if profile is not None:
+                await self._save(profile, status, error)
+
+    async def _save(self, profile: Profile, status: int, error: Optional[str]):
+        """Write a profile from the default executor, keeping file I/O off the event loop."""
+        details: Dict[str, Any] = {"status": status}
+        if error:
+            details["error"] = error
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.store.save, profile, details)
+        except Exception as e:
+            logger.error(f"Error saving profile {profile.id}: {str(e)}")
+
+    def _should_profile(self, scope) -> bool:
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        if not self.admin_token:
+            return False
+        headers = dict(scope.get("headers") or [])
+        return headers.get(b"x-profile") in (b"1", b"true") and self._is_admin(headers)
+
+    def _is_admin(self, headers: Dict[bytes, bytes]) -> bool:
+        supplied = headers.get(b"x-admin-token", b"")
+        return bool(self.admin_token) and hmac.compare_digest(supplied, self.admin_token.encode("utf-8"))
+
+    async def _serve_admin(self, scope, send):
+        if not self._is_admin(dict(scope.get("headers") or [])):
+            await self._respond(send, 403, b'{"detail": "Admin token required"}', b"application/json")
+            return
+
+        profile_id = unquote(scope["path"][len(self.path):].strip("/"))
+        if not profile_id:
+            body = json.dumps({"profiles": self.store.list_profiles()}).encode("utf-8")
+            await self._respond(send, 200, body, b"application/json")
+            return
+
+        path = self.store.get_path(profile_id)
+        if path is None:
+            await self._respond(send, 404, b'{"detail": "Profile not found"}', b"application/json")
+            return
+
+        body = await asyncio.get_event_loop().run_in_executor(None, path.read_bytes)
+        await self._respond(
+            send, 200, body, b"text/plain; charset=utf-8",
+            [(b"content-disposition", f'attachment; filename="{profile_id}.folded"'.encode("latin-1"))]
+        )
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, content_type: bytes, extra_headers=None):
+        headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode("ascii"))]
+        await send({"type": "http.response.start", "status": status, "headers": headers + (extra_headers or [])})
+        await send({"type": "http.response.body", "body": body})
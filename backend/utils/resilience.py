@@ -0,0 +1,206 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(Exception):
+    """Raised when a pipeline stage runs past its time budget."""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Stage '{stage}' exceeded its {budget:.2f}s budget")
+        self.stage = stage
+        self.budget = budget
+
+class Deadline:
+    """
+    Overall request deadline with a separate time budget per stage.
+
+    A stage gets the smaller of its own budget and the time left on the
+    overall deadline, so a slow early stage eats into the later ones.
+    """
+
+    def __init__(self, total_seconds: float, stage_budgets: Optional[Dict[str, float]] = None):
+        self.total_seconds = total_seconds
+        self.stage_budgets = stage_budgets or {}
+        self.expires_at = time.monotonic() + total_seconds
+
+    @classmethod
+    def for_query(cls) -> "Deadline":
+        """Build the default deadline for the RAG query path from the environment."""
+        return cls(
+            float(os.getenv("QUERY_DEADLINE_SECONDS", "30")),
+            {
+                "embedding": float(os.getenv("EMBEDDING_BUDGET_SECONDS", "2")),
+                "retrieval": float(os.getenv("RETRIEVAL_BUDGET_SECONDS", "3")),
+                "generation": float(os.getenv("GENERATION_BUDGET_SECONDS", "25"))
+            }
+        )
+
+    def remaining(self) -> float:
+        """Seconds left before the overall deadline."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, stage: str) -> float:
+        """Seconds available to a stage right now."""
+        return min(self.stage_budgets.get(stage, self.total_seconds), self.remaining())
+
+    async def run(self, stage: str, awaitable: Awaitable[Any]) -> Any:
+        """Await a stage within its budget, raising DeadlineExceeded on timeout."""
+        budget = self.budget(stage)
+        if budget <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(stage, 0.0)
+
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage, budget)
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a sliding time window.
+
+    While open, callers should route to a fallback. After the cooldown a
+    single trial call is let through (half-open); its outcome closes or
+    re-opens the breaker. A trial whose outcome is never reported (e.g. the
+    call was cancelled) is released by abandon(), or expires after another
+    cooldown, so the breaker cannot get stuck open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        error_rate_threshold: float = 0.5,
+        min_requests: int = 10,
+        window_seconds: float = 60.0,
+        cooldown_seconds: float = 30.0
+    ):
+        self.name = name
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+
+        self._outcomes = deque()
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """One of "closed", "open" or "half_open"."""
+        with self._lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        """Whether a call to the protected dependency should be attempted."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            now = time.monotonic()
+            if state == "half_open" and (
+                not self._trial_in_flight or now - self._trial_started_at >= self.cooldown_seconds
+            ):
+                self._trial_in_flight = True
+                self._trial_started_at = now
+                return True
+            return False
+
+    def abandon(self):
+        """Release the half-open trial of a call that ended without an outcome, e.g. on cancellation."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit '{self.name}' closed")
+                # Failures from before the outage must not count against the recovered dependency
+                self._outcomes.clear()
+            self._opened_at = None
+            self._trial_in_flight = False
+            self._record(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._trial_in_flight:
+                # Failed trial: start a new cooldown
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                return
+
+            self._record(False)
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (
+                self._opened_at is None
+                and total >= self.min_requests
+                and failures / total >= self.error_rate_threshold
+            ):
+                self._opened_at = time.monotonic()
+                logger.warning(
+                    f"Circuit '{self.name}' opened: {failures}/{total} failures in {self.window_seconds}s"
+                )
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+async def hedged(call: Callable[[], Awaitable[Any]], delay: float) -> Any:
+    """
+    Run call, starting a second identical attempt if the first is still
+    pending after delay seconds. Returns whichever succeeds first.
+
+    A delay of 0 or less disables hedging. If the primary attempt fails
+    before the hedge is due, the hedge is started immediately.
+    """
+    primary = asyncio.ensure_future(call())
+    if delay <= 0:
+        return await primary
+
+    attempts = {primary}
+    error: Optional[BaseException] = None
+    try:
+        done, attempts = await asyncio.wait(attempts, timeout=delay)
+        if done:
+            if _attempt_error(primary) is None:
+                return primary.result()
+            error = _attempt_error(primary)
+
+        logger.info(f"Hedging request after {delay:.2f}s")
+        attempts.add(asyncio.ensure_future(call()))
+
+        while attempts:
+            done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if _attempt_error(attempt) is None:
+                    return attempt.result()
+                error = _attempt_error(attempt)
+        raise error
+    finally:
+        # Also reached when the caller is cancelled; no attempt may outlive it
+        for attempt in attempts:
+            attempt.cancel()
+
+def _attempt_error(attempt: asyncio.Future) -> Optional[BaseException]:
+    """The error a finished attempt ended with, counting cancellation as one."""
+    if attempt.cancelled():
+        return asyncio.CancelledError()
+    return attempt.exception()
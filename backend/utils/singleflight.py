@@ -0,0 +1,121 @@
+import asyncio
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def make_query_key(
+    query: str,
+    document_ids: Optional[List[str]] = None,
+    max_results: Optional[int] = None
+) -> str:
+    """Build a coalescing key from a normalized query and its document scope."""
+    normalized = re.sub(r"\s+", " ", query.strip().lower()).rstrip("?!. ")
+    scope = ",".join(sorted(document_ids)) if document_ids else "*"
+    return f"{normalized}|{scope}|{max_results}"
+
+class _StreamBroadcast:
+    """Fans a single async iterator out to any number of subscribers."""
+
+    def __init__(self, source: AsyncIterator[Any]):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._condition = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                async with self._condition:
+                    self.items.append(item)
+                    self._condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Yield every item of the stream, replaying those already produced."""
+        index = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: index < len(self.items) or self.done)
+                pending = self.items[index:]
+                finished = self.done
+
+            for item in pending:
+                yield item
+            index += len(pending)
+
+            if finished and index >= len(self.items):
+                if self.error:
+                    raise self.error
+                return
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight computation.
+
+    The computation runs as its own task, so a caller that disconnects does not
+    cancel the work for the others attached to it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _StreamBroadcast] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once per key among concurrent callers and share its result.
+
+        Args:
+            key: Coalescing key
+            fn: Zero-argument coroutine function producing the result
+
+        Returns:
+            The result of the shared computation
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            logger.info(f"Coalesced request onto in-flight call: {key[:80]}")
+
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        key: str,
+        fn: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """
+        Run the async iterator from fn once per key and fan it out to all callers.
+
+        Callers that attach late receive the items produced so far before
+        continuing with the live stream.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _StreamBroadcast(fn())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._streams.pop(key, None))
+        else:
+            logger.info(f"Coalesced stream onto in-flight call: {key[:80]}")
+
+        broadcast.subscribers += 1
+        try:
+            async for item in broadcast.subscribe():
+                yield item
+        finally:
+            broadcast.subscribers -= 1
+
+    def in_flight(self) -> int:
+        """Number of distinct computations currently running."""
+        return len(self._calls) + len(self._streams)
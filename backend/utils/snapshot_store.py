@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class SnapshotStore:
+    """
+    Content-addressed snapshot store for project files.
+
+    File contents are stored once per hash under `objects/`, and each
+    snapshot is a small JSON manifest under `snapshots/` mapping paths to
+    hashes. Snapshotting a file whose content is already stored costs no
+    blob write, and a stat index avoids re-reading files that have not
+    changed since they were last hashed.
+    """
+
+    def __init__(self, base_path: str = "./", store_dir: str = ".snapshots"):
+        self.base_path = Path(base_path).resolve()
+        self.store_path = self.base_path / store_dir
+        self.objects_path = self.store_path / "objects"
+        self.snapshots_path = self.store_path / "snapshots"
+        self.index_path = self.store_path / "index.json"
+
+    def create_snapshot(self, paths: List[str], label: str = "") -> Optional[str]:
+        """
+        Snapshot the given files as they currently are on disk.
+
+        Args:
+            paths: File paths relative to base_path; missing files are skipped
+            label: Optional human-readable label
+
+        Returns:
+            The snapshot id, or None if none of the files exist
+        """
+        index = self._load_json(self.index_path, {})
+        files = {}
+
+        for file_path in paths:
+            full_path = self.base_path / file_path
+            if not full_path.is_file():
+                continue
+
+            stat = full_path.stat()
+            cached = index.get(file_path)
+            if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                content_hash = cached["hash"]
+            else:
+                with open(full_path, 'rb') as f:
+                    data = f.read()
+                content_hash = hashlib.sha256(data).hexdigest()
+                self._write_object(content_hash, data)
+                index[file_path] = {
+                    "hash": content_hash,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns
+                }
+
+            files[file_path] = {"hash": content_hash, "size": stat.st_size}
+
+        if not files:
+            return None
+
+        created_at = time.time()
+        snapshot_id = f"{int(created_at * 1000)}_{uuid.uuid4().hex[:8]}"
+        self._write_json(self.snapshots_path / f"{snapshot_id}.json", {
+            "id": snapshot_id,
+            "created_at": created_at,
+            "label": label,
+            "files": files
+        })
+        self._write_json(self.index_path, index)
+
+        logger.info(f"Created snapshot {snapshot_id} of {len(files)} files")
+        return snapshot_id
+
+    def get_snapshot(self, snapshot_id: str) -> Dict[str, Any]:
+        """Load a snapshot manifest."""
+        path = self.snapshots_path / f"{Path(snapshot_id).name}.json"
+        if not path.exists():
+            raise KeyError(f"Snapshot not found: {snapshot_id}")
+        return self._load_json(path, {})
+
+    def read_snapshot_files(self, snapshot_id: str) -> List[Dict[str, str]]:
+        """Return a snapshot's files as 'path'/'content' dictionaries."""
+        snapshot = self.get_snapshot(snapshot_id)
+        files = []
+        for file_path, entry in snapshot["files"].items():
+            with open(self._object_path(entry["hash"]), 'rb') as f:
+                files.append({"path": file_path, "content": f.read().decode("utf-8")})
+        return files
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """List snapshots, newest first."""
+        snapshots = []
+        if not self.snapshots_path.exists():
+            return snapshots
+
+        for path in self.snapshots_path.glob("*.json"):
+            snapshot = self._load_json(path, None)
+            if snapshot:
+                snapshots.append({
+                    "id": snapshot["id"],
+                    "created_at": snapshot["created_at"],
+                    "label": snapshot.get("label", ""),
+                    "files_count": len(snapshot["files"]),
+                    "total_size": sum(entry["size"] for entry in snapshot["files"].values())
+                })
+
+        return sorted(snapshots, key=lambda snapshot: snapshot["created_at"], reverse=True)
+
+    def prune(
+        self,
+        keep_last: Optional[int] = None,
+        max_age_seconds: Optional[float] = None
+    ) -> List[str]:
+        """
+        Delete old snapshots and any blobs no remaining snapshot references.
+
+        Args:
+            keep_last: Keep at most this many of the newest snapshots
+            max_age_seconds: Delete snapshots older than this
+
+        Returns:
+            Ids of the deleted snapshots
+        """
+        snapshots = self.list_snapshots()
+        cutoff = time.time() - max_age_seconds if max_age_seconds is not None else None
+
+        removed = []
+        for position, snapshot in enumerate(snapshots):
+            too_many = keep_last is not None and position >= keep_last
+            too_old = cutoff is not None and snapshot["created_at"] < cutoff
+            if too_many or too_old:
+                (self.snapshots_path / f"{snapshot['id']}.json").unlink(missing_ok=True)
+                removed.append(snapshot["id"])
+
+        if removed:
+            self._collect_garbage()
+            logger.info(f"Pruned {len(removed)} snapshots")
+
+        return removed
+
+    def _collect_garbage(self):
+        """Remove blobs that are no longer referenced by any snapshot."""
+        referenced = set()
+        for path in self.snapshots_path.glob("*.json"):
+            snapshot = self._load_json(path, None)
+            if snapshot:
+                referenced.update(entry["hash"] for entry in snapshot["files"].values())
+
+        for blob in self.objects_path.glob("*/*"):
+            if blob.name not in referenced:
+                blob.unlink(missing_ok=True)
+
+        # Forget stat entries whose blob is gone so they get re-stored next time
+        index = self._load_json(self.index_path, {})
+        index = {path: entry for path, entry in index.items() if entry["hash"] in referenced}
+        self._write_json(self.index_path, index)
+
+    def _object_path(self, content_hash: str) -> Path:
+        return self.objects_path / content_hash[:2] / content_hash
+
+    def _write_object(self, content_hash: str, data: bytes):
+        """Store a blob unless one with the same hash already exists."""
+        path = self._object_path(content_hash)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{content_hash}.{uuid.uuid4().hex}.tmp")
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def _load_json(self, path: Path, default: Any) -> Any:
+        if not path.exists():
+            return default
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot file {path}: {str(e)}")
+            return default
+
+    def _write_json(self, path: Path, data: Any):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp, path)
@@ -0,0 +1,58 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StageTimeline:
+    """Records when each stage of a request started and finished."""
+
+    def __init__(self, name: str = "request"):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        """Time the enclosed block as a named stage."""
+        start = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._record(name, start, time.perf_counter(), error)
+
+    async def track(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Await an awaitable as a named stage."""
+        async with self.stage(name):
+            return await awaitable
+
+    def _record(self, name: str, start: float, end: float, error: Optional[str]):
+        entry = {
+            "stage": name,
+            "start_ms": round((start - self.started_at) * 1000, 2),
+            "end_ms": round((end - self.started_at) * 1000, 2),
+            "duration_ms": round((end - start) * 1000, 2)
+        }
+        if error:
+            entry["error"] = error
+        self.stages.append(entry)
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Stages ordered by start time."""
+        return sorted(self.stages, key=lambda entry: entry["start_ms"])
+
+    def log(self):
+        """Log the timeline on one line, e.g. for critical path analysis."""
+        parts = ", ".join(
+            f"{entry['stage']}={entry['start_ms']:.0f}-{entry['end_ms']:.0f}ms"
+            for entry in self.to_list()
+        )
+        logger.info(f"Timeline [{self.name}] total={self.total_ms():.0f}ms: {parts}")
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hmac
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (method, path prefix, kind) of the requests worth replaying
+RECORDED_ROUTES = [
+    ("POST", "/api/query", "query"),
+    ("POST", "/api/generate-website", "generate"),
+    ("POST", "/api/documents/upload", "upload")
+]
+
+MAX_CAPTURED_BYTES = 64 * 1024
+
+_REDACTIONS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b(?:sk|gsk|pk|ghp|xox[abp])[-_][A-Za-z0-9_-]{10,}\b"), "<secret>"),
+    (re.compile(r"\b[A-Fa-f0-9]{32,}\b"), "<hex>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<number>")
+]
+
+def sanitize_text(text: str) -> str:
+    """Redact emails, URLs, keys and long numbers, keeping the rest of the text intact."""
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+_HASHED_TEXT = re.compile(r"^text-[0-9a-f]{16}$")
+
+def hash_text(text: str, key: bytes) -> str:
+    """Stable placeholder for a text: equal texts stay equal, nothing else survives."""
+    return "text-" + hmac.new(key, text.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+def is_hashed_text(text: Any) -> bool:
+    """Whether a recorded question or prompt is a hash_text placeholder."""
+    return isinstance(text, str) and bool(_HASHED_TEXT.match(text))
+
+class TrafficRecorder:
+    """
+    ASGI middleware that records a sanitized stream of replayable requests.
+
+    Queries, website generations and uploads are appended to a JSONL file
+    with their arrival time, a hashed client id, the sanitized request
+    payload and the response status, latency and cache flag. Recording is
+    off unless TRAFFIC_RECORD_PATH is set; see benchmarks/replay.py.
+
+    Questions and prompts are hashed by default (TRAFFIC_RECORD_TEXT=hashed),
+    which keeps repeats repeated but loses semantic similarity on replay.
+    With TRAFFIC_RECORD_TEXT=redacted the text is stored in plain form with
+    only emails, URLs, keys and long numbers removed, so enable it only for
+    traffic whose contents may be kept. Upload contents are never recorded,
+    only their size and file type.
+
+    Client ids and hashed text are keyed HMACs, so they cannot be reversed
+    by hashing guesses. Set TRAFFIC_RECORD_HASH_KEY to keep them stable
+    across restarts; without it a random key is used per process.
+    """
+
+    def __init__(self, app, path: Optional[str] = None, sample_rate: Optional[float] = None):
+        self.app = app
+        self.path = path or os.getenv("TRAFFIC_RECORD_PATH", "")
+        self.sample_rate = sample_rate if sample_rate is not None else float(
+            os.getenv("TRAFFIC_RECORD_SAMPLE_RATE", "1.0")
+        )
+        self.text_mode = os.getenv("TRAFFIC_RECORD_TEXT", "hashed")
+        if self.text_mode not in ("hashed", "redacted"):
+            raise ValueError("TRAFFIC_RECORD_TEXT must be 'hashed' or 'redacted'")
+        hash_key = os.getenv("TRAFFIC_RECORD_HASH_KEY", "")
+        self.hash_key = hash_key.encode("utf-8") if hash_key else os.urandom(32)
+        self._lock = threading.Lock()
+        if self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Recording replayable traffic to {self.path} (text {self.text_mode})")
+            if not hash_key:
+                logger.warning("TRAFFIC_RECORD_HASH_KEY is not set; hashed ids will change on restart")
+
+    async def __call__(self, scope, receive, send):
+        kind = self._classify(scope) if self.path and scope["type"] == "http" else None
+        if kind is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        arrived_at = time.time()
+        start = time.perf_counter()
+        request_body = bytearray()
+        response_body = bytearray()
+        status = 500
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(request_body) < MAX_CAPTURED_BYTES:
+                request_body.extend(message.get("body", b"")[:MAX_CAPTURED_BYTES - len(request_body)])
+            return message
+
+        async def recording_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and len(response_body) < MAX_CAPTURED_BYTES:
+                response_body.extend(message.get("body", b"")[:MAX_CAPTURED_BYTES - len(response_body)])
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            record = {
+                "t": arrived_at,
+                "kind": kind,
+                "method": scope["method"],
+                "path": scope["path"],
+                "client": self._client_id(scope),
+                "text": self.text_mode,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                **self._describe(kind, scope, bytes(request_body), bytes(response_body))
+            }
+            await asyncio.get_event_loop().run_in_executor(None, self._append, record)
+
+    def _classify(self, scope) -> Optional[str]:
+        for method, prefix, kind in RECORDED_ROUTES:
+            if scope["method"] == method and scope["path"].startswith(prefix):
+                return kind
+        return None
+
+    def _describe(self, kind: str, scope, request_body: bytes, response_body: bytes) -> Dict[str, Any]:
+        """Sanitized, replayable description of the request and the bits of the response we compare."""
+        described: Dict[str, Any] = {}
+
+        if kind == "upload":
+            headers = dict(scope.get("headers") or [])
+            filename = re.search(rb'filename="([^"]*)"', request_body)
+            described["size_bytes"] = int(headers.get(b"content-length", b"0") or 0)
+            described["file_type"] = os.path.splitext(filename.group(1).decode("utf-8", "replace"))[1].lower() \
+                if filename else ""
+        else:
+            try:
+                payload = json.loads(request_body or b"{}")
+            except ValueError:
+                payload = {}
+            if kind == "query":
+                described["query"] = self._record_text(str(payload.get("query", "")))
+                described["max_results"] = payload.get("max_results", 5)
+                described["document_ids"] = payload.get("document_ids")
+            else:
+                described["prompt"] = self._record_text(str(payload.get("prompt", "")))
+
+        try:
+            response = json.loads(response_body) if response_body else {}
+        except ValueError:
+            response = {}
+        if isinstance(response, dict):
+            if "cached" in response:
+                described["cached"] = bool(response["cached"])
+            if kind == "upload" and response.get("document_id"):
+                described["document_id"] = response["document_id"]
+        return described
+
+    def _record_text(self, text: str) -> str:
+        return sanitize_text(text) if self.text_mode == "redacted" else hash_text(text, self.hash_key)
+
+    def _client_id(self, scope) -> str:
+        headers = dict(scope.get("headers") or [])
+        identity = headers.get(b"authorization") or (scope.get("client") or ("anonymous",))[0].encode("utf-8")
+        return hmac.new(self.hash_key, identity, hashlib.sha256).hexdigest()[:12]
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    """Read a recording, ordered by arrival time."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return sorted(records, key=lambda record: record["t"])